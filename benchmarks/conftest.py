@@ -0,0 +1,139 @@
+import os
+import statistics
+import time
+import tracemalloc
+from typing import Any, Callable, Iterable, Iterator
+from pytest import fixture
+from src.client import IMAPClient
+from tests.fake_server import FakeIMAPServer
+
+BENCH_MESSAGES = int(os.environ.get("IMAP_BENCH_MESSAGES", "500"))
+BENCH_MAILBOXES = int(os.environ.get("IMAP_BENCH_MAILBOXES", "200"))
+BENCH_LATENCY = float(os.environ.get("IMAP_BENCH_LATENCY", "0"))
+BENCH_SIZE = int(os.environ.get("IMAP_BENCH_SIZE", "4096"))
+MIME_MIX = {"plain": 0.4, "html": 0.1, "alternative": 0.3, "attachment": 0.2}
+CHARSETS = ("utf-8", "koi8-r", "windows-1251")
+
+_reports: dict[str, dict[str, float]] = {}
+
+
+class Metrics:
+    def __init__(self, server: FakeIMAPServer) -> None:
+        self.server = server
+        self.latencies: list[float] = []
+        self.messages = 0
+        self.elapsed = 0.0
+        self.rounds = 0
+        self.wire_bytes = 0
+        self.peak_alloc = 0
+        self._recording = True
+
+    def iterate(self, items: Iterable[Any]) -> Iterator[Any]:
+        iterator = iter(items)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self._record(started)
+            yield item
+
+    def call(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        res = func(*args, **kwargs)
+        self._record(started)
+        return res
+
+    def _record(self, started: float) -> None:
+        if self._recording:
+            self.latencies.append(time.perf_counter() - started)
+
+    def run(self, benchmark: Any, func: Callable[[], Any], messages: int, rounds: int = 3) -> Any:
+        def measured() -> Any:
+            wire_bytes = self.server.wire_bytes
+            started = time.perf_counter()
+            res = func()
+            self.elapsed += time.perf_counter() - started
+            self.wire_bytes += self.server.wire_bytes - wire_bytes
+            self.messages += messages
+            self.rounds += 1
+            return res
+
+        res = benchmark.pedantic(measured, rounds=rounds, iterations=1, warmup_rounds=0)
+        self.peak_alloc = self.measure_peak_alloc(func)
+        benchmark.extra_info.update(self.summary())
+        _reports[benchmark.name] = benchmark.extra_info
+        return res
+
+    def measure_peak_alloc(self, func: Callable[[], Any]) -> int:
+        self._recording = False
+        tracemalloc.start()
+        try:
+            func()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            self._recording = True
+
+    def summary(self) -> dict[str, float]:
+        percentiles = statistics.quantiles(self.latencies, n=100, method="inclusive") if len(self.latencies) > 1 \
+            else self.latencies * 99
+        return {
+            "messages_per_second": round(self.messages / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": round(percentiles[49] * 1000, 3),
+            "p99_ms": round(percentiles[98] * 1000, 3),
+            "peak_alloc_mb": round(self.peak_alloc / 1024 / 1024, 1),
+            "wire_bytes_per_round": self.wire_bytes // max(self.rounds, 1),
+        }
+
+
+@fixture(scope="session")
+def server():
+    server = FakeIMAPServer(latency=BENCH_LATENCY).start()
+    server.load(count=BENCH_MESSAGES, size=BENCH_SIZE, mime_mix=MIME_MIX, charsets=CHARSETS)
+    for index in range(BENCH_MAILBOXES):
+        server.add_mailbox(f"Проекты/Проект {index // 10}/Папка {index}", flags=["\\HasNoChildren"])
+    server.add_mailbox("Upload")
+    yield server
+    server.stop()
+
+
+@fixture
+def metrics(server):
+    return Metrics(server)
+
+
+@fixture
+def connect(server):
+    clients = []
+
+    def connect(compress: bool = False) -> IMAPClient:
+        client = IMAPClient(compress=compress)
+        client.connect_plain("127.0.0.1", server.port)
+        client.login("user", "password")
+        client.select_mailbox("INBOX")
+        clients.append(client)
+        return client
+
+    yield connect
+    for client in clients:
+        client.close()
+
+
+@fixture
+def client(connect):
+    return connect()
+
+
+def pytest_terminal_summary(terminalreporter: Any) -> None:
+    if not _reports:
+        return
+    terminalreporter.section("imap metrics")
+    terminalreporter.write_line(f"{'benchmark':<48} {'msg/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'alloc MB':>8} "
+                                f"{'wire B':>11}")
+    for name, report in _reports.items():
+        terminalreporter.write_line(
+            f"{name:<48} {report['messages_per_second']:>10} {report['p50_ms']:>9} {report['p99_ms']:>9} "
+            f"{report['peak_alloc_mb']:>8} {report['wire_bytes_per_round']:>11}"
+        )
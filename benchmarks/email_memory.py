@@ -0,0 +1,80 @@
+import random
+import time
+import tracemalloc
+from typing import Any, Callable
+from src.bodystructure import BodyPart
+from src.email_model import Email
+
+COUNT = 100_000
+WORDS = ["счёт", "оплата", "встреча", "отчёт", "invoice", "meeting", "report", "завтра", "срочно", "проект"]
+
+
+class LegacyBodyPart:
+    def __init__(self, section: str, content_type: str, params: dict[str, str] | None = None,
+                 encoding: str = "7BIT", size: int = 0, disposition: str | None = None,
+                 disposition_params: dict[str, str] | None = None, children: list["LegacyBodyPart"] | None = None,
+                 lines: int | None = None) -> None:
+        self.section = section
+        self.content_type = content_type.lower()
+        self.params = params if params else {}
+        self.encoding = encoding.upper()
+        self.size = size
+        self.disposition = disposition.lower() if disposition else None
+        self.disposition_params = disposition_params if disposition_params else {}
+        self.children = children if children else []
+        self.lines = lines
+
+
+class LegacyEmail:
+    def __init__(self, email_id: int, sender: str = "", description: str = "", body: list[str] | None = None,
+                 date: str | None = None, size: int | None = None, preview: str | None = None,
+                 structure: LegacyBodyPart | None = None) -> None:
+        self.id = email_id
+        self.sender = sender
+        self.description = description
+        self._body = [] if body is None and structure is None else body
+        self.date = date
+        self.size = size
+        self.preview = preview
+        self.structure = structure
+        self._loader = None
+        self._parts = None
+
+
+def brief(rng: random.Random, email_id: int, email_cls: type, part_cls: type) -> Any:
+    structure = part_cls("", "multipart/alternative", children=[
+        part_cls("1", "text/plain", {"charset": "utf-8"}, "QUOTED-PRINTABLE", rng.randint(100, 5000)),
+        part_cls("2", "text/html", {"charset": "utf-8"}, "BASE64", rng.randint(1000, 50000)),
+    ])
+    preview = " ".join(rng.choice(WORDS) for _ in range(12))[:64]
+    kwargs = {"flags": ("\\Seen",)} if email_cls is Email else {}
+    return email_cls(email_id, f"user{rng.randint(1, 500)}@example.com", " ".join(rng.sample(WORDS, 4)),
+                     date=f"Mon, {rng.randint(1, 28)} Jan 2024 10:00:00 +0300", size=rng.randint(1000, 60000),
+                     preview=preview, structure=structure, **kwargs)
+
+
+def measure(factory: Callable[[int], Any]) -> tuple[int, list[Any]]:
+    tracemalloc.start()
+    emails = [factory(email_id) for email_id in range(COUNT)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, emails
+
+
+def main() -> None:
+    legacy_size, _ = measure(lambda email_id: brief(random.Random(email_id), email_id, LegacyEmail, LegacyBodyPart))
+    compact_size, emails = measure(lambda email_id: brief(random.Random(email_id), email_id, Email, BodyPart))
+    print(f"Писем: {COUNT}")
+    print(f"legacy   {legacy_size / 1024 / 1024:8.1f} МБ  {legacy_size / COUNT:6.0f} байт/письмо")
+    print(f"__slots__ {compact_size / 1024 / 1024:7.1f} МБ  {compact_size / COUNT:6.0f} байт/письмо"
+          f"  x{legacy_size / compact_size:.2f}")
+    started = time.perf_counter()
+    encoded = [email.to_json() for email in emails]
+    restored = [Email.from_json(data) for data in encoded]
+    elapsed = time.perf_counter() - started
+    print(f"to_json/from_json: {elapsed * 1000:.0f} мс, {sum(map(len, encoded)) / COUNT:.0f} байт/письмо, "
+          f"совпадений: {sum(a.to_dict() == b.to_dict() for a, b in zip(emails, restored))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import random
+import timeit
+from src.decoder import html_to_text
+
+WORDS = ["скидка", "акция", "новинка", "sale", "offer", "только", "сегодня", "бесплатно", "доставка", "подписка"]
+
+
+def newsletter(rng: random.Random, blocks: int) -> str:
+    parts = [
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Рассылка</title>",
+        "<style>td{padding:0}.btn{color:#fff;background:#e30}</style>",
+        "<script>window.dataLayer=[];if(a<b&&c>d){track('open')}</script></head><body>",
+        "<!--[if mso]><table><tr><td><![endif]-->",
+    ]
+    for block in range(blocks):
+        words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 30)))
+        parts.append(
+            f"<table width='600' cellpadding='0'><tr><td class='block-{block}'>"
+            f"<h2>Предложение&nbsp;№{block}</h2>"
+            f"<p>{words} &amp; {rng.randint(1, 99)}&#37; &laquo;{rng.choice(WORDS)}&raquo;</p>"
+            f"<a class='btn' href='https://example.com/{block}?utm_source=mail&amp;utm_medium=email'>Купить</a>"
+            f"<img src='https://example.com/{block}.png' alt=''></td></tr></table>\n"
+        )
+    parts.append("<p style='font-size:10px'>Отписаться &copy; 2024</p></body></html>")
+    return "".join(parts)
+
+
+def corpus(count: int = 200) -> list[str]:
+    rng = random.Random(2024)
+    return [newsletter(rng, rng.randint(5, 80)) for _ in range(count)]
+
+
+def main() -> None:
+    documents = corpus()
+    mismatches = sum(html_to_text(html) != html_to_text(html, backend="bs4") for html in documents)
+    print(f"Документов: {len(documents)}, {sum(map(len, documents)) / 1024 / 1024:.2f} МБ, расхождений: {mismatches}")
+    cases = {
+        "bs4": lambda: [html_to_text(html, backend="bs4") for html in documents],
+        "html.parser": lambda: [html_to_text(html) for html in documents],
+        "preview 256": lambda: [html_to_text(html, 256) for html in documents],
+    }
+    timings = {name: min(timeit.repeat(case, number=1, repeat=3)) for name, case in cases.items()}
+    for name, elapsed in timings.items():
+        print(f"{name:<12} {elapsed * 1000:8.1f} мс  x{timings['bs4'] / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
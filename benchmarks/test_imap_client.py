@@ -0,0 +1,58 @@
+import os
+from pytest import mark
+from tests.fake_server import synthetic_messages
+
+READ_COUNT = 100
+ATTACHMENT_COUNT = 20
+UPLOAD_COUNT = 50
+
+
+@mark.parametrize("compress", [False, True], ids=["plain", "deflate"])
+def test_list_emails(benchmark, server, connect, metrics, compress):
+    client = connect(compress)
+    count = len(server.mailboxes["INBOX"].messages)
+
+    emails = metrics.run(benchmark, lambda: list(metrics.iterate(client.list_emails(headers_only=True))), count)
+
+    assert len(emails) == count
+
+
+def test_read_email(benchmark, server, client, metrics):
+    uids = [message.uid for message in server.mailboxes["INBOX"].messages[:READ_COUNT]]
+
+    emails = metrics.run(benchmark, lambda: [metrics.call(client.read_email, uid) for uid in uids], len(uids))
+
+    assert all(emails)
+
+
+def test_download_attachments(benchmark, server, client, metrics, tmp_path):
+    uids = [message.uid for message in server.mailboxes["INBOX"].messages
+            if b"Content-Disposition: attachment" in message.raw][:ATTACHMENT_COUNT]
+
+    metrics.run(benchmark, lambda: [metrics.call(client.download_attachments, str(uid), str(tmp_path))
+                                    for uid in uids], len(uids))
+
+    assert len(os.listdir(tmp_path)) == len(uids)
+
+
+def test_upload_email(benchmark, client, metrics):
+    def upload() -> None:
+        for index in range(UPLOAD_COUNT):
+            metrics.call(client.upload_email, f"Письмо {index}", "Текст письма " * 50, "user@example.com", "Upload")
+
+    metrics.run(benchmark, upload, UPLOAD_COUNT)
+
+
+def test_upload_emails_pipelined(benchmark, client, metrics):
+    messages = list(synthetic_messages(UPLOAD_COUNT, seed=1))
+
+    res = metrics.run(benchmark, lambda: client.upload_emails(metrics.iterate(messages), "Upload"), len(messages))
+
+    assert all(res)
+
+
+def test_list_mailboxes(benchmark, server, client, metrics):
+    tree = metrics.run(benchmark, lambda: metrics.call(client.mailbox_tree, refresh=True), len(server.mailboxes))
+
+    assert len(tree.names()) == len(server.mailboxes)
+    assert tree["INBOX"].messages == len(server.mailboxes["INBOX"].messages)
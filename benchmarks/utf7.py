@@ -0,0 +1,62 @@
+import base64
+import random
+import timeit
+from src.decoder import imaputf7decode, imaputf7encode
+
+
+def legacy_imaputf7decode(s):
+    lst = s.split("&")
+    out = lst[0]
+    for e in lst[1:]:
+        u, a = e.split("-", 1)
+        if u == "":
+            out += "&"
+        else:
+            b = u + (-len(u) % 4) * "="
+            out += base64.b64decode(b, altchars="+,", validate=True).decode("utf-16-be")
+        out += a
+    return out
+
+
+def legacy_imaputf7encode(s) -> str:
+    s = s.replace("&", "&-")
+    unipart = out = ""
+    for c in s:
+        if 0x20 <= ord(c) <= 0x7F:
+            if unipart != "":
+                out += "&" + base64.b64encode(unipart.encode("utf-16-be")).decode("ascii").rstrip("=") + "-"
+                unipart = ""
+            out += c
+        else:
+            unipart += c
+    if unipart != "":
+        out += "&" + base64.b64encode(unipart.encode("utf-16-be")).decode("ascii").rstrip("=") + "-"
+    return out
+
+
+def mailbox_names(count: int) -> list[str]:
+    rng = random.Random(3501)
+    words = ["INBOX", "Archive", "Shared", "Проекты", "Отчёты", "Входящие", "Sales & Marketing", "日本語", "2024"]
+    return ["/".join(rng.choice(words) for _ in range(rng.randint(1, 4))) + f" {i}" for i in range(count)]
+
+
+def main() -> None:
+    names = mailbox_names(5000)
+    encoded = [legacy_imaputf7encode(name) for name in names]
+    assert [imaputf7encode(name) for name in names] == encoded
+    assert [imaputf7decode(name) for name in encoded] == names
+    cases = {
+        "encode legacy": lambda: [legacy_imaputf7encode(name) for name in names],
+        "encode": lambda: [imaputf7encode.__wrapped__(name) for name in names],
+        "encode cached": lambda: [imaputf7encode(name) for name in names],
+        "decode legacy": lambda: [legacy_imaputf7decode(name) for name in encoded],
+        "decode": lambda: [imaputf7decode.__wrapped__(name) for name in encoded],
+        "decode cached": lambda: [imaputf7decode(name) for name in encoded],
+    }
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=5, repeat=5)) / 5
+        print(f"{name:<14} {best * 1000:8.2f} мс на {len(names)} папок")
+
+
+if __name__ == "__main__":
+    main()
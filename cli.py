@@ -1,18 +1,49 @@
+import argparse
+import atexit
 import getpass
-from src.client import IMAPClient, MailboxErr, LoginErr
+import imaplib
+import os
+import re
+import sys
+from typing import IO
+from src.batch import (BatchRunner, ConfigErr, JsonLinesWriter, SyncStateStore, export_job, fetch_job, list_job,
+                       load_config, sync_job, upload_job, watch)
+from src.client import IMAPClient, ConnectionErr, MailboxErr, LoginErr
+from src.export import export_mailbox, ExportErr, ExportStats
+from src.instrumentation import OpenMetricsExporter, StatsCollector, instrumentation
+from src.pool import IMAPConnectionPool, PoolTimeoutErr
 
-if __name__ == "__main__":
+DEFAULT_CONFIG = os.path.join("~", ".config", "imap_client", "accounts.toml")
+UID_SET_RE = re.compile(r"[1-9]\d*(:[1-9]\d*)?(,[1-9]\d*(:[1-9]\d*)?)*")
+
+
+def print_export_progress(stats: ExportStats) -> None:
+    print(f"\rЭкспортировано {stats.messages + stats.skipped}/{stats.total} писем, "
+          f"{stats.messages_per_second:.1f} писем/с, {stats.megabytes_per_second:.2f} МБ/с", end="")
+
+
+def report_stats(collector: StatsCollector, show: bool, metrics_path: str | None,
+                 stream: IO[str] | None = None) -> None:
+    if show:
+        print("\nСтатистика IMAP:", file=stream)
+        print(collector.summary(), file=stream)
+    if metrics_path:
+        OpenMetricsExporter(collector).write(metrics_path)
+
+
+def interactive() -> None:
     while True:
         server = input("Введите сервер IMAP: ")
-        port = int(input("Введите порт IMAP (993): "))
+        port_text = input("Введите порт IMAP (993 с SSL, 143 без): ").strip()
         use_ssl = input("Использовать SSL? (y/n): ").strip().lower() == "y"
 
         client = IMAPClient()
         try:
+            port = int(port_text) if port_text else 993 if use_ssl else 143
             if use_ssl:
-                client.connect_ssl(server, port if port else 993)
+                client.connect_ssl(server, port)
             else:
-                client.connect(server, port if port else 993)
+                client.connect_plain(server, port)
             break
         except Exception as e:
             print(f"Ошибка {e}")
@@ -34,12 +65,18 @@ if __name__ == "__main__":
         print("4. Прочитать письмо")
         print("5. Скачать вложения")
         print("6. Загрузить письмо")
-        print("7. Выход\n")
+        print("7. Экспортировать папку")
+        print("8. Выход\n")
 
         choice = input("Выберите команду: ").strip()
         if choice == "1":
-            for mailbox in client.list_mailboxes():
-                print(mailbox)
+            try:
+                for node in client.mailbox_tree():
+                    counts = f" ({node.unseen}/{node.messages})" if node.messages is not None else ""
+                    role = f" [{node.special_use}]" if node.special_use else ""
+                    print("  " * node.depth + node.leaf_name + counts + role)
+            except MailboxErr as e:
+                print(f"Ошибка: {e}")
         elif choice == "2":
             mailbox = input("Введите название папки из списка: ")
             res = client.select_mailbox(mailbox)
@@ -51,17 +88,15 @@ if __name__ == "__main__":
             try:
                 i = 0
                 more = True
-                for email in client.list_emails():
+                for email in client.list_emails(headers_only=True, batch_size=10, preview_size=64):
                     if not more:
                         break
                     i += 1
-                    body = client.read_email(email[0])
-                    joined_body = " ".join(body).replace("\n", " ")
                     print(
                         "Id письма: "
-                        + "    ".join(email)
+                        + "    ".join(map(str, (email.id, email.sender, email.description)))
                         + "    "
-                        + joined_body[: min(20, len(joined_body))]
+                        + email.preview[:20]
                         + "..."
                     )
                     if i >= 10:
@@ -71,16 +106,17 @@ if __name__ == "__main__":
                 print(f"Ошибка: {e}")
         elif choice == "4":
             try:
-                email_id = input("Введите ID письма: ")
-                print("\n".join(client.read_email(email_id)))
-            except MailboxErr as e:
+                email = client.read_email(int(input("Введите ID письма: ")))
+                print("\n".join(email.body) if email else "Письмо не найдено")
+            except (MailboxErr, ValueError) as e:
                 print(f"Ошибка: {e}")
         elif choice == "5":
             try:
                 email_id = input("Введите ID письма: ")
                 path = input("Введите путь для сохранения вложений: ")
-                client.download_attachments(email_id, path)
-            except MailboxErr as e:
+                for filepath in client.stream_attachments(int(email_id), path):
+                    print(filepath)
+            except (MailboxErr, ValueError, OSError) as e:
                 print(f"Ошибка: {e}")
         elif choice == "6":
             try:
@@ -91,7 +127,132 @@ if __name__ == "__main__":
             except LoginErr as e:
                 print(f"Ошибка: {e}")
         elif choice == "7":
+            mailbox = input("Введите название папки: ")
+            dest = input("Введите путь для сохранения: ")
+            export_format = input("Формат (mbox/maildir): ").strip().lower() or "mbox"
+            pool = IMAPConnectionPool(server, port, use_ssl)
+            pool.add_account(username, password)
+            try:
+                stats = export_mailbox(pool, mailbox, dest, export_format, progress=print_export_progress)
+                print(f"\nГотово: {stats.messages} писем, {stats.bytes / 1024 / 1024:.2f} МБ за {stats.elapsed:.1f} с")
+            except (MailboxErr, LoginErr, ConnectionErr, ExportErr, PoolTimeoutErr, imaplib.IMAP4.error,
+                    OSError) as e:
+                print(f"\nОшибка: {e}")
+            finally:
+                pool.close()
+        elif choice == "8":
             client.close()
             break
         else:
             print("Неверная команда.")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="IMAP-клиент")
+    parser.add_argument("--stats", action="store_true", help="вывести статистику команд IMAP при выходе")
+    parser.add_argument("--metrics", metavar="PATH", help="сохранить метрики в формате OpenMetrics при выходе")
+    parser.add_argument("--config", metavar="PATH",
+                        default=os.environ.get("IMAP_CLIENT_CONFIG", DEFAULT_CONFIG),
+                        help="файл с учётными записями в формате TOML")
+    parser.add_argument("--account", action="append", metavar="NAME",
+                        help="учётная запись из конфигурации (по умолчанию все)")
+    parser.add_argument("--parallel", type=int, metavar="N", help="число учётных записей, обрабатываемых одновременно")
+    parser.add_argument("--retries", type=int, metavar="N", help="число повторов при временных ошибках")
+    parser.add_argument("--backoff", type=float, metavar="SECONDS", help="начальная задержка перед повтором")
+    parser.add_argument("--output", metavar="PATH", help="файл для вывода JSON Lines (по умолчанию stdout)")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    list_parser = commands.add_parser("list", help="список писем")
+    list_parser.add_argument("--mailbox", action="append", help="папка (можно указать несколько раз)")
+    list_parser.add_argument("--limit", type=int, help="максимальное число писем в каждой папке")
+    list_parser.add_argument("--page-size", type=int, default=200, help="число писем в одном запросе FETCH")
+    list_parser.add_argument("--preview-size", type=int, default=256, help="длина превью письма")
+
+    fetch_parser = commands.add_parser("fetch", help="полные письма по UID")
+    fetch_parser.add_argument("uids", nargs="+", type=uid_set, help="UID или диапазоны вида 1:10,15")
+    fetch_parser.add_argument("--mailbox", action="append", help="папка (можно указать несколько раз)")
+
+    export_parser = commands.add_parser("export", help="экспорт папок в mbox или Maildir")
+    export_parser.add_argument("dest", help="каталог, в котором для каждой учётной записи создаётся подкаталог")
+    export_parser.add_argument("--mailbox", action="append", help="папка (можно указать несколько раз)")
+    export_parser.add_argument("--format", choices=("mbox", "maildir"), default="mbox")
+    export_parser.add_argument("--workers", type=int, default=2, help="число соединений на учётную запись")
+
+    upload_parser = commands.add_parser("upload", help="загрузка писем из файлов .eml")
+    upload_parser.add_argument("files", nargs="+", help="файлы писем, - для чтения из stdin")
+    upload_parser.add_argument("--mailbox", default="INBOX")
+    upload_parser.add_argument("--flags", help="флаги, например \\Seen")
+
+    sync_parser = commands.add_parser("sync", help="изменения в папках с прошлого запуска")
+    sync_parser.add_argument("--mailbox", action="append", help="папка (можно указать несколько раз)")
+    sync_parser.add_argument("--state", metavar="PATH", help="файл состояния синхронизации")
+    sync_parser.add_argument("--preview-size", type=int, default=256, help="длина превью письма")
+
+    watch_parser = commands.add_parser("watch", help="события в папках до прерывания")
+    watch_parser.add_argument("--mailbox", action="append", help="папка (можно указать несколько раз)")
+    watch_parser.add_argument("--duration", type=float, help="время наблюдения в секундах")
+    watch_parser.add_argument("--poll-interval", type=float, help="интервал опроса серверов без IDLE")
+    return parser
+
+
+def uid_set(value: str) -> str:
+    if not UID_SET_RE.fullmatch(value):
+        raise argparse.ArgumentTypeError(f"некорректный набор UID: {value}")
+    return value
+
+
+def read_messages(files: list[str]) -> list[tuple[str, bytes]]:
+    res = []
+    for path in files:
+        if path == "-":
+            res.append(("-", sys.stdin.buffer.read()))
+        else:
+            with open(path, "rb") as f:
+                res.append((path, f.read()))
+    return res
+
+
+def run_batch(args: argparse.Namespace, stream: IO[str] | None = None) -> int:
+    config = load_config(os.path.expanduser(args.config))
+    accounts = config.select(args.account)
+    runner = BatchRunner(JsonLinesWriter(stream), args.parallel or config.parallel,
+                         config.retries if args.retries is None else args.retries,
+                         config.backoff if args.backoff is None else args.backoff)
+    if args.command == "list":
+        return runner.run(accounts, list_job(args.mailbox, args.limit, args.page_size, args.preview_size))
+    if args.command == "fetch":
+        return runner.run(accounts, fetch_job(",".join(args.uids), args.mailbox))
+    if args.command == "export":
+        return runner.run(accounts, export_job(args.dest, args.format, args.mailbox, args.workers))
+    if args.command == "upload":
+        return runner.run(accounts, upload_job(read_messages(args.files), args.mailbox, args.flags))
+    if args.command == "sync":
+        store = SyncStateStore(args.state)
+        try:
+            return runner.run(accounts, sync_job(store, args.mailbox, args.preview_size))
+        finally:
+            store.save()
+    return watch(runner, accounts, args.mailbox, args.duration, poll_interval=args.poll_interval)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.stats or args.metrics:
+        atexit.register(report_stats, instrumentation.subscribe(StatsCollector()), args.stats, args.metrics,
+                        sys.stderr if args.command else None)
+    if args.command is None:
+        interactive()
+        return 0
+    output = open(args.output, "a", encoding="utf-8") if args.output else None
+    try:
+        return 1 if run_batch(args, output) else 0
+    except (ConfigErr, OSError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if output:
+            output.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
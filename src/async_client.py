@@ -0,0 +1,272 @@
+import asyncio
+import imaplib
+import ssl
+import time
+from typing import Any, AsyncIterator
+from src.cache import EmailCache, MailboxKey
+from src.client import IMAPClient, ConnectionErr, LoginErr, MailboxErr
+from src.email_model import Email
+from src.instrumentation import CommandEvent, command_name, instrumentation
+from src.mailbox_tree import MailboxTree, parse_list_response
+from src.parser import parse_fetch_response, to_sequence_set
+from src.protocol import ResponsePart, UntaggedResponses, literal_size, quote, split_response
+from src.transport import DeflateCodec, DeflateStreamReader, DeflateStreamWriter
+
+STREAM_LIMIT = 16 * 1024 * 1024
+
+
+class AsyncIMAPClient:
+    def __init__(self, cache: EmailCache | None = None, compress: bool = True, keep_raw: bool = False) -> None:
+        self._reader: asyncio.StreamReader | DeflateStreamReader | None = None
+        self._writer: asyncio.StreamWriter | DeflateStreamWriter | None = None
+        self._lock = asyncio.Lock()
+        self._tag_counter = 0
+        self._logged_in = False
+        self._mailbox_selected = False
+        self._login = ""
+        self._password = ""
+        self._server = ""
+        self._selected_mailbox = ""
+        self._uidvalidity: int | None = None
+        self._cache = cache
+        self._compress = compress
+        self.keep_raw = keep_raw
+        self.bytes_received = 0
+        self.compression: DeflateCodec | None = None
+        self.capabilities: tuple[str, ...] = ()
+
+    async def connect(self, server: str, port: int = 993, timeout: int = 5) -> None:
+        await self.connect_ssl(server, port, timeout)
+
+    async def connect_plain(self, server: str, port: int = 143, timeout: int = 5) -> None:
+        await self._open(server, port, timeout, None)
+
+    async def connect_ssl(self, server: str, port: int = 993, timeout: int = 5,
+                          ssl_context: ssl.SSLContext | None = None) -> None:
+        await self._open(server, port, timeout, ssl_context or ssl.create_default_context())
+
+    async def _open(self, server: str, port: int, timeout: int, ssl_context: ssl.SSLContext | None) -> None:
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(server, port, ssl=ssl_context, limit=STREAM_LIMIT), timeout
+        )
+        self.compression = None
+        self._server = f"{server}:{port}"
+        greeting = split_response(await self._read_response())
+        if greeting.name not in ("OK", "PREAUTH"):
+            await self._disconnect()
+            raise ConnectionErr(f"Сервер отклонил подключение: {greeting.name}")
+        status, data = await self._command("CAPABILITY")
+        if status == "OK" and data[-1]:
+            self.capabilities = tuple(data[-1].decode("ascii", errors="ignore").upper().split())
+
+    def _check_connection(self) -> None:
+        if not self._writer:
+            raise ConnectionErr("Необходимо подключиться к серверу")
+
+    async def login(self, username: str, password: str) -> tuple[str, list[Any]]:
+        self._check_connection()
+        status, _, data = await self._execute("LOGIN", quote(username), quote(password))
+        if status != "OK":
+            raise LoginErr(f"Не удалось авторизоваться: {data}")
+        self._logged_in = True
+        self._login = username
+        self._password = password
+        if self._compress:
+            await self.enable_compression()
+        return status, data
+
+    async def enable_compression(self) -> bool:
+        self._check_connection()
+        if self.compression is not None:
+            return True
+        if "COMPRESS=DEFLATE" not in self.capabilities:
+            return False
+        status, _, _ = await self._execute("COMPRESS", "DEFLATE")
+        if status != "OK":
+            return False
+        self.compression = DeflateCodec()
+        self._reader = DeflateStreamReader(self._reader, self.compression)
+        self._writer = DeflateStreamWriter(self._writer, self.compression)
+        return True
+
+    def _check_logged_in(self) -> None:
+        self._check_connection()
+        if not self._logged_in:
+            raise LoginErr("Необходимо авторизоваться")
+
+    async def list_mailboxes(self) -> list[str] | None:
+        self._check_logged_in()
+        status, mailboxes = await self._command("LIST", '""', "*")
+        if status == "OK":
+            return MailboxTree(parse_list_response(mailboxes)).names()
+        return None
+
+    async def select_mailbox(self, mailbox: str) -> tuple[str, list[Any]]:
+        self._check_logged_in()
+        status, untagged, _ = await self._execute("SELECT", quote(IMAPClient._encode_mailbox_utf7(mailbox)))
+        if status == "OK":
+            self._mailbox_selected = True
+            self._selected_mailbox = mailbox
+            self._uidvalidity = untagged.get_int("UIDVALIDITY")
+            if self._cache and self._uidvalidity is not None:
+                self._cache.validate(self._cache_key())
+        else:
+            self._mailbox_selected = False
+        return status, untagged.pop_data("EXISTS")
+
+    def _cache_key(self) -> MailboxKey | None:
+        if not self._cache or self._uidvalidity is None:
+            return None
+        return self._server, self._login, self._selected_mailbox, self._uidvalidity
+
+    def _check_mailbox_selected(self) -> None:
+        self._check_logged_in()
+        if not self._mailbox_selected:
+            raise MailboxErr("Необходимо выбрать папку")
+
+    async def list_emails(self, reverse: bool = True, headers_only: bool = False,
+                          batch_size: int = 200, preview_size: int = 256) -> AsyncIterator[Email]:
+        self._check_mailbox_selected()
+        status, messages = await self._command("UID", "SEARCH", "ALL", name="SEARCH")
+        if status != "OK":
+            return
+        email_ids = IMAPClient._parse_search_response(messages)
+        if reverse:
+            email_ids.reverse()
+        if not headers_only:
+            for email_id in email_ids:
+                yield IMAPClient._with_preview(await self.read_email(email_id), preview_size)
+            return
+
+        items = IMAPClient._brief_fetch_items(preview_size)
+        cache_key = self._cache_key()
+        for start in range(0, len(email_ids), batch_size):
+            batch = email_ids[start:start + batch_size]
+            emails = self._cache.get_many(cache_key, batch, complete=False) if cache_key else {}
+            missing = [email_id for email_id in batch if email_id not in emails]
+            if missing:
+                status, message_data = await self._command("UID", "FETCH", to_sequence_set(missing), items,
+                                                           name="FETCH")
+                if status != "OK":
+                    return
+                for _, attributes in parse_fetch_response(message_data):
+                    if "UID" not in attributes or int(attributes["UID"]) not in missing:
+                        continue
+                    email_id = int(attributes["UID"])
+                    emails[email_id] = IMAPClient._create_brief_email(email_id, attributes, preview_size)
+                    if cache_key:
+                        self._cache.put(cache_key, emails[email_id], complete=False)
+            for email_id in batch:
+                if email_id in emails:
+                    yield emails[email_id]
+
+    async def read_email(self, email_id: int) -> Email | None:
+        self._check_mailbox_selected()
+        cache_key = self._cache_key()
+        if cache_key:
+            cached = self._cache.get(cache_key, int(email_id))
+            if cached:
+                return cached
+        status, message_data = await self._command("UID", "FETCH", str(email_id), "(RFC822)", name="FETCH")
+        if status != "OK":
+            return None
+        res = IMAPClient._create_email_from_bytes(int(email_id), message_data, self.keep_raw)
+        if cache_key and res:
+            self._cache.put(cache_key, res)
+        return res
+
+    async def download_attachments(self, email_id: str, download_path: str) -> None:
+        self._check_mailbox_selected()
+        status, msg_data = await self._command("UID", "FETCH", str(email_id), "(RFC822)", name="FETCH")
+        if status != "OK":
+            return
+
+        for response_part in msg_data:
+            if IMAPClient._message_part_is_data(response_part):
+                await asyncio.to_thread(IMAPClient._download_attachments_from_data, response_part[1], download_path)
+
+    async def upload_email(self, subject: str, body: str, recipient: str,
+                           mailbox: str = "INBOX") -> tuple[str, list[Any]]:
+        self._check_logged_in()
+        msg = IMAPClient._build_message(self._login, subject, body, recipient)
+        status, _, data = await self._execute(
+            "APPEND", quote(IMAPClient._encode_mailbox_utf7(mailbox)), imaplib.Time2Internaldate(time.time()), literal=msg.as_bytes()
+        )
+        return status, data
+
+    async def close(self) -> tuple[str, list[Any]] | None:
+        self._logged_in = False
+        self._login = ""
+        self._password = ""
+        self._mailbox_selected = False
+        self._selected_mailbox = ""
+        self._uidvalidity = None
+        if not self._writer:
+            return None
+        try:
+            status, _, data = await self._execute("LOGOUT")
+            return status, data
+        except (ConnectionErr, OSError):
+            return None
+        finally:
+            await self._disconnect()
+
+    async def _disconnect(self) -> None:
+        writer, self._writer, self._reader = self._writer, None, None
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ssl.SSLError, OSError):
+            pass
+
+    async def _command(self, command: str, *args: str, name: str | None = None) -> tuple[str, list[ResponsePart | None]]:
+        status, untagged, data = await self._execute(command, *args)
+        if status != "OK":
+            return status, data
+        return status, untagged.pop_data(name or command)
+
+    async def _execute(self, command: str, *args: str,
+                       literal: bytes | None = None) -> tuple[str, UntaggedResponses, list[ResponsePart | None]]:
+        self._check_connection()
+        async with self._lock:
+            self._tag_counter += 1
+            tag = f"A{self._tag_counter:04d}"
+            line = " ".join((tag, command) + args)
+            if literal is not None:
+                line += f" {{{len(literal)}}}"
+            request = line.encode("utf-8") + b"\r\n"
+            started, received = time.perf_counter(), self.bytes_received
+            self._writer.write(request)
+            await self._writer.drain()
+
+            untagged = UntaggedResponses()
+            literal_pending = literal is not None
+            while True:
+                response = split_response(await self._read_response())
+                if response.kind == "continuation" and literal_pending:
+                    self._writer.write(literal + b"\r\n")
+                    await self._writer.drain()
+                    literal_pending = False
+                elif response.kind == "tagged" and response.tag == tag:
+                    if instrumentation.observers:
+                        sent = len(request) + (len(literal) + 2 if literal is not None else 0)
+                        instrumentation.command(CommandEvent(tag, command_name(command, args),
+                                                             time.perf_counter() - started, sent,
+                                                             self.bytes_received - received, response.name))
+                    return response.name, untagged, response.data
+                elif response.kind == "untagged":
+                    untagged.add(response)
+
+    async def _read_response(self) -> list[ResponsePart]:
+        parts = []
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                raise ConnectionErr("Сервер закрыл соединение")
+            self.bytes_received += len(line)
+            size = literal_size(line)
+            if size is None:
+                parts.append(line.rstrip(b"\r\n"))
+                return parts
+            parts.append((line.rstrip(b"\r\n"), await self._reader.readexactly(size)))
+            self.bytes_received += size
@@ -0,0 +1,349 @@
+import imaplib
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import tomllib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, IO, Iterable, Iterator
+from src.client import IMAPClient, ConnectionErr, MailboxErr
+from src.email_model import Email
+from src.export import export_mailbox, ExportFormat
+from src.parser import to_sequence_set, from_sequence_set
+from src.query import Query
+from src.pool import IMAPConnectionPool, PoolTimeoutErr
+from src.sync import MailboxState
+from src.watch import MailboxEvent, MailboxWatcher
+
+TRANSIENT_ERRORS = (imaplib.IMAP4.abort, ConnectionErr, PoolTimeoutErr, ConnectionError, TimeoutError,
+                    socket.gaierror)
+
+Record = dict[str, Any]
+Emit = Callable[[Record], None]
+Job = Callable[["Account", Emit], None]
+
+
+class ConfigErr(Exception):
+    pass
+
+
+class BatchErr(Exception):
+    pass
+
+
+class Account:
+    def __init__(self, name: str, server: str, username: str, password: str, port: int = 993,
+                 use_ssl: bool = True, timeout: int = 5, compress: bool = True,
+                 mailboxes: list[str] | None = None) -> None:
+        self.name = name
+        self.server = server
+        self.username = username
+        self.password = password
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.compress = compress
+        self.mailboxes = mailboxes if mailboxes else ["INBOX"]
+
+    def connect(self) -> IMAPClient:
+        client = IMAPClient(compress=self.compress)
+        if self.use_ssl:
+            client.connect_ssl(self.server, self.port, self.timeout)
+        else:
+            client.connect_plain(self.server, self.port, self.timeout)
+        try:
+            client.login(self.username, self.password)
+        except BaseException:
+            client.abort()
+            raise
+        return client
+
+    @contextmanager
+    def session(self) -> Iterator[IMAPClient]:
+        client = self.connect()
+        try:
+            yield client
+        except BaseException:
+            client.abort()
+            raise
+        else:
+            try:
+                client.close()
+            except (imaplib.IMAP4.error, OSError):
+                client.abort()
+
+    def pool(self, max_connections: int) -> IMAPConnectionPool:
+        pool = IMAPConnectionPool(self.server, self.port, self.use_ssl, max_connections, self.timeout)
+        pool.add_account(self.username, self.password)
+        return pool
+
+
+class BatchConfig:
+    def __init__(self, accounts: dict[str, Account], parallel: int = 4, retries: int = 3,
+                 backoff: float = 1.0) -> None:
+        self.accounts = accounts
+        self.parallel = parallel
+        self.retries = retries
+        self.backoff = backoff
+
+    def select(self, names: Iterable[str] | None = None) -> list[Account]:
+        names = list(names or [])
+        unknown = [name for name in names if name not in self.accounts]
+        if unknown:
+            raise ConfigErr(f"Учётные записи не найдены в конфигурации: {', '.join(unknown)}")
+        return [self.accounts[name] for name in names] if names else list(self.accounts.values())
+
+
+def load_config(path: str) -> BatchConfig:
+    try:
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    except FileNotFoundError:
+        raise ConfigErr(f"Файл конфигурации {path} не найден") from None
+    except tomllib.TOMLDecodeError as e:
+        raise ConfigErr(f"Ошибка в файле конфигурации {path}: {e}") from None
+    defaults = data.get("defaults", {})
+    accounts = {name: _parse_account(name, {**defaults, **options})
+                for name, options in data.get("accounts", {}).items()}
+    if not accounts:
+        raise ConfigErr(f"В файле конфигурации {path} нет учётных записей")
+    batch = data.get("batch", {})
+    return BatchConfig(accounts, int(batch.get("parallel", 4)), int(batch.get("retries", 3)),
+                       float(batch.get("backoff", 1.0)))
+
+
+def _parse_account(name: str, options: dict[str, Any]) -> Account:
+    for key in ("server", "username"):
+        if not options.get(key):
+            raise ConfigErr(f"Для учётной записи {name} не указан параметр {key}")
+    password = options.get("password")
+    if "password_env" in options:
+        password = os.environ.get(options["password_env"])
+        if password is None:
+            raise ConfigErr(f"Переменная окружения {options['password_env']} для учётной записи {name} не задана")
+    if password is None:
+        raise ConfigErr(f"Для учётной записи {name} не указан пароль")
+    use_ssl = bool(options.get("ssl", True))
+    return Account(name, options["server"], options["username"], password, int(options.get("port", 993)),
+                   use_ssl, int(options.get("timeout", 5)), bool(options.get("compress", True)),
+                   list(options.get("mailboxes", [])))
+
+
+class JsonLinesWriter:
+    def __init__(self, stream: IO[str] | None = None) -> None:
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def write(self, record: Record) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+class BatchRunner:
+    def __init__(self, writer: JsonLinesWriter, parallel: int = 4, retries: int = 3, backoff: float = 1.0,
+                 max_backoff: float = 60.0, sleep: Callable[[float], None] = time.sleep) -> None:
+        self.writer = writer
+        self.parallel = max(1, parallel)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._sleep = sleep
+
+    def run(self, accounts: Iterable[Account], job: Job, dedupe: bool = True) -> int:
+        with ThreadPoolExecutor(self.parallel) as executor:
+            results = list(executor.map(lambda account: self._run_account(account, job, dedupe), accounts))
+        return results.count(False)
+
+    def delay(self, attempt: int) -> float:
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def _run_account(self, account: Account, job: Job, dedupe: bool) -> bool:
+        emit = self._emitter(account, set() if dedupe else None)
+        for attempt in range(self.retries + 1):
+            try:
+                job(account, emit)
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.retries:
+                    self._error(account, e, attempt + 1)
+                    return False
+                self._sleep(self.delay(attempt))
+            except Exception as e:
+                self._error(account, e, attempt + 1)
+                return False
+            else:
+                return True
+        return False
+
+    def _emitter(self, account: Account, emitted: set[tuple[Any, ...]] | None) -> Emit:
+        def emit(record: Record) -> None:
+            if emitted is not None:
+                key = (record.get("event"), record.get("mailbox"), record.get("uid"))
+                if key in emitted:
+                    return
+                emitted.add(key)
+            self.writer.write({"account": account.name, **record})
+        return emit
+
+    def _error(self, account: Account, error: Exception, attempts: int) -> None:
+        self.writer.write({"account": account.name, "event": "error", "error": type(error).__name__,
+                           "message": str(error), "attempts": attempts})
+
+
+def _select(client: IMAPClient, mailbox: str) -> None:
+    status, _ = client.select_mailbox(mailbox)
+    if status != "OK":
+        raise MailboxErr(f"Не удалось выбрать папку {mailbox}")
+
+
+def _email_record(mailbox: str, email: Email, event: str = "email") -> Record:
+    record = {"event": event, "mailbox": mailbox, "uid": email.id}
+    record.update((key, value) for key, value in email.to_dict().items() if key != "id" and value is not None)
+    return record
+
+
+def list_job(mailboxes: list[str] | None = None, limit: int | None = None, page_size: int = 200,
+             preview_size: int = 256) -> Job:
+    def job(account: Account, emit: Emit) -> None:
+        with account.session() as client:
+            for mailbox in mailboxes or account.mailboxes:
+                _select(client, mailbox)
+                for count, email in enumerate(client.list_emails(headers_only=True, batch_size=page_size,
+                                                                 preview_size=preview_size)):
+                    if limit is not None and count >= limit:
+                        break
+                    emit(_email_record(mailbox, email))
+    return job
+
+
+def fetch_job(uids: str, mailboxes: list[str] | None = None) -> Job:
+    def job(account: Account, emit: Emit) -> None:
+        with account.session() as client:
+            for mailbox in mailboxes or account.mailboxes:
+                _select(client, mailbox)
+                for email in client.fetch_emails(client.search(Query("UID", uids)).uids):
+                    if email is not None:
+                        emit(_email_record(mailbox, email))
+    return job
+
+
+def export_job(dest: str, format: ExportFormat = "mbox", mailboxes: list[str] | None = None,
+               workers: int = 2) -> Job:
+    def job(account: Account, emit: Emit) -> None:
+        pool = account.pool(workers)
+        try:
+            for mailbox in mailboxes or account.mailboxes:
+                path = export_path(dest, account, mailbox, format)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                stats = export_mailbox(pool, mailbox, path, format, workers=workers)
+                emit({"event": "exported", "mailbox": mailbox, "path": path, **stats.as_dict()})
+        finally:
+            pool.close()
+    return job
+
+
+def export_path(dest: str, account: Account, mailbox: str, format: ExportFormat) -> str:
+    name = mailbox.replace("/", "_").replace(os.sep, "_")
+    return os.path.join(dest, account.name, f"{name}.mbox" if format == "mbox" else name)
+
+
+def upload_job(messages: list[tuple[str, bytes]], mailbox: str = "INBOX", flags: str | None = None) -> Job:
+    def job(account: Account, emit: Emit) -> None:
+        with account.session() as client:
+            try:
+                res = client.upload_emails((raw for _, raw in messages), mailbox, flags)
+            except TRANSIENT_ERRORS as e:
+                raise BatchErr(f"Соединение прервано во время загрузки, повтор может создать дубликаты: {e}") from e
+        for (name, raw), uid in zip(messages, res):
+            emit({"event": "uploaded", "mailbox": mailbox, "file": name, "size": len(raw),
+                  "uidvalidity": uid[0] if uid else None, "uid": uid[1] if uid else None})
+    return job
+
+
+class SyncStateStore:
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path
+        self._states: dict[str, dict[str, dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._states = json.load(f)
+
+    def get(self, account: str, mailbox: str) -> MailboxState | None:
+        with self._lock:
+            data = self._states.get(account, {}).get(mailbox)
+        if data is None:
+            return None
+        return MailboxState(data["uidvalidity"], data["uidnext"], data["highestmodseq"],
+                            set(from_sequence_set(data["uids"])) if data["uids"] else None)
+
+    def put(self, account: str, mailbox: str, state: MailboxState) -> None:
+        data = {"uidvalidity": state.uidvalidity, "uidnext": state.uidnext, "highestmodseq": state.highestmodseq,
+                "uids": to_sequence_set(state.uids)}
+        with self._lock:
+            self._states.setdefault(account, {})[mailbox] = data
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self._states, f)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def sync_job(store: SyncStateStore, mailboxes: list[str] | None = None, preview_size: int = 256) -> Job:
+    def job(account: Account, emit: Emit) -> None:
+        with account.session() as client:
+            for mailbox in mailboxes or account.mailboxes:
+                result = client.sync_mailbox(mailbox, preview_size, store.get(account.name, mailbox))
+                for email in result.new:
+                    emit(_email_record(mailbox, email, "new"))
+                for uid, flags in sorted(result.changed.items()):
+                    emit({"event": "changed", "mailbox": mailbox, "uid": uid, "flags": flags})
+                if result.vanished:
+                    emit({"event": "vanished", "mailbox": mailbox, "uids": result.vanished})
+                emit({"event": "synced", "mailbox": mailbox, "full": result.full, "new": len(result.new),
+                      "changed": len(result.changed), "vanished": len(result.vanished)})
+                store.put(account.name, mailbox, client.sync_state(mailbox))
+    return job
+
+
+def watch_job(watcher: MailboxWatcher, mailboxes: list[str] | None = None) -> Job:
+    def job(account: Account, emit: Emit) -> None:
+        def callback(event: MailboxEvent) -> None:
+            record = {"event": event.kind.lower(), "mailbox": event.mailbox, "uids": event.uids}
+            if event.flags:
+                record["flags"] = {str(uid): flags for uid, flags in event.flags.items()}
+            emit(record)
+
+        selected = mailboxes or account.mailboxes
+        with account.session() as client:
+            client.watch(selected, callback, watcher)
+        emit({"event": "watching", "mailboxes": selected})
+    return job
+
+
+def watch(runner: BatchRunner, accounts: list[Account], mailboxes: list[str] | None = None,
+          duration: float | None = None, idle_timeout: float | None = None,
+          poll_interval: float | None = None, stop: threading.Event | None = None) -> int:
+    watcher = MailboxWatcher()
+    if idle_timeout is not None:
+        watcher.idle_timeout = idle_timeout
+    if poll_interval is not None:
+        watcher.poll_interval = poll_interval
+    stop = stop or threading.Event()
+    try:
+        failed = runner.run(accounts, watch_job(watcher, mailboxes), dedupe=False)
+        if failed < len(accounts):
+            stop.wait(duration)
+    except KeyboardInterrupt:
+        failed = 0
+    finally:
+        watcher.stop()
+    return failed
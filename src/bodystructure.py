@@ -0,0 +1,187 @@
+import email.utils
+import sys
+import urllib.parse
+from email.header import decode_header, make_header
+from typing import Any, Iterator
+
+INTERN_LIMIT = 32
+
+
+class BodyPart:
+    __slots__ = ("section", "content_type", "_params", "encoding", "size", "disposition", "_disposition_params",
+                 "_children", "lines")
+
+    def __init__(self, section: str, content_type: str, params: dict[str, str] | None = None,
+                 encoding: str = "7BIT", size: int = 0, disposition: str | None = None,
+                 disposition_params: dict[str, str] | None = None, children: list["BodyPart"] | None = None,
+                 lines: int | None = None) -> None:
+        self.section = sys.intern(section)
+        self.content_type = sys.intern(content_type.lower())
+        self.params = params
+        self.encoding = sys.intern(encoding.upper())
+        self.size = size
+        self.disposition = sys.intern(disposition.lower()) if disposition else None
+        self.disposition_params = disposition_params
+        self.children = children
+        self.lines = lines
+
+    @property
+    def params(self) -> dict[str, str]:
+        return self._params or {}
+
+    @params.setter
+    def params(self, params: dict[str, str] | None) -> None:
+        self._params = _intern_params(params)
+
+    @property
+    def disposition_params(self) -> dict[str, str]:
+        return self._disposition_params or {}
+
+    @disposition_params.setter
+    def disposition_params(self, params: dict[str, str] | None) -> None:
+        self._disposition_params = _intern_params(params)
+
+    @property
+    def children(self) -> list["BodyPart"]:
+        return self._children or []
+
+    @children.setter
+    def children(self, children: list["BodyPart"] | None) -> None:
+        self._children = children if children else None
+
+    @property
+    def maintype(self) -> str:
+        return self.content_type.split("/", 1)[0]
+
+    @property
+    def subtype(self) -> str:
+        return self.content_type.split("/", 1)[-1]
+
+    @property
+    def is_multipart(self) -> bool:
+        return self.maintype == "multipart"
+
+    @property
+    def is_attachment(self) -> bool:
+        return self.disposition == "attachment"
+
+    @property
+    def charset(self) -> str | None:
+        return self.params.get("charset")
+
+    @property
+    def filename(self) -> str | None:
+        filename = (_get_param(self.disposition_params, "filename")
+                    or _get_param(self.params, "name"))
+        if not filename:
+            return None
+        return str(make_header(decode_header(filename)))
+
+    @property
+    def decoded_size(self) -> int:
+        if self.encoding == "BASE64":
+            return self.size * 3 // 4
+        return self.size
+
+    def walk(self) -> Iterator["BodyPart"]:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "section": self.section,
+            "content_type": self.content_type,
+            "params": self.params,
+            "encoding": self.encoding,
+            "size": self.size,
+            "disposition": self.disposition,
+            "disposition_params": self.disposition_params,
+            "children": [child.to_dict() for child in self.children],
+            "lines": self.lines,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "BodyPart":
+        return cls(data["section"], data["content_type"], data.get("params"), data.get("encoding", "7BIT"),
+                   data.get("size", 0), data.get("disposition"), data.get("disposition_params"),
+                   [cls.from_dict(child) for child in data.get("children", [])], data.get("lines"))
+
+
+def parse_bodystructure(value: list[Any], section: str = "") -> BodyPart:
+    if value and isinstance(value[0], list):
+        children = []
+        index = 0
+        while index < len(value) and isinstance(value[index], list):
+            child_section = f"{section}.{index + 1}" if section else str(index + 1)
+            children.append(parse_bodystructure(value[index], child_section))
+            index += 1
+        subtype = _text(value[index]) if index < len(value) else "mixed"
+        params = _params(value[index + 1]) if index + 1 < len(value) else {}
+        disposition, disposition_params = _disposition(value[index + 2] if index + 2 < len(value) else None)
+        return BodyPart(section, f"multipart/{subtype}", params, disposition=disposition,
+                        disposition_params=disposition_params, children=children)
+
+    maintype, subtype = _text(value[0]) or "text", _text(value[1]) or "plain"
+    content_type = f"{maintype}/{subtype}".lower()
+    part = BodyPart(section or "1", content_type, _params(value[2]), _text(value[5]) or "7BIT", _int(value[6]))
+    extension = 7
+    if part.maintype == "text":
+        part.lines = _int(value[7]) if len(value) > 7 else None
+        extension = 8
+    elif content_type == "message/rfc822" and len(value) > 9:
+        part.children = [parse_bodystructure(value[8], part.section)]
+        if not part.children[0].is_multipart and part.children[0].section == part.section:
+            part.children[0].section = f"{part.section}.1"
+        part.lines = _int(value[9])
+        extension = 10
+    if len(value) > extension + 1:
+        part.disposition, part.disposition_params = _disposition(value[extension + 1])
+    return part
+
+
+def _text(value: Any) -> str | None:
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+
+def _int(value: Any) -> int:
+    try:
+        return int(_text(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _params(value: Any) -> dict[str, str]:
+    if not isinstance(value, list):
+        return {}
+    return {_text(key).lower(): _text(val) for key, val in zip(value[::2], value[1::2]) if key is not None}
+
+
+def _disposition(value: Any) -> tuple[str | None, dict[str, str]]:
+    if not isinstance(value, list) or not value:
+        return None, {}
+    disposition = _text(value[0])
+    return disposition.lower() if disposition else None, _params(value[1]) if len(value) > 1 else {}
+
+
+def _intern_params(params: dict[str, str] | None) -> dict[str, str] | None:
+    if not params:
+        return None
+    return {sys.intern(key): sys.intern(value) if isinstance(value, str) and len(value) <= INTERN_LIMIT else value
+            for key, value in params.items()}
+
+
+def _get_param(params: dict[str, str], name: str) -> str | None:
+    if params.get(name):
+        return params[name]
+    extended = params.get(f"{name}*")
+    if extended:
+        charset, _, encoded = email.utils.decode_rfc2231(extended)
+        return urllib.parse.unquote(encoded, encoding=charset or "utf-8", errors="replace")
+    continuations = sorted((key for key in params if key.startswith(f"{name}*")),
+                           key=lambda key: int(key.split("*")[1] or 0))
+    if continuations:
+        return "".join(params[key] for key in continuations)
+    return None
@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import threading
+import time
+from src.email_model import Email
+
+MailboxKey = tuple[str, str, str, int]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mailboxes (
+    server TEXT NOT NULL,
+    user TEXT NOT NULL,
+    mailbox TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    PRIMARY KEY (server, user, mailbox)
+);
+CREATE TABLE IF NOT EXISTS emails (
+    server TEXT NOT NULL,
+    user TEXT NOT NULL,
+    mailbox TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    complete INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    accessed INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (server, user, mailbox, uidvalidity, uid)
+);
+CREATE INDEX IF NOT EXISTS emails_accessed ON emails (accessed);
+"""
+
+
+class EmailCache:
+    def __init__(self, path: str, max_size: int = 256 * 1024 * 1024) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self.max_size = max_size
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM emails").fetchone()[0]
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def validate(self, key: MailboxKey) -> bool:
+        server, user, mailbox, uidvalidity = key
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT uidvalidity FROM mailboxes WHERE server = ? AND user = ? AND mailbox = ?",
+                (server, user, mailbox),
+            ).fetchone()
+            if row and row[0] == uidvalidity:
+                return True
+            self._delete_where("server = ? AND user = ? AND mailbox = ?", (server, user, mailbox))
+            self._db.execute(
+                "INSERT OR REPLACE INTO mailboxes (server, user, mailbox, uidvalidity) VALUES (?, ?, ?, ?)",
+                key,
+            )
+            return row is None
+
+    def get(self, key: MailboxKey, uid: int, complete: bool = True) -> Email | None:
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT rowid, complete, data FROM emails "
+                "WHERE server = ? AND user = ? AND mailbox = ? AND uidvalidity = ? AND uid = ?",
+                (*key, uid),
+            ).fetchone()
+            if not row or (complete and not row[1]):
+                return None
+            self._db.execute("UPDATE emails SET accessed = ? WHERE rowid = ?", (time.time_ns(), row[0]))
+        return Email.from_json(row[2])
+
+    def get_many(self, key: MailboxKey, uids: list[int], complete: bool = False) -> dict[int, Email]:
+        res = {}
+        for uid in uids:
+            cached = self.get(key, uid, complete)
+            if cached:
+                res[uid] = cached
+        return res
+
+    def put(self, key: MailboxKey, email: Email, complete: bool = True) -> None:
+        data = email.to_json()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT complete, size FROM emails "
+                "WHERE server = ? AND user = ? AND mailbox = ? AND uidvalidity = ? AND uid = ?",
+                (*key, email.id),
+            ).fetchone()
+            if row and row[0] and not complete:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO emails "
+                "(server, user, mailbox, uidvalidity, uid, complete, size, accessed, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, email.id, int(complete), len(data), time.time_ns(), data),
+            )
+            self._size += len(data) - (row[1] if row else 0)
+            self._evict()
+
+    def remove(self, key: MailboxKey, uids: list[int]) -> None:
+        with self._lock, self._db:
+            for uid in uids:
+                self._delete_where(
+                    "server = ? AND user = ? AND mailbox = ? AND uidvalidity = ? AND uid = ?", (*key, uid)
+                )
+
+    def clear(self) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM emails")
+            self._db.execute("DELETE FROM mailboxes")
+            self._size = 0
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _delete_where(self, condition: str, params: tuple) -> None:
+        removed = self._db.execute(f"SELECT COALESCE(SUM(size), 0) FROM emails WHERE {condition}", params).fetchone()[0]
+        self._db.execute(f"DELETE FROM emails WHERE {condition}", params)
+        self._size -= removed
+
+    def _evict(self) -> None:
+        while self._size > self.max_size:
+            rows = self._db.execute("SELECT rowid, size FROM emails ORDER BY accessed LIMIT 64").fetchall()
+            if not rows:
+                self._size = 0
+                return
+            for rowid, size in rows:
+                self._db.execute("DELETE FROM emails WHERE rowid = ?", (rowid,))
+                self._size -= size
+                if self._size <= self.max_size:
+                    return
@@ -3,12 +3,30 @@ import email
 from email.message import EmailMessage, Message
 from email.header import decode_header
 import os
+import socket
+import ssl
+from fnmatch import fnmatch
 import time
-from typing import Literal, Any, Iterable
+from functools import partial
+from typing import Literal, Any, Iterable, Iterator
 import re
-from src.decoder import imaputf7decode, imaputf7encode
-from bs4 import BeautifulSoup
-from src.email_model import Email
+from src.decoder import imaputf7encode, stream_decoder, html_to_text
+from src.email_model import Email, PREVIEW_SIZE
+from src.parser import parse, parse_fetch_response, find_attribute, to_sequence_set, from_sequence_set
+from src.cache import EmailCache, MailboxKey
+from src.sync import MailboxState, SyncResult
+from src.pipeline import Pipeline, PipelinedCommand, route_by_uid
+from src.protocol import Response, ResponsePart, quote
+from src.transport import IMAP4, IMAP4SSL, DeflateCodec
+from src.bodystructure import BodyPart, parse_bodystructure
+from src.query import Query, SearchResult
+from src.search_index import SearchIndex, IndexHit
+from src.decode_pool import DecodePool
+from src.mailbox_tree import MailboxTree, MailboxStatus, STATUS_ITEMS, parse_list_response, parse_status_response
+from src.watch import MailboxWatcher, EventCallback, IDLE_TIMEOUT, POLL_INTERVAL
+from src.instrumentation import timed
+
+BRIEF_HEADER_FIELDS = "FROM SUBJECT DATE CONTENT-TYPE CONTENT-TRANSFER-ENCODING"
 
 
 class ConnectionErr(Exception):
@@ -24,18 +42,112 @@ class MailboxErr(Exception):
 
 
 class IMAPClient:
-    def __init__(self) -> None:
+    def __init__(self, cache: EmailCache | None = None, index: SearchIndex | None = None,
+                 compress: bool = True, mailbox_ttl: float = 300.0, decode_pool: DecodePool | None = None,
+                 keep_raw: bool = False) -> None:
         self._connection: imaplib.IMAP4 | None = None
         self._logged_in = False
         self._mailbox_selected = False
         self._login = ""
         self._password = ""
+        self._server = ""
+        self._address: tuple[str, int] | None = None
+        self._timeout = 5
+        self._ssl_context: ssl.SSLContext | None = None
+        self._use_ssl = True
+        self._selected_mailbox = ""
+        self._uidvalidity: int | None = None
+        self._uidnext: int | None = None
+        self._highestmodseq: int | None = None
+        self._sync_states: dict[str, MailboxState] = {}
+        self._enabled: set[str] = set()
+        self._cache = cache
+        self._index = index
+        self._compress = compress
+        self._capabilities: frozenset[str] | None = None
+        self._mailbox_tree: MailboxTree | None = None
+        self.mailbox_ttl = mailbox_ttl
+        self._decode_pool = decode_pool
+        self.keep_raw = keep_raw
 
     def connect(self, server: str, port: int = 993, timeout: int = 5) -> None:
-        self._connection = imaplib.IMAP4_SSL(server, port, timeout=timeout)
+        self.connect_ssl(server, port, timeout)
+
+    def connect_plain(self, server: str, port: int = 143, timeout: int = 5) -> None:
+        self._connection = IMAP4(server, port, timeout=timeout)
+        self._remember_address(server, port, timeout, False)
+
+    def connect_ssl(self, server: str, port: int = 993, timeout: int = 5,
+                    ssl_context: ssl.SSLContext | None = None, tls_session: ssl.SSLSession | None = None) -> None:
+        self._connection = IMAP4SSL(server, port, ssl_context=ssl_context, timeout=timeout, tls_session=tls_session)
+        self._ssl_context = self._connection.ssl_context
+        self._remember_address(server, port, timeout, True)
+
+    def _remember_address(self, server: str, port: int, timeout: int, use_ssl: bool) -> None:
+        self._capabilities = frozenset(self._connection.capabilities)
+        self._mailbox_tree = None
+        self._server = f"{server}:{port}"
+        self._address = (server, port)
+        self._timeout = timeout
+        self._use_ssl = use_ssl
+
+    @property
+    def tls_session(self) -> ssl.SSLSession | None:
+        return getattr(self._connection, "tls_session", None)
+
+    @property
+    def tls_session_reused(self) -> bool:
+        return getattr(self._connection, "tls_session_reused", False)
+
+    def _tls_session_or_none(self) -> ssl.SSLSession | None:
+        try:
+            return self.tls_session
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def selected_mailbox(self) -> str | None:
+        return self._selected_mailbox if self._mailbox_selected else None
+
+    @property
+    def uidvalidity(self) -> int | None:
+        return self._uidvalidity if self._mailbox_selected else None
+
+    def noop(self) -> tuple[str, Any]:
+        self._check_connection()
+        return self._connection.noop()
 
-    def connect_ssl(self, server: str, port: int = 993, timeout: int = 5) -> None:
-        self._connection = imaplib.IMAP4_SSL(server, port, timeout=timeout)
+    def reconnect(self) -> None:
+        if not self._address:
+            raise ConnectionErr("Необходимо подключиться к серверу")
+        login, password = self._login, self._password
+        mailbox = self.selected_mailbox
+        tls_session = self._tls_session_or_none()
+        self._abandon_connection()
+        server, port = self._address
+        if self._use_ssl:
+            self.connect_ssl(server, port, self._timeout, self._ssl_context, tls_session)
+        else:
+            self.connect_plain(server, port, self._timeout)
+        if login:
+            self.login(login, password)
+        if mailbox is not None:
+            self.select_mailbox(mailbox)
+
+    def abort(self) -> None:
+        self._abandon_connection()
+        self._connection = None
+
+    def _abandon_connection(self) -> None:
+        self._capabilities = None
+        self._logged_in = False
+        self._mailbox_selected = False
+        self._enabled = set()
+        if self._connection:
+            try:
+                self._connection.shutdown()
+            except OSError:
+                pass
 
     def _check_connection(self) -> None:
         if not self._connection:
@@ -47,88 +159,411 @@ class IMAPClient:
         self._logged_in = True
         self._login = username
         self._password = password
+        self._mailbox_tree = None
+        _, capabilities = self._connection.response("CAPABILITY")
+        if capabilities and capabilities[-1]:
+            self._capabilities = frozenset(capabilities[-1].decode("ascii", errors="ignore").upper().split())
+            self._connection.capabilities = tuple(self._capabilities)
+        if self._compress:
+            self.enable_compression()
         return res
 
+    def enable_compression(self) -> bool:
+        self._check_connection()
+        if self.compression is not None:
+            return True
+        if not self._has_capability("COMPRESS=DEFLATE"):
+            return False
+        try:
+            status, _ = self._connection.compress()
+        except imaplib.IMAP4.error:
+            return False
+        return status == "OK"
+
+    @property
+    def compression(self) -> DeflateCodec | None:
+        return getattr(self._connection, "compression", None)
+
     def _check_logged_in(self) -> None:
         self._check_connection()
         if not self._logged_in:
             raise LoginErr("Необходимо авторизоваться")
 
     def list_mailboxes(self) -> list[str] | None:
-        self._check_logged_in()
-        status, mailboxes = self._connection.list()
-        if status == "OK":
-            return self._parse_mailboxes(mailboxes)
-        else:
+        try:
+            return self.mailbox_tree(status=False).names()
+        except MailboxErr:
             return None
 
-    @staticmethod
-    def _parse_mailboxes(mailboxes: list[None] | list[bytes | tuple[bytes, bytes]]) -> list[str]:
-        res = []
-        for mailbox in map(lambda x: x.decode("utf-8", errors="ignore"), mailboxes):
-            parsed_mailbox = IMAPClient._parse_mailbox(mailbox)
-            if parsed_mailbox:
-                res.append(parsed_mailbox)
-        return res
-
-    @staticmethod
-    def _parse_mailbox(mailbox: str) -> str | None:
-        if "\\noselect" in mailbox.casefold():
-            return
-        return imaputf7decode(mailbox.split('"')[-2])
+    def mailbox_tree(self, refresh: bool = False, status: bool = True) -> MailboxTree:
+        self._check_logged_in()
+        tree = self._mailbox_tree
+        if refresh or tree is None or tree.expired(self.mailbox_ttl) or (status and not tree.has_status):
+            tree = self._load_mailbox_tree(status)
+            self._mailbox_tree = tree
+        return tree
+
+    def invalidate_mailboxes(self) -> None:
+        self._mailbox_tree = None
+
+    def _load_mailbox_tree(self, status: bool) -> MailboxTree:
+        list_status = status and self._has_capability("LIST-STATUS")
+        if list_status:
+            options = f"STATUS {STATUS_ITEMS}"
+            if self._has_capability("SPECIAL-USE"):
+                options = "SPECIAL-USE " + options
+            res, mailboxes = self._connection._simple_command("LIST", '""', '"*"', "RETURN", f"({options})")
+            res, mailboxes = self._connection._untagged_response(res, mailboxes, "LIST")
+        else:
+            res, mailboxes = self._connection.list()
+        if res != "OK":
+            raise MailboxErr("Не удалось получить список папок")
+        tree = MailboxTree(parse_list_response(mailboxes), status)
+        if list_status:
+            tree.apply_status(parse_status_response(self._connection.response("STATUS")[1]))
+        elif status:
+            tree.apply_status(self._status_many(node.name for node in tree if node.selectable))
+        return tree
+
+    def _status_many(self, mailboxes: Iterable[str], window: int = 16) -> dict[str, MailboxStatus]:
+        responses: list[Response] = []
+        commands = (("STATUS", quote(self._encode_mailbox_utf7(mailbox)), STATUS_ITEMS) for mailbox in mailboxes)
+        for _ in self._pipeline(window).run(commands, router=lambda response, pending: responses.append(response)):
+            pass
+        return parse_status_response(part for response in responses if response.name == "STATUS"
+                                     for part in response.data)
 
     def select_mailbox(self, mailbox: str) -> (str, Any):
         self._check_logged_in()
-        res = self._connection.select(self._encode_mailbox_utf7(mailbox))
+        res = self._connection.select(quote(self._encode_mailbox_utf7(mailbox)))
         if res[0].casefold() == "ok":
             self._mailbox_selected = True
+            self._selected_mailbox = mailbox
+            self._uidvalidity = self._get_response_code("UIDVALIDITY")
+            self._uidnext = self._get_response_code("UIDNEXT")
+            self._highestmodseq = self._get_response_code("HIGHESTMODSEQ")
+            if self._cache and self._uidvalidity is not None:
+                self._cache.validate(self._cache_key())
+            if self._index and self._uidvalidity is not None:
+                self._index.validate(self._index_key())
+        else:
+            self._mailbox_selected = False
+            self._selected_mailbox = ""
+            self._uidvalidity = None
+            self._uidnext = None
+            self._highestmodseq = None
         return res
 
+    def _get_response_code(self, name: str) -> int | None:
+        _, data = self._connection.response(name)
+        if not data or data[-1] is None:
+            return None
+        try:
+            return int(data[-1])
+        except ValueError:
+            return None
+
+    @property
+    def capabilities(self) -> frozenset[str]:
+        if self._capabilities is None:
+            self._check_connection()
+            self._capabilities = frozenset(self._connection.capabilities)
+        return self._capabilities
+
+    @property
+    def username(self) -> str:
+        return self._login
+
+    @property
+    def sock(self) -> socket.socket:
+        self._check_connection()
+        return self._connection.sock
+
+    @property
+    def has_pending_input(self) -> bool:
+        self._check_connection()
+        return self._connection.file.buffered
+
+    def send_raw(self, data: bytes) -> None:
+        self._check_connection()
+        self._connection.send(data)
+
+    def raw_pipeline(self, window: int = 1, tag_prefix: str = "Z") -> Pipeline:
+        self._check_connection()
+        return Pipeline(self._connection, window, tag_prefix=tag_prefix)
+
+    def _has_capability(self, name: str) -> bool:
+        return name.upper() in self.capabilities
+
+    def _cache_key(self) -> MailboxKey | None:
+        if not self._cache or self._uidvalidity is None:
+            return None
+        return self._server, self._login, self._selected_mailbox, self._uidvalidity
+
+    def _index_key(self) -> MailboxKey | None:
+        if not self._index or self._uidvalidity is None:
+            return None
+        return self._server, self._login, self._selected_mailbox, self._uidvalidity
+
     @staticmethod
     def _encode_mailbox_utf7(mailbox: str) -> str:
-        mailbox_imap = []
-        for component in mailbox.split("/"):
-            mailbox_imap += [imaputf7encode(component).replace("/", ",")]
-        return "/".join(mailbox_imap)
+        return imaputf7encode(mailbox, "+,")
 
     def _check_mailbox_selected(self) -> None:
         self._check_logged_in()
         if not self._mailbox_selected:
             raise MailboxErr("Необходимо выбрать папку")
 
-    def list_emails(self, reverse: bool = True) -> Iterable[Email]:
+    def list_emails(self, reverse: bool = True, headers_only: bool = False, batch_size: int = 200,
+                    preview_size: int = 256, query: Query | None = None,
+                    sort: Iterable[str] | None = None) -> Iterable[Email]:
+        self._check_mailbox_selected()
+        if sort:
+            email_ids = self.sort(sort, query)
+            reverse = False
+        else:
+            email_ids = self.search(query).uids
+        yield from self.fetch_emails(email_ids[::-1] if reverse else email_ids, headers_only, batch_size, preview_size)
+
+    def fetch_emails(self, email_ids: Iterable[int], headers_only: bool = False, batch_size: int = 200,
+                     preview_size: int = 256) -> Iterable[Email]:
         self._check_mailbox_selected()
-        status, messages = self._connection.search(None, "ALL")
+        email_ids = [int(email_id) for email_id in email_ids]
+        if headers_only:
+            yield from self._build_brief_emails(email_ids, False, batch_size, preview_size)
+        else:
+            for email in self._build_emails(email_ids, False):
+                yield self._with_preview(email, preview_size)
+
+    @staticmethod
+    def _with_preview(email: Email | None, preview_size: int) -> Email | None:
+        if email is not None:
+            email.preview = None if preview_size == PREVIEW_SIZE else email.make_preview(preview_size)
+        return email
+
+    def search(self, query: Query | None = None, uids: bool = True) -> SearchResult:
+        self._check_mailbox_selected()
+        query = query or Query()
+        args = query.arguments()
+        if query.needs_charset:
+            args = ["CHARSET UTF-8"] + args
+        if not self._has_capability("ESEARCH"):
+            status, data, _ = self._uid_command("SEARCH", *args)
+            if status != "OK":
+                raise MailboxErr("Не удалось выполнить поиск писем")
+            res = self._parse_search_response(data)
+            return SearchResult(res, len(res), min(res, default=None), max(res, default=None))
+
+        returns = "(MIN MAX COUNT ALL)" if uids else "(MIN MAX COUNT)"
+        status, _, esearch = self._uid_command("SEARCH", f"RETURN {returns}", *args)
         if status != "OK":
-            raise StopIteration
-        yield from self._build_emails(messages, reverse)
+            raise MailboxErr("Не удалось выполнить поиск писем")
+        return self._parse_esearch_response(esearch)
+
+    @staticmethod
+    def _parse_esearch_response(data: list[ResponsePart | None]) -> SearchResult:
+        res = SearchResult()
+        for line in data:
+            if not line:
+                continue
+            items = [item.upper() for item in parse([line]) if isinstance(item, str) and item.upper() != "UID"]
+            values = dict(zip(items[::2], items[1::2]))
+            res.uids.extend(from_sequence_set(values["ALL"]) if "ALL" in values else [])
+            res.count += int(values.get("COUNT", 0))
+            res.min = int(values["MIN"]) if "MIN" in values else res.min
+            res.max = int(values["MAX"]) if "MAX" in values else res.max
+        return res
+
+    def sort(self, criteria: Iterable[str] = ("DATE",), query: Query | None = None, offset: int = 0,
+             limit: int | None = None) -> list[int]:
+        self._check_mailbox_selected()
+        if not self._has_capability("SORT"):
+            raise MailboxErr("Сервер не поддерживает сортировку")
+        query = query or Query()
+        criteria = [criterion.upper() for criterion in criteria]
+        status, data, _ = self._uid_command("SORT", f"({' '.join(criteria)})",
+                                            "UTF-8" if query.needs_charset else "US-ASCII", *query.arguments())
+        if status != "OK":
+            raise MailboxErr("Не удалось отсортировать письма")
+        res = self._parse_search_response(data)
+        return res[offset:offset + limit if limit is not None else None]
+
+    def thread(self, algorithm: str = "REFERENCES", query: Query | None = None) -> list[list[Any]]:
+        self._check_mailbox_selected()
+        if not self._has_capability(f"THREAD={algorithm}"):
+            raise MailboxErr(f"Сервер не поддерживает THREAD={algorithm.upper()}")
+        query = query or Query()
+        status, data, _ = self._uid_command("THREAD", algorithm.upper(),
+                                            "UTF-8" if query.needs_charset else "US-ASCII", *query.arguments())
+        if status != "OK":
+            raise MailboxErr("Не удалось сгруппировать письма")
+        return [self._parse_thread(thread) for line in data if line for thread in parse([line])]
+
+    @staticmethod
+    def _parse_thread(thread: list[Any]) -> list[Any]:
+        return [IMAPClient._parse_thread(item) if isinstance(item, list) else int(item) for item in thread]
+
+    def _pipeline(self, window: int) -> Pipeline:
+        return Pipeline(self._connection, window,
+                        literal_plus=self._has_capability("LITERAL+") or self._has_capability("LITERAL-"),
+                        literal_limit=None if self._has_capability("LITERAL+") else 4096)
+
+    def _uid_command(self, command: str, *args: str | bytes) -> tuple[str, list[ResponsePart | None],
+                                                                        list[ResponsePart | None]]:
+        if all(isinstance(arg, str) for arg in args):
+            status, data = self._connection.uid(command, *args)
+            esearch = self._connection.response("ESEARCH")[1] if self._has_capability("ESEARCH") else [None]
+            return status, data, esearch
+        pipelined = next(self._pipeline(1).run([("UID", command) + args]))
+        return pipelined.status, pipelined.untagged.pop_data(command), pipelined.untagged.pop_data("ESEARCH")
+
+    @staticmethod
+    def _parse_search_response(messages: list) -> list[int]:
+        res = []
+        for line in messages:
+            if line:
+                res.extend(int(email_id) for email_id in line.split())
+        return res
+
+    def _build_emails(self, email_ids: list[int], reverse: bool = True) -> Iterable[Email]:
+        if reverse:
+            email_ids = email_ids[::-1]
+        cache_key = self._cache_key()
+        cached = self._cache.get_many(cache_key, email_ids, complete=True) if cache_key else {}
+        self._index_cached(cached)
+        decoded = self._decode_emails(self.fetch_many([email_id for email_id in email_ids if email_id not in cached]))
+
+        for email_id in email_ids:
+            if email_id in cached:
+                yield cached[email_id]
+                continue
+            res = next(decoded)
+            if cache_key and res:
+                self._cache.put(cache_key, res)
+            self._index_email(res)
+            yield res
+
+    def _decode_emails(self, fetched: Iterable[tuple[int, list[ResponsePart | None] | None]]) -> Iterator[Email | None]:
+        create = partial(IMAPClient._create_email_from_bytes, keep_raw=self.keep_raw)
+        if self._decode_pool is None:
+            return (create(email_id, message_data) for email_id, message_data in fetched)
+        return self._decode_pool.starmap(create, fetched)
+
+    def fetch_many(self, email_ids: Iterable[int], items: str = "(RFC822)",
+                   window: int = 16) -> Iterable[tuple[int, list[ResponsePart | None] | None]]:
+        self._check_mailbox_selected()
+        email_ids = [int(email_id) for email_id in email_ids]
+        commands = (("UID", "FETCH", str(email_id), items) for email_id in email_ids)
+        for command in Pipeline(self._connection, window).run(commands, email_ids, route_by_uid):
+            yield command.key, command.untagged.pop_data("FETCH") if command.status == "OK" else None
+
+    def _build_brief_emails(self, email_ids: list[int], reverse: bool = True,
+                            batch_size: int = 200, preview_size: int = 256) -> Iterable[Email]:
+        if reverse:
+            email_ids = email_ids[::-1]
+        items = self._brief_fetch_items(preview_size)
+        cache_key = self._cache_key()
+
+        for start in range(0, len(email_ids), batch_size):
+            batch = email_ids[start:start + batch_size]
+            emails = self._cache.get_many(cache_key, batch, complete=False) if cache_key else {}
+            missing = [email_id for email_id in batch if email_id not in emails]
+            if missing:
+                status, message_data = self._connection.uid("FETCH", to_sequence_set(missing), items)
+                if status != "OK":
+                    return
+                for _, attributes in parse_fetch_response(message_data):
+                    if "UID" not in attributes or int(attributes["UID"]) not in missing:
+                        continue
+                    email_id = int(attributes["UID"])
+                    emails[email_id] = self._create_brief_email(email_id, attributes, preview_size)
+                    if cache_key:
+                        self._cache.put(cache_key, emails[email_id], complete=False)
+            for email_id in batch:
+                if email_id in emails:
+                    if emails[email_id].structure:
+                        emails[email_id].set_loader(partial(self._load_part, self._selected_mailbox,
+                                                            self._uidvalidity, email_id))
+                    yield emails[email_id]
+
+    def _load_part(self, mailbox: str, uidvalidity: int | None, email_id: int, part: BodyPart) -> bytes:
+        previous = self._selected_mailbox if self._mailbox_selected else ""
+        if previous != mailbox:
+            status, _ = self.select_mailbox(mailbox)
+            if status != "OK":
+                raise MailboxErr(f"Не удалось выбрать папку {mailbox}")
+        try:
+            if self._uidvalidity != uidvalidity:
+                raise MailboxErr(f"Папка {mailbox} была пересоздана, письмо {email_id} больше недоступно")
+            return self.fetch_part(email_id, part)
+        finally:
+            if previous and previous != mailbox:
+                self.select_mailbox(previous)
+
+    @staticmethod
+    def _brief_fetch_items(preview_size: int) -> str:
+        return (f"(UID FLAGS RFC822.SIZE BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({BRIEF_HEADER_FIELDS})] "
+                f"BODY.PEEK[TEXT]<0.{preview_size}>)")
 
-    def _build_emails(self, messages: list, reverse: bool = True) -> Iterable[Email]:
-        email_ids = messages[0].split()
+    @staticmethod
+    def _create_brief_email(email_id: int, attributes: dict[str, Any], preview_size: int) -> Email:
+        headers = find_attribute(attributes, "BODY[HEADER") or b""
+        text = find_attribute(attributes, "BODY[TEXT]") or b""
+        if isinstance(headers, str):
+            headers = headers.encode("utf-8")
+        if isinstance(text, str):
+            text = text.encode("utf-8")
+        msg = email.message_from_bytes(headers.rstrip(b"\r\n") + b"\r\n\r\n" + text)
+        IMAPClient._trim_partial_base64(msg)
+        size = attributes.get("RFC822.SIZE")
+        structure = attributes.get("BODYSTRUCTURE")
+        return Email(email_id,
+                     IMAPClient._get_sender(msg),
+                     IMAPClient._get_decoded_email_part(msg, "Subject"),
+                     date=IMAPClient._get_decoded_email_part(msg, "Date"),
+                     size=int(size) if size is not None else None,
+                     preview=IMAPClient._get_preview(msg, preview_size),
+                     structure=parse_bodystructure(structure) if isinstance(structure, list) else None,
+                     flags=attributes.get("FLAGS"))
+
+    @staticmethod
+    def _trim_partial_base64(message: Message) -> None:
+        for part in message.walk():
+            if part.is_multipart():
+                continue
+            if str(part.get("Content-Transfer-Encoding", "")).strip().lower() != "base64":
+                continue
+            payload = "".join(part.get_payload().split())
+            part.set_payload(payload[:len(payload) - len(payload) % 4])
 
-        for email_id in email_ids[::-1] if reverse else email_ids:
-            yield self.read_email(email_id)
+    @staticmethod
+    def _get_preview(message: Message, preview_size: int) -> str:
+        preview = " ".join(IMAPClient._get_body(message, preview_size))
+        return " ".join(preview.split())[:preview_size]
 
     @staticmethod
-    def _get_body(message: Message) -> list[str]:
+    @timed("get_body")
+    def _get_body(message: Message, limit: int | None = None) -> list[str]:
         content_type = message.get_content_type()
         if content_type == "multipart/alternative":
             return []
         content_disposition = str(message.get("Content-Disposition"))
         if "attachment" in content_disposition:
-            return [IMAPClient._get_decoded_filename(message)]
+            filename = IMAPClient._get_decoded_filename(message)
+            return [filename] if filename else []
         if "multipart" in content_type:
             res = []
             for part in list(message.walk())[1:]:
-                res.extend(IMAPClient._get_body(part))
+                res.extend(IMAPClient._get_body(part, limit))
             return res
         if content_type == "text/plain" and "attachment" not in content_disposition:
             return [IMAPClient._get_decoded_text_plain(message)]
         elif content_type == "text/html" and "attachment" not in content_disposition:
-            return [IMAPClient._get_decoded_text_html(message)]
+            return [IMAPClient._get_decoded_text_html(message, limit)]
         return []
 
     @staticmethod
+    @timed("decode")
     def _get_decoded_text_plain(message: Message) -> str:
         raw_payload = message.get_payload(decode=True)
         encoding = message.get_content_charset()
@@ -137,46 +572,119 @@ class IMAPClient:
         return raw_payload.decode(encoding, errors="ignore")
 
     @staticmethod
-    def _get_decoded_text_html(message: Message) -> str:
+    @timed("decode")
+    def _get_decoded_text_html(message: Message, limit: int | None = None) -> str:
         encoding = message.get_content_charset()
         if not encoding or encoding == "unknown-8bit":
             encoding = "utf-8"
         html_body = message.get_payload(decode=True).decode(
             encoding, errors="ignore"
         )
-        soup = BeautifulSoup(html_body, "html.parser")
-        return soup.get_text()
+        return html_to_text(html_body, limit)
 
     def read_email(self, email_id: int) -> Email | None:
         self._check_mailbox_selected()
-        status, message_data = self._connection.fetch(str(email_id), "(RFC822)")
+        cache_key = self._cache_key()
+        if cache_key:
+            cached = self._cache.get(cache_key, int(email_id))
+            if cached:
+                self._index_cached({cached.id: cached})
+                return cached
+        status, message_data = self._connection.uid("FETCH", str(email_id), "(RFC822)")
         if status != "OK":
             return None
-        return self._create_email_from_bytes(email_id, message_data)
+        res = self._create_email_from_bytes(int(email_id), message_data, self.keep_raw)
+        if cache_key and res:
+            self._cache.put(cache_key, res)
+        self._index_email(res)
+        return res
+
+    def _index_email(self, email: Email | None) -> None:
+        index_key = self._index_key()
+        if index_key and email:
+            self._index.add(index_key, email)
+
+    def _index_cached(self, emails: dict[int, Email]) -> None:
+        index_key = self._index_key()
+        if not index_key or not emails:
+            return
+        indexed = self._index.indexed_uids(index_key)
+        for email_id, email in emails.items():
+            if email_id not in indexed:
+                self._index.add(index_key, email)
+
+    def index_mailbox(self, mailbox: str) -> int:
+        if not self._index:
+            raise MailboxErr("Локальный индекс не подключён")
+        status, _ = self.select_mailbox(mailbox)
+        if status != "OK":
+            raise MailboxErr(f"Не удалось выбрать папку {mailbox}")
+        index_key = self._index_key()
+        if index_key is None:
+            raise MailboxErr(f"Сервер не сообщил UIDVALIDITY папки {mailbox}")
+        uids = self.search().uids
+        self._index.retain(index_key, uids)
+        indexed = self._index.indexed_uids(index_key)
+        return sum(1 for email in self.fetch_emails(uid for uid in uids if uid not in indexed) if email)
+
+    def search_local(self, query: str, mailbox: str | None = None, limit: int = 50) -> list[IndexHit]:
+        if not self._index:
+            raise MailboxErr("Локальный индекс не подключён")
+        return self._index.search(query, self._server or None, self._login or None, mailbox, limit)
+
+    def clone(self) -> "IMAPClient":
+        if not self._address:
+            raise ConnectionErr("Необходимо подключиться к серверу")
+        client = IMAPClient(self._cache, self._index, self._compress, self.mailbox_ttl, self._decode_pool,
+                            self.keep_raw)
+        server, port = self._address
+        if self._use_ssl:
+            client.connect_ssl(server, port, self._timeout, self._ssl_context, self._tls_session_or_none())
+        else:
+            client.connect_plain(server, port, self._timeout)
+        if self._logged_in:
+            client.login(self._login, self._password)
+        return client
+
+    def watch(self, mailboxes: Iterable[str], callback: EventCallback, watcher: MailboxWatcher | None = None,
+              idle_timeout: float = IDLE_TIMEOUT, poll_interval: float = POLL_INTERVAL) -> MailboxWatcher:
+        self._check_logged_in()
+        watcher = watcher or MailboxWatcher(callback, idle_timeout, poll_interval)
+        for mailbox in mailboxes:
+            watcher.add(self.clone(), mailbox, callback)
+        return watcher.start()
 
     @staticmethod
-    def _create_email_from_bytes(email_id: int, message_data:  list[None] | list[bytes | tuple[bytes, bytes]]) -> Email:
-        for message_part in message_data:
+    def _create_email_from_bytes(email_id: int, message_data: list[None] | list[bytes | tuple[bytes, bytes]] | None,
+                                 keep_raw: bool = False) -> Email | None:
+        for message_part in message_data or []:
             if IMAPClient._message_part_is_data(message_part):
-                return IMAPClient._create_email_from_data(email_id, message_part[1])
+                return IMAPClient._create_email_from_data(email_id, message_part[1], keep_raw)
 
     @staticmethod
-    def _create_email_from_data(email_id: int, data: bytes) -> Email:
+    @timed("create_email")
+    def _create_email_from_data(email_id: int, data: bytes, keep_raw: bool = False) -> Email:
         msg = email.message_from_bytes(data)
         return Email(email_id,
                      IMAPClient._get_sender(msg),
                      IMAPClient._get_decoded_email_part(msg, "Subject"),
-                     IMAPClient._get_body(msg))
+                     IMAPClient._get_body(msg),
+                     date=IMAPClient._get_decoded_email_part(msg, "Date"),
+                     size=len(data),
+                     raw=data if keep_raw else None)
 
     @staticmethod
+    @timed("decode")
     def _get_decoded_email_part(message: Message, part: str) -> str | None:
         raw_part = message.get(part)
-        part, encoding = decode_header(raw_part)[0] if raw_part else (None, None)
-        if not encoding or encoding == "unknown-8bit":
-            encoding = "utf-8"
-        if isinstance(part, bytes):
-            part = part.decode(encoding, errors="ignore")
-        return part
+        if not raw_part:
+            return None
+        res = []
+        for chunk, encoding in decode_header(raw_part):
+            if not encoding or encoding == "unknown-8bit":
+                encoding = "utf-8"
+            res.append(chunk.decode(encoding, errors="ignore") if isinstance(chunk, bytes) else chunk)
+        return "".join(res)
 
     @staticmethod
     def _get_sender(message: Message) -> str | None:
@@ -194,7 +702,7 @@ class IMAPClient:
 
     def download_attachments(self, email_id: str, download_path: str) -> None:
         self._check_mailbox_selected()
-        status, msg_data = self._connection.fetch(email_id, "(RFC822)")
+        status, msg_data = self._connection.uid("FETCH", str(email_id), "(RFC822)")
         if status != "OK":
             return
 
@@ -202,6 +710,92 @@ class IMAPClient:
             if self._message_part_is_data(response_part):
                 self._download_attachments_from_data(response_part[1], download_path)
 
+    def fetch_bodystructure(self, email_id: int) -> BodyPart | None:
+        self._check_mailbox_selected()
+        status, message_data = self._connection.uid("FETCH", str(email_id), "(UID BODYSTRUCTURE)")
+        if status != "OK":
+            return None
+        for _, attributes in parse_fetch_response(message_data):
+            if attributes.get("BODYSTRUCTURE"):
+                return parse_bodystructure(attributes["BODYSTRUCTURE"])
+        return None
+
+    def stream_attachments(self, email_id: int, download_path: str, names: Iterable[str] | None = None,
+                           content_types: Iterable[str] | None = None, max_size: int | None = None,
+                           chunk_size: int = 1024 * 1024, window: int = 4) -> list[str]:
+        structure = self.fetch_bodystructure(email_id)
+        if structure is None:
+            return []
+        res = []
+        for part in self._select_attachments(structure, names, content_types, max_size):
+            filepath = os.path.join(download_path, os.path.basename(part.filename))
+            with open(filepath, "wb") as f:
+                try:
+                    for chunk in self.iter_part(email_id, part, chunk_size, window):
+                        f.write(chunk)
+                except BaseException:
+                    f.close()
+                    os.remove(filepath)
+                    raise
+            res.append(filepath)
+        return res
+
+    @staticmethod
+    def _select_attachments(structure: BodyPart, names: Iterable[str] | None = None,
+                            content_types: Iterable[str] | None = None,
+                            max_size: int | None = None) -> list[BodyPart]:
+        names = list(names) if names is not None else None
+        content_types = [content_type.lower() for content_type in content_types] if content_types else None
+        res = []
+        for part in structure.walk():
+            if part.is_multipart or not part.is_attachment or not part.filename:
+                continue
+            if names is not None and not any(fnmatch(part.filename, pattern) for pattern in names):
+                continue
+            if content_types and not any(fnmatch(part.content_type, pattern) for pattern in content_types):
+                continue
+            if max_size is not None and part.decoded_size > max_size:
+                continue
+            res.append(part)
+        return res
+
+    def iter_part(self, email_id: int, part: BodyPart, chunk_size: int = 1024 * 1024,
+                  window: int = 4) -> Iterable[bytes]:
+        self._check_mailbox_selected()
+        decoder = stream_decoder(part.encoding)
+        offset = 0
+        while True:
+            offsets = list(range(offset, max(part.size, offset + 1), chunk_size))
+            commands = (("UID", "FETCH", str(email_id), f"(BODY.PEEK[{part.section}]<{start}.{chunk_size}>)")
+                        for start in offsets)
+            last_length = 0
+            for command in Pipeline(self._connection, window).run(commands, offsets):
+                chunk = self._get_part_chunk(command.untagged.pop_data("FETCH")) if command.status == "OK" else None
+                if chunk is None:
+                    raise MailboxErr(f"Не удалось загрузить часть {part.section} письма {email_id}")
+                last_length = len(chunk)
+                offset = command.key + last_length
+                yield decoder.feed(chunk)
+                if last_length < chunk_size:
+                    break
+            if last_length < chunk_size:
+                break
+        yield decoder.flush()
+
+    def fetch_part(self, email_id: int, part: BodyPart, chunk_size: int = 1024 * 1024) -> bytes:
+        return b"".join(self.iter_part(email_id, part, chunk_size))
+
+    @staticmethod
+    def _get_part_chunk(message_data: list[ResponsePart | None]) -> bytes | None:
+        for _, attributes in parse_fetch_response(message_data):
+            if not any(name.startswith("BODY[") for name in attributes):
+                continue
+            chunk = find_attribute(attributes, "BODY[")
+            if isinstance(chunk, str):
+                return chunk.encode("utf-8")
+            return chunk or b""
+        return None
+
     @staticmethod
     def _download_attachments_from_data(data: bytes, download_path: str) -> None:
         msg = email.message_from_bytes(data)
@@ -223,6 +817,8 @@ class IMAPClient:
     @staticmethod
     def _get_decoded_filename(message: Message) -> str | None:
         raw_filename = message.get_filename()
+        if not raw_filename:
+            return None
         filename, encoding = decode_header(raw_filename)[0]
         if not encoding or encoding == "unknown-8bit":
             encoding = "utf-8"
@@ -230,16 +826,156 @@ class IMAPClient:
             filename = filename.decode(encoding, errors="ignore")
         return filename
 
-    def upload_email(self, subject: str, body: str, recipient: str) -> None:
+    def upload_email(self, subject: str, body: str, recipient: str, mailbox: str = "INBOX") -> None:
         self._check_logged_in()
+        msg = self._build_message(self._login, subject, body, recipient)
+        self._connection.append(
+            quote(self._encode_mailbox_utf7(mailbox)), "", imaplib.Time2Internaldate(time.time()), msg.as_bytes()
+        )
+
+    def upload_emails(self, messages: Iterable[Message | bytes], mailbox: str = "INBOX",
+                      flags: str | None = None, batch_size: int = 50,
+                      window: int = 4) -> list[tuple[int, int] | None]:
+        self._check_logged_in()
+        if not self._has_capability("MULTIAPPEND"):
+            batch_size = 1
+        pipeline = self._pipeline(window)
+        prefix = ("APPEND", quote(self._encode_mailbox_utf7(mailbox)))
+        commands = (prefix + args for args in self._append_arguments(messages, flags, batch_size))
+        res = []
+        for command in pipeline.run(commands):
+            res.extend(self._parse_appenduid(command))
+        return res
+
+    @staticmethod
+    def _append_arguments(messages: Iterable[Message | bytes], flags: str | None,
+                          batch_size: int) -> Iterable[tuple[str | bytes, ...]]:
+        args = []
+        count = 0
+        for message in messages:
+            if isinstance(message, Message):
+                message = message.as_bytes()
+            if flags:
+                args.append(f"({flags})")
+            args.append(imaplib.Time2Internaldate(time.time()))
+            args.append(imaplib.MapCRLF.sub(imaplib.CRLF, message))
+            count += 1
+            if count == batch_size:
+                yield tuple(args)
+                args, count = [], 0
+        if args:
+            yield tuple(args)
+
+    @staticmethod
+    def _parse_appenduid(command: PipelinedCommand) -> list[tuple[int, int] | None]:
+        count = sum(isinstance(arg, bytes) for arg in command.args)
+        if command.status != "OK" or not command.code or command.code[0] != "APPENDUID" or not command.code[1]:
+            return [None] * count
+        uidvalidity, uids = command.code[1].decode("ascii").split()
+        uids = from_sequence_set(uids)
+        if len(uids) != count:
+            return [None] * count
+        return [(int(uidvalidity), uid) for uid in uids]
+
+    @staticmethod
+    def _build_message(sender: str, subject: str, body: str, recipient: str) -> EmailMessage:
         msg = EmailMessage()
-        msg["From"] = self._login
+        msg["From"] = sender
         msg["To"] = recipient
         msg["Subject"] = subject
         msg.set_content(body)
-        self._connection.append(
-            "INBOX", "", imaplib.Time2Internaldate(time.time()), msg.as_bytes()
-        )
+        return msg
+
+    def sync_state(self, mailbox: str) -> MailboxState | None:
+        return self._sync_states.get(mailbox)
+
+    def sync_mailbox(self, mailbox: str, preview_size: int = 256, state: MailboxState | None = None) -> SyncResult:
+        self._check_logged_in()
+        if state is not None:
+            self._sync_states[mailbox] = state
+        self._enable_sync_extensions()
+        status, _ = self.select_mailbox(mailbox)
+        if status != "OK":
+            raise MailboxErr(f"Не удалось выбрать папку {mailbox}")
+
+        previous = self._sync_states.get(mailbox)
+        state = MailboxState(self._uidvalidity, self._uidnext, self._highestmodseq)
+        if previous is None or previous.uidvalidity != state.uidvalidity:
+            state.uids = set(self._search_uids("ALL"))
+            result = SyncResult(mailbox, full=True)
+            new_uids = sorted(state.uids)
+        elif self._can_sync_changes(previous, state):
+            result = self._sync_changes(mailbox, previous)
+            new_uids = [uid for uid in self._search_uids(f"UID {previous.uidnext}:*") if uid >= previous.uidnext]
+            state.uids = (previous.uids - set(result.vanished)) | set(new_uids)
+        else:
+            state.uids = set(self._search_uids("ALL"))
+            result = SyncResult(mailbox, vanished=sorted(previous.uids - state.uids))
+            new_uids = sorted(state.uids - previous.uids)
+
+        result.new = list(self._build_brief_emails(new_uids, False, preview_size=preview_size))
+        cache_key = self._cache_key()
+        if cache_key and result.vanished:
+            self._cache.remove(cache_key, result.vanished)
+        index_key = self._index_key()
+        if index_key:
+            self._index.retain(index_key, state.uids)
+        self._sync_states[mailbox] = state
+        return result
+
+    def _enable_sync_extensions(self) -> None:
+        if self._enabled or self._connection.state != "AUTH" or not self._has_capability("ENABLE"):
+            return
+        for extension in ("QRESYNC", "CONDSTORE"):
+            if self._has_capability(extension):
+                status, _ = self._connection.enable(extension)
+                if status == "OK":
+                    self._enabled.add(extension)
+                    self._enabled.add("CONDSTORE")
+                    return
+
+    def _can_sync_changes(self, previous: MailboxState, state: MailboxState) -> bool:
+        return (self._has_capability("CONDSTORE")
+                and previous.uidnext is not None
+                and previous.highestmodseq is not None
+                and state.highestmodseq is not None)
+
+    def _sync_changes(self, mailbox: str, previous: MailboxState) -> SyncResult:
+        result = SyncResult(mailbox)
+        if previous.uidnext <= 1:
+            return result
+        qresync = "QRESYNC" in self._enabled
+        modifiers = f"(CHANGEDSINCE {previous.highestmodseq}{' VANISHED' if qresync else ''})"
+        status, message_data = self._connection.uid("FETCH", f"1:{previous.uidnext - 1}", "(UID FLAGS)", modifiers)
+        if status == "OK":
+            for _, attributes in parse_fetch_response(message_data):
+                if "UID" in attributes:
+                    result.changed[int(attributes["UID"])] = attributes.get("FLAGS") or []
+        if qresync:
+            result.vanished = self._get_vanished()
+        else:
+            current = set(self._search_uids(f"UID 1:{previous.uidnext - 1}"))
+            result.vanished = sorted(previous.uids - current)
+        for uid in result.vanished:
+            result.changed.pop(uid, None)
+        return result
+
+    def _get_vanished(self) -> list[int]:
+        _, data = self._connection.response("VANISHED")
+        res = []
+        for line in data:
+            if not line:
+                continue
+            if isinstance(line, bytes):
+                line = line.decode("ascii", errors="ignore")
+            res.extend(from_sequence_set(line.replace("(EARLIER)", "").strip()))
+        return sorted(set(res))
+
+    def _search_uids(self, *criteria: str) -> list[int]:
+        status, messages = self._connection.uid("SEARCH", *criteria)
+        if status != "OK":
+            raise MailboxErr("Не удалось выполнить поиск писем")
+        return self._parse_search_response(messages)
 
     def close(
         self,
@@ -248,6 +984,11 @@ class IMAPClient:
         self._login = ""
         self._password = ""
         self._mailbox_selected = False
+        self._selected_mailbox = ""
+        self._uidvalidity = None
+        self._enabled = set()
+        self._capabilities = None
+        self._mailbox_tree = None
         if self._connection:
             res = self._connection.logout()
             self._connection = None
@@ -0,0 +1,49 @@
+import os
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator
+
+POOL_KINDS = ("process", "thread")
+
+
+class DecodePool:
+    def __init__(self, workers: int | None = None, kind: str = "process", window: int | None = None) -> None:
+        if kind not in POOL_KINDS:
+            raise ValueError(f"Неизвестный тип пула: {kind}")
+        self.workers = workers or os.cpu_count() or 1
+        self.kind = kind
+        self.window = window or self.workers * 4
+        self._executor: Executor | None = None
+
+    def starmap(self, func: Callable[..., Any], items: Iterable[tuple[Any, ...]]) -> Iterator[Any]:
+        executor = self._get_executor()
+        pending: deque[Future] = deque()
+        try:
+            for args in items:
+                pending.append(executor.submit(func, *args))
+                if len(pending) >= self.window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="decode")
+        return self._executor
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self) -> "DecodePool":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -1,45 +1,182 @@
-import base64
+import binascii
+import codecs
+import re
+from functools import lru_cache, partial
+from html.parser import HTMLParser
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+
+IMAP_UTF7_CACHE_SIZE = 16384
+IMAP_UTF7_CODEC = "imap4-utf-7"
+
+_UNPRINTABLE_RE = re.compile(r"[^\x20-\x7e]+")
 
 
 def b64padanddecode(b) -> str:
     b += (-len(b) % 4) * "="
-    return base64.b64decode(b, altchars="+,", validate=True).decode("utf-16-be")
-
-
-def imaputf7decode(s):
-    lst = s.split("&")
-    out = lst[0]
-    for e in lst[1:]:
-        u, a = e.split("-", 1)
-        if u == "":
-            out += "&"
-        else:
-            out += b64padanddecode(u)
-        out += a
-    return out
-
-
-def imaputf7encode(s) -> str:
-    s = s.replace("&", "&-")
-    unipart = out = ""
-    for c in s:
-        if 0x20 <= ord(c) <= 0x7F:
-            if unipart != "":
-                out += (
-                    "&"
-                    + base64.b64encode(unipart.encode("utf-16-be"))
-                    .decode("ascii")
-                    .rstrip("=")
-                    + "-"
-                )
-                unipart = ""
-            out += c
-        else:
-            unipart += c
-    if unipart != "":
-        out += (
-            "&"
-            + base64.b64encode(unipart.encode("utf-16-be")).decode("ascii").rstrip("=")
-            + "-"
-        )
-    return out
+    return binascii.a2b_base64(b.replace(",", "/").encode("ascii"), strict_mode=True).decode("utf-16-be")
+
+
+@lru_cache(maxsize=IMAP_UTF7_CACHE_SIZE)
+def imaputf7decode(s: str) -> str:
+    if "&" not in s:
+        return s
+    parts = s.split("&")
+    res = [parts[0]]
+    for part in parts[1:]:
+        shifted, separator, direct = part.partition("-")
+        if not separator:
+            raise ValueError(f"Незавершённая последовательность modified UTF-7: &{part}")
+        res.append(b64padanddecode(shifted) if shifted else "&")
+        res.append(direct)
+    return "".join(res)
+
+
+@lru_cache(maxsize=IMAP_UTF7_CACHE_SIZE)
+def imaputf7encode(s: str, altchars: str = "+/") -> str:
+    if "&" in s:
+        s = s.replace("&", "&-")
+    if s.isascii() and s.isprintable():
+        return s
+    return _UNPRINTABLE_RE.sub(partial(_encode_unprintable, altchars[1]), s)
+
+
+def _encode_unprintable(slash: str, match: re.Match) -> str:
+    encoded = binascii.b2a_base64(match.group().encode("utf-16-be"), newline=False).decode("ascii")
+    return "&" + encoded.rstrip("=").replace("/", slash) + "-"
+
+
+def _imap_utf7_encode(value: str, errors: str = "strict") -> tuple[bytes, int]:
+    return imaputf7encode(value, "+,").encode("ascii"), len(value)
+
+
+def _imap_utf7_decode(value: bytes, errors: str = "strict") -> tuple[str, int]:
+    data = bytes(value)
+    try:
+        return imaputf7decode(data.decode("ascii")), len(data)
+    except ValueError as e:
+        raise UnicodeDecodeError(IMAP_UTF7_CODEC, data, 0, len(data), str(e)) from e
+
+
+def _search_codec(name: str) -> codecs.CodecInfo | None:
+    if name.replace("_", "-") != IMAP_UTF7_CODEC:
+        return None
+    return codecs.CodecInfo(_imap_utf7_encode, _imap_utf7_decode, name=IMAP_UTF7_CODEC)
+
+
+codecs.register(_search_codec)
+
+
+class StreamDecoder:
+    def feed(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class Base64StreamDecoder(StreamDecoder):
+    def __init__(self) -> None:
+        self._pending = b""
+
+    def feed(self, data: bytes) -> bytes:
+        data = self._pending + b"".join(data.split())
+        cut = len(data) - len(data) % 4
+        self._pending = data[cut:]
+        return binascii.a2b_base64(data[:cut])
+
+    def flush(self) -> bytes:
+        pending, self._pending = self._pending, b""
+        try:
+            return binascii.a2b_base64(pending + (-len(pending) % 4) * b"=")
+        except binascii.Error:
+            return b""
+
+
+class QuotedPrintableStreamDecoder(StreamDecoder):
+    def __init__(self) -> None:
+        self._pending = b""
+
+    def feed(self, data: bytes) -> bytes:
+        data = self._pending + data
+        cut = data.rfind(b"\n") + 1
+        self._pending = data[cut:]
+        return binascii.a2b_qp(data[:cut])
+
+    def flush(self) -> bytes:
+        pending, self._pending = self._pending, b""
+        return binascii.a2b_qp(pending)
+
+
+def stream_decoder(encoding: str | None) -> StreamDecoder:
+    encoding = (encoding or "").lower()
+    if encoding == "base64":
+        return Base64StreamDecoder()
+    if encoding == "quoted-printable":
+        return QuotedPrintableStreamDecoder()
+    return StreamDecoder()
+
+
+def decode_text(data: bytes, charset: str | None) -> str:
+    if not charset or charset == "unknown-8bit":
+        charset = "utf-8"
+    try:
+        return data.decode(charset, errors="ignore")
+    except LookupError:
+        return data.decode("utf-8", errors="ignore")
+
+
+class _LimitReached(Exception):
+    pass
+
+
+class _TextExtractor(HTMLParser):
+    SKIPPED_TAGS = ("script", "style")
+
+    def __init__(self, limit: int | None = None) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self._limit = limit
+        self._size = 0
+        self._skipped = 0
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if tag in self.SKIPPED_TAGS:
+            self._skipped += 1
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self.SKIPPED_TAGS and self._skipped:
+            self._skipped -= 1
+
+    def handle_data(self, data: str) -> None:
+        if not self._skipped:
+            self._append(data)
+
+    def unknown_decl(self, data: str) -> None:
+        if data.startswith("CDATA["):
+            self._append(data[6:])
+
+    def _append(self, data: str) -> None:
+        self.parts.append(data)
+        if self._limit is not None:
+            self._size += len("".join(data.split()))
+            if self._size >= self._limit:
+                raise _LimitReached
+
+
+def html_to_text(html: str, limit: int | None = None, backend: str = "html.parser") -> str:
+    if backend == "bs4":
+        if BeautifulSoup is None:
+            raise ImportError("Для backend='bs4' необходимо установить beautifulsoup4")
+        return BeautifulSoup(html, "html.parser").get_text()
+    extractor = _TextExtractor(limit)
+    try:
+        extractor.feed(html)
+        extractor.close()
+    except _LimitReached:
+        pass
+    return "".join(extractor.parts)
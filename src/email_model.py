@@ -1,9 +1,200 @@
+import json
+import sys
+from functools import lru_cache
+from typing import Any, Callable, Iterable
+from src.bodystructure import BodyPart
+from src.decoder import decode_text, html_to_text
+
+PREVIEW_SIZE = 256
+
+PartLoader = Callable[[BodyPart], bytes]
+
+
+class PartNotLoadedErr(Exception):
+    pass
+
+
+class MessagePart:
+    __slots__ = ("structure", "loader", "_content")
+
+    def __init__(self, structure: BodyPart, loader: PartLoader | None = None) -> None:
+        self.structure = structure
+        self.loader = loader
+        self._content: bytes | None = None
+
+    @property
+    def section(self) -> str:
+        return self.structure.section
+
+    @property
+    def content_type(self) -> str:
+        return self.structure.content_type
+
+    @property
+    def filename(self) -> str | None:
+        return self.structure.filename
+
+    @property
+    def size(self) -> int:
+        return self.structure.size
+
+    @property
+    def is_attachment(self) -> bool:
+        return self.structure.is_attachment
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._content is not None
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            if self.loader is None:
+                raise PartNotLoadedErr(f"Часть {self.section} письма не загружена")
+            self._content = self.loader(self.structure)
+        return self._content
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {"structure": self.structure, "_content": self._content}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.structure = state["structure"]
+        self.loader = None
+        self._content = state.get("_content")
+
+    @property
+    def text(self) -> str | None:
+        if self.structure.maintype != "text":
+            return None
+        text = decode_text(self.content, self.structure.charset)
+        if self.structure.subtype == "html":
+            return html_to_text(text)
+        return text
+
+
 class Email:
-    def __init__(self, email_id: int, sender: str = "", description: str = "", body: list[str] | None = None) -> None:
+    __slots__ = ("id", "sender", "description", "_body", "date", "size", "flags", "_preview", "structure", "_raw",
+                 "_loader", "_parts")
+
+    def __init__(self, email_id: int, sender: str = "", description: str = "", body: list[str] | None = None,
+                 date: str | None = None, size: int | None = None, preview: str | None = None,
+                 structure: BodyPart | None = None, flags: Iterable[str] | None = None,
+                 raw: bytes | memoryview | None = None) -> None:
         self.id = email_id
-        self.sender = sender
+        self.sender = sys.intern(sender) if sender else sender
         self.description = description
-        self.body = body if body else []
+        self._body = [] if body is None and structure is None else body
+        self.date = date
+        self.size = size
+        self.flags = _intern_flags(tuple(flags)) if flags else ()
+        self._preview = preview
+        self.structure = structure
+        self._raw = memoryview(raw) if raw is not None else None
+        self._loader: PartLoader | None = None
+        self._parts: list[MessagePart] | None = None
+
+    @property
+    def uid(self) -> int:
+        return self.id
+
+    @property
+    def body(self) -> list[str]:
+        if self._body is None:
+            if self._loader is None:
+                return []
+            self._body = self._load_body()
+        return self._body
+
+    @body.setter
+    def body(self, body: list[str]) -> None:
+        self._body = body
+
+    @property
+    def preview(self) -> str:
+        if self._preview is None:
+            self._preview = self.make_preview()
+        return self._preview
+
+    @preview.setter
+    def preview(self, preview: str | None) -> None:
+        self._preview = preview
+
+    def make_preview(self, size: int = PREVIEW_SIZE) -> str:
+        return " ".join(" ".join(self._body or []).split())[:size]
+
+    @property
+    def raw(self) -> memoryview | None:
+        return self._raw
+
+    @raw.setter
+    def raw(self, raw: bytes | memoryview | None) -> None:
+        self._raw = memoryview(raw) if raw is not None else None
+
+    @property
+    def parts(self) -> list[MessagePart]:
+        if self._parts is None:
+            structures = self.structure.walk() if self.structure else []
+            self._parts = [MessagePart(part, self._loader) for part in structures if not part.children]
+        return self._parts
+
+    def set_loader(self, loader: PartLoader | None) -> None:
+        self._loader = loader
+        for part in self._parts or []:
+            part.loader = loader
+
+    def _load_body(self) -> list[str]:
+        res = []
+        for part in self.parts:
+            if part.is_attachment:
+                if part.filename:
+                    res.append(part.filename)
+            elif part.content_type in ("text/plain", "text/html"):
+                res.append(part.text)
+        return res
 
     def add_body_component(self, component: str) -> None:
         self.body.append(component)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "sender": self.sender,
+            "description": self.description,
+            "body": self._body,
+            "date": self.date,
+            "size": self.size,
+            "preview": self._preview,
+            "structure": self.structure.to_dict() if self.structure else None,
+            "flags": list(self.flags),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "Email":
+        structure = BodyPart.from_dict(data["structure"]) if data.get("structure") else None
+        return cls(data["id"], data.get("sender"), data.get("description"), data.get("body"),
+                   date=data.get("date"), size=data.get("size"), preview=data.get("preview"), structure=structure,
+                   flags=data.get("flags"))
+
+    def to_json(self) -> bytes:
+        data = {key: value for key, value in self.to_dict().items()
+                if value is not None and (value != [] or key == "body")}
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    @classmethod
+    def from_json(cls, data: bytes | str) -> "Email":
+        return cls.from_dict(json.loads(data))
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = {name: getattr(self, name) for name in self.__slots__ if name != "_loader"}
+        state["_raw"] = self._raw.tobytes() if self._raw is not None else None
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        for name in self.__slots__:
+            setattr(self, name, state.get(name))
+        self.raw = self._raw
+
+
+@lru_cache(maxsize=256)
+def _intern_flags(flags: tuple[str, ...]) -> tuple[str, ...]:
+    return tuple(sys.intern(flag) for flag in flags)
@@ -0,0 +1,213 @@
+import imaplib
+import json
+import os
+import re
+import socket
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Literal
+from src.client import MailboxErr
+from src.parser import parse_fetch_response
+from src.pool import IMAPConnectionPool
+
+EXPORT_FETCH_ITEMS = "(UID FLAGS INTERNALDATE BODY.PEEK[])"
+MAILDIR_FLAGS = {"\\DRAFT": "D", "\\FLAGGED": "F", "\\ANSWERED": "R", "\\SEEN": "S", "\\DELETED": "T"}
+
+_FROM_LINE_RE = re.compile(rb"^(>*From )", re.MULTILINE)
+
+ExportFormat = Literal["mbox", "maildir"]
+RawMessage = tuple[int, bytes, list[str], str | None]
+
+
+class ExportErr(Exception):
+    pass
+
+
+class ExportStats:
+    def __init__(self) -> None:
+        self.total = 0
+        self.skipped = 0
+        self.messages = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        self.last_uid = 0
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.messages / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.bytes / 1024 / 1024 / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self) -> dict[str, int | float]:
+        res = dict(vars(self))
+        res["messages_per_second"] = self.messages_per_second
+        res["megabytes_per_second"] = self.megabytes_per_second
+        return res
+
+
+class _ExportState:
+    def __init__(self, path: str, mailbox: str, uidvalidity: int, last_uid: int = 0, offset: int = 0) -> None:
+        self.path = path
+        self.mailbox = mailbox
+        self.uidvalidity = uidvalidity
+        self.last_uid = last_uid
+        self.offset = offset
+
+    @classmethod
+    def load(cls, path: str, mailbox: str, uidvalidity: int) -> "_ExportState":
+        if not os.path.exists(path):
+            return cls(path, mailbox, uidvalidity)
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data["mailbox"] != mailbox or data["uidvalidity"] != uidvalidity:
+            raise ExportErr(f"Экспорт в {path} был начат для другой папки или UIDVALIDITY изменился")
+        return cls(path, mailbox, uidvalidity, data["last_uid"], data.get("offset", 0))
+
+    def save(self) -> None:
+        data = {"mailbox": self.mailbox, "uidvalidity": self.uidvalidity,
+                "last_uid": self.last_uid, "offset": self.offset}
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(self.path + ".tmp", self.path)
+
+
+class _MboxWriter:
+    def __init__(self, path: str, offset: int) -> None:
+        self._file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        self._file.truncate(offset)
+        self._file.seek(offset)
+
+    def write(self, uid: int, raw: bytes, flags: list[str], internaldate: str | None) -> None:
+        date = time.asctime(_parse_internaldate(internaldate))
+        raw = _FROM_LINE_RE.sub(rb">\1", raw.replace(b"\r\n", b"\n"))
+        self._file.write(f"From MAILER-DAEMON {date}\n".encode("ascii") + raw.rstrip(b"\n") + b"\n\n")
+
+    def commit(self, state: _ExportState) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        state.offset = self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _MaildirWriter:
+    def __init__(self, path: str, uidvalidity: int) -> None:
+        self._path = path
+        self._prefix = f"U{uidvalidity}"
+        self._hostname = socket.gethostname().replace("/", "\\057").replace(":", "\\072")
+        for subdir in ("tmp", "new", "cur"):
+            os.makedirs(os.path.join(path, subdir), exist_ok=True)
+
+    def write(self, uid: int, raw: bytes, flags: list[str], internaldate: str | None) -> None:
+        timestamp = int(time.mktime(_parse_internaldate(internaldate)))
+        name = f"{timestamp}.{self._prefix}_{uid}.{self._hostname}"
+        maildir_flags = "".join(sorted(MAILDIR_FLAGS[flag.upper()] for flag in flags if flag.upper() in MAILDIR_FLAGS))
+        if "\\SEEN" in (flag.upper() for flag in flags):
+            target = os.path.join(self._path, "cur", f"{name}:2,{maildir_flags}")
+        else:
+            target = os.path.join(self._path, "new", name)
+        tmp_path = os.path.join(self._path, "tmp", name)
+        with open(tmp_path, "wb") as f:
+            f.write(raw)
+        os.utime(tmp_path, (timestamp, timestamp))
+        os.replace(tmp_path, target)
+
+    def commit(self, state: _ExportState) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def export_mailbox(pool: IMAPConnectionPool, mailbox: str, dest: str, format: ExportFormat = "mbox",
+                   username: str | None = None, workers: int | None = None, batch_size: int = 25,
+                   progress: Callable[[ExportStats], None] | None = None) -> ExportStats:
+    if format not in ("mbox", "maildir"):
+        raise ExportErr(f"Неизвестный формат экспорта: {format}")
+    with pool.connection(username, mailbox) as client:
+        uidvalidity = client.uidvalidity
+        uids = sorted(client.search().uids)
+    if uidvalidity is None:
+        raise MailboxErr(f"Сервер не сообщил UIDVALIDITY папки {mailbox}")
+
+    state_path = _state_path(dest, format)
+    if format == "mbox" and not os.path.exists(state_path) and os.path.exists(dest) and os.path.getsize(dest):
+        raise ExportErr(f"Файл {dest} уже существует")
+    state = _ExportState.load(state_path, mailbox, uidvalidity)
+    stats = ExportStats()
+    stats.total = len(uids)
+    stats.last_uid = state.last_uid
+    uids = [uid for uid in uids if uid > state.last_uid]
+    stats.skipped = stats.total - len(uids)
+
+    writer = _MboxWriter(dest, state.offset) if format == "mbox" else _MaildirWriter(dest, uidvalidity)
+    batches = (uids[start:start + batch_size] for start in range(0, len(uids), batch_size))
+    workers = workers or pool.max_connections
+    pending: deque[tuple[list[int], Future[list[RawMessage]]]] = deque()
+    started = time.monotonic()
+    try:
+        with ThreadPoolExecutor(workers) as executor:
+            try:
+                while True:
+                    while len(pending) <= workers:
+                        batch = next(batches, None)
+                        if batch is None:
+                            break
+                        pending.append((batch, executor.submit(_fetch_batch, pool, username, mailbox, batch)))
+                    if not pending:
+                        break
+                    batch, future = pending.popleft()
+                    for message in future.result():
+                        writer.write(*message)
+                        stats.messages += 1
+                        stats.bytes += len(message[1])
+                    writer.commit(state)
+                    state.last_uid = stats.last_uid = batch[-1]
+                    state.save()
+                    stats.elapsed = time.monotonic() - started
+                    if progress:
+                        progress(stats)
+            except BaseException:
+                executor.shutdown(cancel_futures=True)
+                raise
+    finally:
+        writer.close()
+    stats.elapsed = time.monotonic() - started
+    return stats
+
+
+def _fetch_batch(pool: IMAPConnectionPool, username: str | None, mailbox: str, uids: list[int]) -> list[RawMessage]:
+    res = []
+    with pool.connection(username, mailbox) as client:
+        for uid, message_data in client.fetch_many(uids, EXPORT_FETCH_ITEMS):
+            if message_data is None:
+                raise ExportErr(f"Не удалось получить письмо {uid}")
+            for _, attributes in parse_fetch_response(message_data):
+                if "BODY[]" in attributes and str(attributes.get("UID")) == str(uid):
+                    res.append(_get_raw_message(uid, attributes))
+    return res
+
+
+def _get_raw_message(uid: int, attributes: dict[str, Any]) -> RawMessage:
+    raw = attributes["BODY[]"]
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    return uid, raw, attributes.get("FLAGS") or [], attributes.get("INTERNALDATE")
+
+
+def _parse_internaldate(internaldate: str | None) -> time.struct_time:
+    if internaldate:
+        parsed = imaplib.Internaldate2tuple(f'INTERNALDATE "{internaldate}"'.encode("ascii"))
+        if parsed:
+            return parsed
+    return time.localtime()
+
+
+def _state_path(dest: str, format: ExportFormat) -> str:
+    if format == "maildir":
+        return os.path.join(dest, ".export-state")
+    return dest + ".export-state"
@@ -0,0 +1,200 @@
+import functools
+import threading
+import time
+from typing import Any, Callable, TypeVar
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class CommandEvent:
+    def __init__(self, tag: str, name: str, elapsed: float, bytes_sent: int = 0, bytes_received: int = 0,
+                 status: str | None = None) -> None:
+        self.tag = tag
+        self.name = name
+        self.elapsed = elapsed
+        self.bytes_sent = bytes_sent
+        self.bytes_received = bytes_received
+        self.status = status
+
+
+class Observer:
+    def on_command(self, event: CommandEvent) -> None:
+        pass
+
+    def on_stage(self, stage: str, elapsed: float) -> None:
+        pass
+
+
+class Instrumentation:
+    def __init__(self) -> None:
+        self.observers: list[Observer] = []
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.observers)
+
+    def subscribe(self, observer: Observer) -> Observer:
+        if observer not in self.observers:
+            self.observers = [*self.observers, observer]
+        return observer
+
+    def unsubscribe(self, observer: Observer) -> None:
+        self.observers = [item for item in self.observers if item is not observer]
+
+    def command(self, event: CommandEvent) -> None:
+        for observer in self.observers:
+            observer.on_command(event)
+
+    def stage(self, stage: str, elapsed: float) -> None:
+        for observer in self.observers:
+            observer.on_stage(stage, elapsed)
+
+    def measure(self, stage: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        active = self._local.__dict__.setdefault("active", set())
+        if stage in active:
+            return func(*args, **kwargs)
+        active.add(stage)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            active.discard(stage)
+            self.stage(stage, time.perf_counter() - started)
+
+
+instrumentation = Instrumentation()
+
+
+def timed(stage: str) -> Callable[[F], F]:
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not instrumentation.observers:
+                return func(*args, **kwargs)
+            return instrumentation.measure(stage, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def command_name(name: str, args: tuple[Any, ...]) -> str:
+    if name.upper() == "UID" and args and isinstance(args[0], str):
+        return f"UID {args[0].upper()}"
+    return name.upper()
+
+
+class CommandStats:
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def add(self, event: CommandEvent) -> None:
+        self.count += 1
+        self.errors += event.status not in ("OK", "BYE")
+        self.seconds += event.elapsed
+        self.max_seconds = max(self.max_seconds, event.elapsed)
+        self.bytes_sent += event.bytes_sent
+        self.bytes_received += event.bytes_received
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if event.elapsed <= bound:
+                self.buckets[index] += 1
+                break
+
+    def quantile(self, q: float) -> float:
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_seconds)
+        return self.max_seconds
+
+
+class StatsCollector(Observer):
+    def __init__(self) -> None:
+        self.commands: dict[str, CommandStats] = {}
+        self.stages: dict[str, tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def on_command(self, event: CommandEvent) -> None:
+        with self._lock:
+            stats = self.commands.get(event.name)
+            if stats is None:
+                stats = self.commands[event.name] = CommandStats()
+            stats.add(event)
+
+    def on_stage(self, stage: str, elapsed: float) -> None:
+        with self._lock:
+            count, seconds = self.stages.get(stage, (0, 0.0))
+            self.stages[stage] = (count + 1, seconds + elapsed)
+
+    def snapshot(self) -> tuple[list[tuple[str, CommandStats]], list[tuple[str, tuple[int, float]]]]:
+        with self._lock:
+            return sorted(self.commands.items()), sorted(self.stages.items())
+
+    def summary(self) -> str:
+        lines = [f"{'Команда':<16} {'число':>7} {'ошибки':>7} {'всего, с':>9} {'p50, мс':>8} {'p99, мс':>8} "
+                 f"{'макс, мс':>9} {'отправлено':>11} {'получено':>11}"]
+        commands, stages = self.snapshot()
+        for name, stats in sorted(commands, key=lambda item: -item[1].seconds):
+            lines.append(f"{name:<16} {stats.count:>7} {stats.errors:>7} {stats.seconds:>9.3f} "
+                         f"{stats.quantile(0.5) * 1000:>8.1f} {stats.quantile(0.99) * 1000:>8.1f} "
+                         f"{stats.max_seconds * 1000:>9.1f} {stats.bytes_sent:>11} {stats.bytes_received:>11}")
+        for stage, (count, seconds) in stages:
+            lines.append(f"{stage:<16} {count:>7} {'':>7} {seconds:>9.3f}")
+        return "\n".join(lines)
+
+
+class OpenMetricsExporter:
+    def __init__(self, collector: StatsCollector, prefix: str = "imap") -> None:
+        self.collector = collector
+        self.prefix = prefix
+
+    def render(self) -> str:
+        p = self.prefix
+        commands, stages = self.collector.snapshot()
+        lines = [f"# TYPE {p}_command_duration_seconds histogram", f"# UNIT {p}_command_duration_seconds seconds",
+                 f"# HELP {p}_command_duration_seconds IMAP command round-trip time."]
+        for name, stats in commands:
+            label = f'command="{_escape(name)}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += count
+                lines.append(f'{p}_command_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{p}_command_duration_seconds_bucket{{{label},le="+Inf"}} {stats.count}')
+            lines.append(f"{p}_command_duration_seconds_count{{{label}}} {stats.count}")
+            lines.append(f"{p}_command_duration_seconds_sum{{{label}}} {stats.seconds}")
+        for metric, unit, attribute, help_text in (
+            ("command_errors", None, "errors", "IMAP commands completed without OK."),
+            ("sent_bytes", "bytes", "bytes_sent", "Bytes sent on the wire per IMAP command."),
+            ("received_bytes", "bytes", "bytes_received", "Bytes received on the wire per IMAP command."),
+        ):
+            lines.append(f"# TYPE {p}_{metric} counter")
+            if unit:
+                lines.append(f"# UNIT {p}_{metric} {unit}")
+            lines.append(f"# HELP {p}_{metric} {help_text}")
+            for name, stats in commands:
+                lines.append(f'{p}_{metric}_total{{command="{_escape(name)}"}} {getattr(stats, attribute)}')
+        lines += [f"# TYPE {p}_stage_duration_seconds counter", f"# UNIT {p}_stage_duration_seconds seconds",
+                  f"# HELP {p}_stage_duration_seconds Time spent in client-side parsing and decoding."]
+        lines += [f'{p}_stage_duration_seconds_total{{stage="{_escape(stage)}"}} {seconds}'
+                  for stage, (_, seconds) in stages]
+        lines += [f"# TYPE {p}_stage_calls counter", f"# HELP {p}_stage_calls Calls of client-side stages."]
+        lines += [f'{p}_stage_calls_total{{stage="{_escape(stage)}"}} {count}' for stage, (count, _) in stages]
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
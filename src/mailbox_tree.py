@@ -0,0 +1,146 @@
+import time
+from typing import Any, Iterable, Iterator
+from src.decoder import imaputf7decode
+from src.parser import parse
+
+SPECIAL_USE_FLAGS = ("\\All", "\\Archive", "\\Drafts", "\\Flagged", "\\Junk", "\\Sent", "\\Trash")
+STATUS_ITEMS = "(MESSAGES UNSEEN UIDNEXT)"
+
+MailboxStatus = dict[str, int]
+
+
+class MailboxNode:
+    def __init__(self, name: str, delimiter: str | None = None, flags: list[str] | None = None) -> None:
+        self.name = name
+        self.delimiter = delimiter
+        self.flags = flags if flags else []
+        self.parent: MailboxNode | None = None
+        self.children: list[MailboxNode] = []
+        self.messages: int | None = None
+        self.unseen: int | None = None
+        self.uidnext: int | None = None
+
+    @property
+    def leaf_name(self) -> str:
+        if not self.delimiter:
+            return self.name
+        return self.name.rsplit(self.delimiter, 1)[-1]
+
+    @property
+    def depth(self) -> int:
+        return 0 if self.parent is None else self.parent.depth + 1
+
+    @property
+    def selectable(self) -> bool:
+        return not any(flag.casefold() in ("\\noselect", "\\nonexistent") for flag in self.flags)
+
+    @property
+    def special_use(self) -> str | None:
+        for flag in self.flags:
+            for special_use in SPECIAL_USE_FLAGS:
+                if flag.casefold() == special_use.casefold():
+                    return special_use
+        return None
+
+    def set_status(self, status: MailboxStatus) -> None:
+        self.messages = status.get("MESSAGES", self.messages)
+        self.unseen = status.get("UNSEEN", self.unseen)
+        self.uidnext = status.get("UIDNEXT", self.uidnext)
+
+    def walk(self) -> Iterator["MailboxNode"]:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+class MailboxTree:
+    def __init__(self, nodes: Iterable[MailboxNode], has_status: bool = False) -> None:
+        self._nodes: dict[str, MailboxNode] = {}
+        self.roots: list[MailboxNode] = []
+        self.has_status = has_status
+        self.loaded_at = time.monotonic()
+        for node in nodes:
+            self._nodes[_key(node.name)] = node
+        for node in list(self._nodes.values()):
+            self._attach(node)
+
+    def _attach(self, node: MailboxNode) -> None:
+        if node.delimiter and node.delimiter in node.name:
+            parent_name = node.name.rsplit(node.delimiter, 1)[0]
+            parent = self._nodes.get(_key(parent_name))
+            if parent is None:
+                parent = MailboxNode(parent_name, node.delimiter, ["\\NonExistent"])
+                self._nodes[_key(parent_name)] = parent
+                self._attach(parent)
+            node.parent = parent
+            parent.children.append(node)
+        else:
+            self.roots.append(node)
+
+    def __iter__(self) -> Iterator[MailboxNode]:
+        for root in self.roots:
+            yield from root.walk()
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, name: str) -> bool:
+        return _key(name) in self._nodes
+
+    def __getitem__(self, name: str) -> MailboxNode:
+        return self._nodes[_key(name)]
+
+    def get(self, name: str) -> MailboxNode | None:
+        return self._nodes.get(_key(name))
+
+    def names(self) -> list[str]:
+        return [node.name for node in self._nodes.values() if node.selectable]
+
+    def by_role(self, role: str) -> MailboxNode | None:
+        role = role.lstrip("\\").casefold()
+        for node in self._nodes.values():
+            if node.special_use and node.special_use[1:].casefold() == role:
+                return node
+        return None
+
+    def apply_status(self, statuses: dict[str, MailboxStatus]) -> None:
+        for name, status in statuses.items():
+            node = self.get(name)
+            if node is not None:
+                node.set_status(status)
+
+    def expired(self, ttl: float) -> bool:
+        return time.monotonic() - self.loaded_at >= ttl
+
+
+def parse_list_response(data: Iterable[bytes | tuple[bytes, bytes] | None]) -> list[MailboxNode]:
+    res = []
+    for item in data:
+        values = parse([item])
+        if not values:
+            continue
+        flags = values[0] if isinstance(values[0], list) else []
+        delimiter = values[1] if len(values) > 2 else None
+        res.append(MailboxNode(_mailbox_name(values[-1]), delimiter, flags))
+    return res
+
+
+def parse_status_response(data: Iterable[bytes | tuple[bytes, bytes] | None]) -> dict[str, MailboxStatus]:
+    res = {}
+    for item in data:
+        values = parse([item])
+        if len(values) < 2 or not isinstance(values[-1], list):
+            continue
+        items = values[-1]
+        res[_mailbox_name(values[0])] = {name.upper(): int(value) for name, value in zip(items[::2], items[1::2])}
+    return res
+
+
+def _mailbox_name(value: Any) -> str:
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", errors="replace")
+    return imaputf7decode(str(value))
+
+
+def _key(name: str) -> str:
+    return "INBOX" if name.upper() == "INBOX" else name
@@ -0,0 +1,108 @@
+import re
+from typing import Any, Iterable, Iterator
+
+_TOKEN_RE = re.compile(
+    rb'\s*(?:(?P<open>\()|(?P<close>\))|"(?P<quoted>(?:[^"\\]|\\.)*)"'
+    rb'|(?P<atom>[^\s()"\[\]]*\[[^\]]*\][^\s()"]*|[^\s()"]+))'
+)
+_LITERAL_RE = re.compile(rb"\{(\d+)\+?\}\s*$")
+_QUOTED_ESCAPE_RE = re.compile(rb"\\(.)")
+
+_OPEN = object()
+_CLOSE = object()
+
+
+class ParseErr(Exception):
+    pass
+
+
+def tokenize(data: Iterable[bytes | tuple[bytes, bytes] | None]) -> Iterator[Any]:
+    for item in data:
+        if item is None:
+            continue
+        if isinstance(item, tuple):
+            text, literal = item
+            yield from _tokenize_text(_LITERAL_RE.sub(b"", text))
+            yield literal
+        else:
+            yield from _tokenize_text(item)
+
+
+def _tokenize_text(text: bytes) -> Iterator[Any]:
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if not match or match.end() == pos:
+            raise ParseErr(f"Не удалось разобрать ответ сервера: {text[pos:]!r}")
+        pos = match.end()
+        if match.group("open"):
+            yield _OPEN
+        elif match.group("close"):
+            yield _CLOSE
+        elif match.group("quoted") is not None:
+            yield _QUOTED_ESCAPE_RE.sub(rb"\1", match.group("quoted")).decode("utf-8", errors="replace")
+        elif match.group("atom"):
+            atom = match.group("atom").decode("utf-8", errors="replace")
+            yield None if atom.upper() == "NIL" else atom
+
+
+def parse(data: Iterable[bytes | tuple[bytes, bytes] | None]) -> list[Any]:
+    stack: list[list[Any]] = [[]]
+    for token in tokenize(data):
+        if token is _OPEN:
+            stack.append([])
+        elif token is _CLOSE:
+            if len(stack) == 1:
+                raise ParseErr("Лишняя закрывающая скобка в ответе сервера")
+            closed = stack.pop()
+            stack[-1].append(closed)
+        else:
+            stack[-1].append(token)
+    if len(stack) != 1:
+        raise ParseErr("Незакрытая скобка в ответе сервера")
+    return stack[0]
+
+
+def parse_fetch_response(data: Iterable[bytes | tuple[bytes, bytes] | None]) -> list[tuple[int, dict[str, Any]]]:
+    res = []
+    values = parse(data)
+    for number, items in zip(values[::2], values[1::2]):
+        if not isinstance(items, list):
+            raise ParseErr(f"Ожидался список атрибутов письма {number}")
+        attributes = {}
+        for name, value in zip(items[::2], items[1::2]):
+            attributes[name.upper()] = value
+        res.append((int(number), attributes))
+    return res
+
+
+def find_attribute(attributes: dict[str, Any], prefix: str) -> Any:
+    for name, value in attributes.items():
+        if name.startswith(prefix):
+            return value
+    return None
+
+
+def to_sequence_set(ids: Iterable[int]) -> str:
+    ranges = []
+    for number in sorted(set(map(int, ids))):
+        if ranges and ranges[-1][1] == number - 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return ",".join(str(start) if start == end else f"{start}:{end}" for start, end in ranges)
+
+
+def from_sequence_set(sequence_set: str) -> list[int]:
+    res = []
+    for part in sequence_set.split(","):
+        if not part:
+            continue
+        start, _, end = part.partition(":")
+        if end:
+            start, end = sorted((int(start), int(end)))
+            res.extend(range(start, end + 1))
+        else:
+            res.append(int(start))
+    return res
@@ -0,0 +1,180 @@
+import imaplib
+import re
+import time
+from collections import deque
+from typing import Callable, Iterable, Iterator
+from src.instrumentation import CommandEvent, command_name, instrumentation
+from src.protocol import Response, ResponsePart, UntaggedResponses, literal_size, split_response
+
+_UID_RE = re.compile(rb"\bUID (\d+)", re.IGNORECASE)
+
+
+class PipelinedCommand:
+    def __init__(self, tag: str, args: tuple[str | bytes, ...], key: int | None = None) -> None:
+        self.tag = tag
+        self.args = args
+        self.key = key
+        self.untagged = UntaggedResponses()
+        self.status: str | None = None
+        self.data: list[ResponsePart | None] = []
+        self.code: tuple[str, bytes | None] | None = None
+        self.started: float | None = None
+        self.bytes_sent = 0
+
+
+Router = Callable[[Response, deque[PipelinedCommand]], PipelinedCommand | None]
+
+
+class Pipeline:
+    def __init__(self, connection: imaplib.IMAP4, window: int = 16, tag_prefix: str = "Z",
+                 literal_plus: bool = False, literal_limit: int | None = None) -> None:
+        self._connection = connection
+        self.window = max(1, window)
+        self.literal_plus = literal_plus
+        self.literal_limit = literal_limit
+        self._tag_prefix = tag_prefix
+        self._tag_counter = 0
+        self._received_mark = 0
+
+    def run(self, commands: Iterable[tuple[str | bytes, ...]], keys: Iterable[int | None] | None = None,
+            router: Router | None = None) -> Iterator[PipelinedCommand]:
+        commands = iter(commands)
+        keys = iter(keys) if keys is not None else None
+        router = router or route_to_oldest
+        pending: deque[PipelinedCommand] = deque()
+        exhausted = False
+
+        try:
+            while True:
+                batch = []
+                while not exhausted and len(pending) + len(batch) < self.window:
+                    args = next(commands, None)
+                    if args is None:
+                        exhausted = True
+                        break
+                    batch.append(self._new_command(args, next(keys) if keys is not None else None))
+                if batch:
+                    pending.extend(batch)
+                    self._send(batch, pending, router)
+                if not pending:
+                    return
+
+                self._dispatch(split_response(self.read_response()), pending, router)
+                while pending and pending[0].status is not None:
+                    yield pending.popleft()
+        finally:
+            while any(command.status is None for command in pending):
+                self._dispatch(split_response(self.read_response()), pending, router)
+
+    def _dispatch(self, response: Response, pending: deque[PipelinedCommand], router: Router) -> None:
+        if response.kind == "tagged":
+            for command in pending:
+                if command.tag == response.tag:
+                    command.status = response.name
+                    command.data = response.data
+                    command.code = response.code
+                    if command.started is not None:
+                        self._record(command)
+                    return
+        elif response.kind == "untagged":
+            command = router(response, pending)
+            if command is not None:
+                command.untagged.add(response)
+
+    def _record(self, command: PipelinedCommand) -> None:
+        received = self._connection.bytes_received
+        instrumentation.command(CommandEvent(command.tag, command_name(command.args[0], command.args[1:]),
+                                             time.perf_counter() - command.started, command.bytes_sent,
+                                             received - self._received_mark, command.status))
+        self._received_mark = received
+
+    def _send(self, batch: list[PipelinedCommand], pending: deque[PipelinedCommand], router: Router) -> None:
+        data = b""
+        senders: list[tuple[PipelinedCommand, int]] = []
+        instrumented = bool(instrumentation.observers)
+        if instrumented and not any(command.started is not None for command in pending):
+            self._received_mark = self._connection.bytes_received
+        for command in batch:
+            segments = self._format(command)
+            if instrumented:
+                command.started = time.perf_counter()
+            data += segments[0]
+            senders.append((command, len(segments[0])))
+            for segment in segments[1:]:
+                self._flush(data, senders, instrumented)
+                data, senders = b"", []
+                if not self._wait_continuation(command, pending, router):
+                    break
+                data = segment
+                senders.append((command, len(segment)))
+        if data:
+            self._flush(data, senders, instrumented)
+
+    def _flush(self, data: bytes, senders: list[tuple[PipelinedCommand, int]], instrumented: bool) -> None:
+        if not instrumented:
+            self._connection.send(data)
+            return
+        sent = self._connection.bytes_sent
+        self._connection.send(data)
+        wire = self._connection.bytes_sent - sent
+        assigned = 0
+        for index, (command, length) in enumerate(senders):
+            share = wire - assigned if index == len(senders) - 1 else wire * length // len(data)
+            command.bytes_sent += share
+            assigned += share
+
+    def _wait_continuation(self, command: PipelinedCommand, pending: deque[PipelinedCommand],
+                           router: Router) -> bool:
+        while command.status is None:
+            response = split_response(self.read_response())
+            if response.kind == "continuation":
+                return True
+            self._dispatch(response, pending, router)
+        return False
+
+    def read_response(self) -> list[ResponsePart]:
+        parts = []
+        while True:
+            line = self._connection.readline()
+            size = literal_size(line)
+            if size is None:
+                parts.append(line.rstrip(b"\r\n"))
+                return parts
+            parts.append((line.rstrip(b"\r\n"), self._connection.read(size)))
+
+    def _new_command(self, args: tuple[str, ...], key: int | None) -> PipelinedCommand:
+        self._tag_counter += 1
+        return PipelinedCommand(f"{self._tag_prefix}{self._tag_counter:04d}", args, key)
+
+    def _format(self, command: PipelinedCommand) -> list[bytes]:
+        segments = []
+        current = command.tag.encode("ascii")
+        for arg in command.args:
+            if isinstance(arg, str):
+                current += (b"" if arg.startswith(")") else b" ") + arg.encode("utf-8")
+                continue
+            synchronizing = not self.literal_plus or (self.literal_limit is not None and len(arg) > self.literal_limit)
+            current += b" {%d%s}\r\n" % (len(arg), b"" if synchronizing else b"+")
+            if synchronizing:
+                segments.append(current)
+                current = b""
+            current += arg
+        segments.append(current + b"\r\n")
+        return segments
+
+
+def route_to_oldest(response: Response, pending: deque[PipelinedCommand]) -> PipelinedCommand | None:
+    return next((command for command in pending if command.status is None), None)
+
+
+def route_by_uid(response: Response, pending: deque[PipelinedCommand]) -> PipelinedCommand | None:
+    if response.name == "FETCH":
+        for part in response.data:
+            match = _UID_RE.search(part[0] if isinstance(part, tuple) else part or b"")
+            if match:
+                uid = int(match.group(1))
+                for command in pending:
+                    if command.key == uid and command.status is None:
+                        return command
+                break
+    return route_to_oldest(response, pending)
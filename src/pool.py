@@ -0,0 +1,218 @@
+import imaplib
+import ssl
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+from src.cache import EmailCache
+from src.client import IMAPClient, ConnectionErr, LoginErr, MailboxErr
+
+
+class PoolTimeoutErr(Exception):
+    pass
+
+
+class PoolMetrics:
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.created = 0
+        self.reconnects = 0
+        self.health_checks = 0
+        self.discarded = 0
+        self.tls_resumed = 0
+
+    def as_dict(self) -> dict[str, int | float]:
+        return dict(vars(self))
+
+
+class _PooledClient:
+    def __init__(self, username: str, client: IMAPClient) -> None:
+        self.username = username
+        self.client = client
+        self.last_used = time.monotonic()
+
+
+class IMAPConnectionPool:
+    def __init__(self, server: str, port: int = 993, use_ssl: bool = True, max_connections: int = 4,
+                 timeout: int = 5, health_check_interval: float = 60.0,
+                 ssl_context: ssl.SSLContext | None = None, cache: EmailCache | None = None) -> None:
+        self.server = server
+        self.port = port
+        self.use_ssl = use_ssl
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.metrics = PoolMetrics()
+        self._ssl_context = ssl_context or (ssl.create_default_context() if use_ssl else None)
+        self._cache = cache
+        self._accounts: dict[str, str] = {}
+        self._idle: list[_PooledClient] = []
+        self._total = 0
+        self._tls_session: ssl.SSLSession | None = None
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def add_account(self, username: str, password: str) -> None:
+        with self._condition:
+            self._accounts[username] = password
+
+    @property
+    def size(self) -> int:
+        return self._total
+
+    @contextmanager
+    def connection(self, username: str | None = None, mailbox: str | None = None,
+                   timeout: float | None = None) -> Iterator[IMAPClient]:
+        pooled = self._checkout(self._resolve_account(username), mailbox, timeout)
+        try:
+            yield pooled.client
+        except (imaplib.IMAP4.abort, ConnectionErr, OSError):
+            self._discard(pooled)
+            raise
+        except BaseException:
+            self._checkin(pooled)
+            raise
+        else:
+            self._checkin(pooled)
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._condition.notify_all()
+        for pooled in idle:
+            self._close_client(pooled.client)
+
+    def _resolve_account(self, username: str | None) -> str:
+        if username is None:
+            if len(self._accounts) != 1:
+                raise LoginErr("Необходимо указать учётную запись")
+            return next(iter(self._accounts))
+        if username not in self._accounts:
+            raise LoginErr(f"Учётная запись {username} не добавлена в пул")
+        return username
+
+    def _checkout(self, username: str, mailbox: str | None, timeout: float | None) -> _PooledClient:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited = False
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise ConnectionErr("Пул соединений закрыт")
+                pooled = self._take_idle(username, mailbox)
+                if pooled:
+                    break
+                if self._total < self.max_connections or self._evict_idle():
+                    self._total += 1
+                    pooled = None
+                    break
+                if not waited:
+                    waited = True
+                    self.metrics.waits += 1
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise PoolTimeoutErr("Не удалось дождаться свободного соединения")
+                started = time.monotonic()
+                self._condition.wait(remaining)
+                self.metrics.wait_time += time.monotonic() - started
+            self.metrics.checkouts += 1
+
+        try:
+            if pooled is None:
+                pooled = _PooledClient(username, self._create_client(username))
+            else:
+                self._check_health(pooled)
+            if mailbox is not None and pooled.client.selected_mailbox != mailbox:
+                status, _ = pooled.client.select_mailbox(mailbox)
+                if status != "OK":
+                    raise MailboxErr(f"Не удалось выбрать папку {mailbox}")
+        except MailboxErr:
+            self._checkin(pooled)
+            raise
+        except BaseException:
+            if pooled is not None:
+                self._discard(pooled)
+            else:
+                self._release_slot()
+            raise
+        return pooled
+
+    def _take_idle(self, username: str, mailbox: str | None) -> _PooledClient | None:
+        candidates = [pooled for pooled in self._idle if pooled.username == username]
+        if not candidates:
+            return None
+        pooled = next((p for p in candidates if p.client.selected_mailbox == mailbox), candidates[-1])
+        self._idle.remove(pooled)
+        return pooled
+
+    def _evict_idle(self) -> bool:
+        if not self._idle:
+            return False
+        pooled = min(self._idle, key=lambda p: p.last_used)
+        self._idle.remove(pooled)
+        self._total -= 1
+        threading.Thread(target=self._close_client, args=(pooled.client,), daemon=True).start()
+        return True
+
+    def _create_client(self, username: str) -> IMAPClient:
+        client = IMAPClient(self._cache)
+        if self.use_ssl:
+            client.connect_ssl(self.server, self.port, self.timeout, self._ssl_context, self._tls_session)
+            with self._condition:
+                if client.tls_session_reused:
+                    self.metrics.tls_resumed += 1
+                self._tls_session = client.tls_session or self._tls_session
+        else:
+            client.connect_plain(self.server, self.port, self.timeout)
+        client.login(username, self._accounts[username])
+        with self._condition:
+            self.metrics.created += 1
+        return client
+
+    def _check_health(self, pooled: _PooledClient) -> None:
+        if time.monotonic() - pooled.last_used < self.health_check_interval:
+            return
+        with self._condition:
+            self.metrics.health_checks += 1
+        try:
+            status, _ = pooled.client.noop()
+            if status == "OK":
+                return
+        except (imaplib.IMAP4.error, OSError):
+            pass
+        with self._condition:
+            self.metrics.reconnects += 1
+        pooled.client.reconnect()
+
+    def _checkin(self, pooled: _PooledClient) -> None:
+        pooled.last_used = time.monotonic()
+        with self._condition:
+            closed = self._closed
+            if closed:
+                self._total -= 1
+            else:
+                self._idle.append(pooled)
+            self._condition.notify()
+        if closed:
+            self._close_client(pooled.client)
+
+    def _discard(self, pooled: _PooledClient) -> None:
+        with self._condition:
+            self.metrics.discarded += 1
+        self._release_slot()
+        self._close_client(pooled.client)
+
+    def _release_slot(self) -> None:
+        with self._condition:
+            self._total -= 1
+            self._condition.notify()
+
+    @staticmethod
+    def _close_client(client: IMAPClient) -> None:
+        try:
+            client.close()
+        except (imaplib.IMAP4.error, OSError):
+            pass
@@ -0,0 +1,86 @@
+import re
+
+ResponsePart = bytes | tuple[bytes, bytes]
+
+_LITERAL_RE = re.compile(rb"\{(\d+)\+?\}\r?\n?$")
+_UNTAGGED_STATUS_RE = re.compile(rb"(\d+) ([A-Za-z-]+)(?: (.*))?$", re.DOTALL)
+_UNTAGGED_RE = re.compile(rb"([A-Za-z-]+)(?: (.*))?$", re.DOTALL)
+_TAGGED_RE = re.compile(rb"([^ ]+) ([A-Za-z]+)(?: (.*))?$", re.DOTALL)
+_RESPONSE_CODE_RE = re.compile(rb"\[([A-Za-z-]+)(?: ([^\]]*))?\]")
+
+
+class Response:
+    def __init__(self, kind: str, tag: str | None, name: str, data: list[ResponsePart | None],
+                 code: tuple[str, bytes | None] | None = None) -> None:
+        self.kind = kind
+        self.tag = tag
+        self.name = name
+        self.data = data
+        self.code = code
+
+
+def literal_size(line: bytes) -> int | None:
+    match = _LITERAL_RE.search(line)
+    return int(match.group(1)) if match else None
+
+
+def quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def split_response(parts: list[ResponsePart]) -> Response:
+    first = parts[0][0] if isinstance(parts[0], tuple) else parts[0]
+    if first.startswith(b"+"):
+        return Response("continuation", None, "+", [first[2:]])
+
+    if first.startswith(b"* "):
+        kind, tag = "untagged", None
+        rest = first[2:]
+        match = _UNTAGGED_STATUS_RE.match(rest)
+        if match:
+            name = match.group(2).upper().decode("ascii")
+            data = match.group(1) + (b" " + match.group(3) if match.group(3) is not None else b"")
+        else:
+            match = _UNTAGGED_RE.match(rest)
+            if not match:
+                return Response("untagged", None, "", [rest])
+            name = match.group(1).upper().decode("ascii")
+            data = match.group(2)
+    else:
+        match = _TAGGED_RE.match(first)
+        if not match:
+            return Response("unknown", None, "", [first])
+        kind, tag = "tagged", match.group(1).decode("ascii")
+        name = match.group(2).upper().decode("ascii")
+        data = match.group(3)
+
+    code = None
+    if name in ("OK", "NO", "BAD", "BYE", "PREAUTH") and data:
+        code_match = _RESPONSE_CODE_RE.match(data)
+        if code_match:
+            code = (code_match.group(1).upper().decode("ascii"), code_match.group(2))
+
+    if isinstance(parts[0], tuple):
+        first_part = (data if data is not None else b"", parts[0][1])
+    else:
+        first_part = data
+    return Response(kind, tag, name, [first_part] + list(parts[1:]), code)
+
+
+class UntaggedResponses(dict):
+    def add(self, response: Response) -> None:
+        self.setdefault(response.name, []).extend(response.data)
+        if response.code:
+            self.setdefault(response.code[0], []).append(response.code[1])
+
+    def pop_data(self, name: str) -> list[ResponsePart | None]:
+        return self.pop(name, [None])
+
+    def get_int(self, name: str) -> int | None:
+        values = self.get(name)
+        if not values or values[-1] is None:
+            return None
+        try:
+            return int(values[-1])
+        except ValueError:
+            return None
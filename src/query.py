@@ -0,0 +1,128 @@
+import datetime
+from typing import Iterable
+from src.parser import to_sequence_set
+from src.protocol import quote
+
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+SORT_CRITERIA = ("ARRIVAL", "CC", "DATE", "FROM", "SIZE", "SUBJECT", "TO", "DISPLAYFROM", "DISPLAYTO")
+
+DateLike = datetime.date | str
+
+
+class Query:
+    def __init__(self, *criteria: str | bytes) -> None:
+        self.criteria: list[str | bytes] = list(criteria)
+
+    def _add(self, *criteria: str | bytes) -> "Query":
+        self.criteria.extend(criteria)
+        return self
+
+    def sender(self, value: str) -> "Query":
+        return self._add("FROM", _string(value))
+
+    def recipient(self, value: str) -> "Query":
+        return self._add("TO", _string(value))
+
+    def cc(self, value: str) -> "Query":
+        return self._add("CC", _string(value))
+
+    def subject(self, value: str) -> "Query":
+        return self._add("SUBJECT", _string(value))
+
+    def body(self, value: str) -> "Query":
+        return self._add("BODY", _string(value))
+
+    def text(self, value: str) -> "Query":
+        return self._add("TEXT", _string(value))
+
+    def header(self, name: str, value: str) -> "Query":
+        return self._add("HEADER", quote(name), _string(value))
+
+    def since(self, date: DateLike) -> "Query":
+        return self._add("SINCE", _date(date))
+
+    def before(self, date: DateLike) -> "Query":
+        return self._add("BEFORE", _date(date))
+
+    def on(self, date: DateLike) -> "Query":
+        return self._add("ON", _date(date))
+
+    def sent_since(self, date: DateLike) -> "Query":
+        return self._add("SENTSINCE", _date(date))
+
+    def sent_before(self, date: DateLike) -> "Query":
+        return self._add("SENTBEFORE", _date(date))
+
+    def larger(self, size: int) -> "Query":
+        return self._add("LARGER", str(int(size)))
+
+    def smaller(self, size: int) -> "Query":
+        return self._add("SMALLER", str(int(size)))
+
+    def seen(self, value: bool = True) -> "Query":
+        return self._add("SEEN" if value else "UNSEEN")
+
+    def flagged(self, value: bool = True) -> "Query":
+        return self._add("FLAGGED" if value else "UNFLAGGED")
+
+    def answered(self, value: bool = True) -> "Query":
+        return self._add("ANSWERED" if value else "UNANSWERED")
+
+    def deleted(self, value: bool = True) -> "Query":
+        return self._add("DELETED" if value else "UNDELETED")
+
+    def draft(self, value: bool = True) -> "Query":
+        return self._add("DRAFT" if value else "UNDRAFT")
+
+    def keyword(self, flag: str, value: bool = True) -> "Query":
+        return self._add("KEYWORD" if value else "UNKEYWORD", flag)
+
+    def uids(self, uids: Iterable[int]) -> "Query":
+        return self._add("UID", to_sequence_set(uids))
+
+    def exclude(self, query: "Query") -> "Query":
+        return self._add("NOT", *query._group())
+
+    @classmethod
+    def either(cls, first: "Query", second: "Query") -> "Query":
+        return cls("OR", *first._group(), *second._group())
+
+    def _group(self) -> list[str | bytes]:
+        if len(self.criteria) == 1:
+            return list(self.criteria)
+        return ["(", *self.criteria, ")"]
+
+    @property
+    def needs_charset(self) -> bool:
+        return any(isinstance(criterion, bytes) for criterion in self.criteria)
+
+    def arguments(self) -> list[str | bytes]:
+        res: list[str | bytes] = []
+        for criterion in self.criteria or ["ALL"]:
+            if isinstance(criterion, str) and res and isinstance(res[-1], str):
+                separator = "" if res[-1].endswith("(") or criterion == ")" else " "
+                res[-1] += separator + criterion
+            else:
+                res.append(criterion)
+        return res
+
+
+class SearchResult:
+    def __init__(self, uids: list[int] | None = None, count: int = 0, min: int | None = None,
+                 max: int | None = None) -> None:
+        self.uids = uids if uids else []
+        self.count = count
+        self.min = min
+        self.max = max
+
+
+def _string(value: str) -> str | bytes:
+    if value.isascii():
+        return quote(value)
+    return value.encode("utf-8")
+
+
+def _date(value: DateLike) -> str:
+    if isinstance(value, str):
+        return value
+    return f"{value.day}-{MONTHS[value.month - 1]}-{value.year}"
@@ -0,0 +1,139 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import Iterable
+from src.cache import MailboxKey
+from src.email_model import Email
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mailboxes (
+    server TEXT NOT NULL,
+    user TEXT NOT NULL,
+    mailbox TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    PRIMARY KEY (server, user, mailbox)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    server TEXT NOT NULL,
+    user TEXT NOT NULL,
+    mailbox TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    sender TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    date TEXT,
+    UNIQUE (server, user, mailbox, uidvalidity, uid)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+    sender, subject, body, content = 'messages', content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, sender, subject, body) VALUES (new.id, new.sender, new.subject, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, sender, subject, body)
+    VALUES ('delete', old.id, old.sender, old.subject, old.body);
+END;
+"""
+
+_KEY_CONDITION = "server = ? AND user = ? AND mailbox = ? AND uidvalidity = ?"
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class IndexHit:
+    def __init__(self, mailbox: str, uid: int, sender: str, subject: str, date: str | None, snippet: str,
+                 score: float) -> None:
+        self.mailbox = mailbox
+        self.uid = uid
+        self.sender = sender
+        self.subject = subject
+        self.date = date
+        self.snippet = snippet
+        self.score = score
+
+
+class SearchIndex:
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def validate(self, key: MailboxKey) -> bool:
+        server, user, mailbox, uidvalidity = key
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT uidvalidity FROM mailboxes WHERE server = ? AND user = ? AND mailbox = ?",
+                (server, user, mailbox),
+            ).fetchone()
+            if row and row[0] == uidvalidity:
+                return True
+            self._db.execute("DELETE FROM messages WHERE server = ? AND user = ? AND mailbox = ?",
+                             (server, user, mailbox))
+            self._db.execute(
+                "INSERT OR REPLACE INTO mailboxes (server, user, mailbox, uidvalidity) VALUES (?, ?, ?, ?)",
+                key,
+            )
+            return row is None
+
+    def add(self, key: MailboxKey, email: Email) -> None:
+        with self._lock, self._db:
+            self._db.execute(f"DELETE FROM messages WHERE {_KEY_CONDITION} AND uid = ?", (*key, email.id))
+            self._db.execute(
+                "INSERT INTO messages (sender, subject, body, server, user, mailbox, uidvalidity, uid, date) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (email.sender or "", email.description or "", "\n".join(email.body), *key, email.id, email.date),
+            )
+
+    def remove(self, key: MailboxKey, uids: Iterable[int]) -> None:
+        with self._lock, self._db:
+            self._db.executemany(f"DELETE FROM messages WHERE {_KEY_CONDITION} AND uid = ?",
+                                 [(*key, uid) for uid in uids])
+
+    def retain(self, key: MailboxKey, uids: Iterable[int]) -> None:
+        self.remove(key, self.indexed_uids(key) - set(uids))
+
+    def indexed_uids(self, key: MailboxKey) -> set[int]:
+        with self._lock:
+            rows = self._db.execute(f"SELECT uid FROM messages WHERE {_KEY_CONDITION}", key).fetchall()
+        return {int(row[0]) for row in rows}
+
+    def search(self, query: str, server: str | None = None, user: str | None = None, mailbox: str | None = None,
+               limit: int = 50, raw: bool = False) -> list[IndexHit]:
+        match = query if raw else self._match_expression(query)
+        if not match:
+            return []
+        conditions = ["messages_fts MATCH ?"]
+        params: list[str | int] = [match]
+        for column, value in (("server", server), ("user", user), ("mailbox", mailbox)):
+            if value is not None:
+                conditions.append(f"messages.{column} = ?")
+                params.append(value)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT messages.mailbox, messages.uid, messages.sender, messages.subject, messages.date, "
+                "snippet(messages_fts, -1, '[', ']', '…', 12), bm25(messages_fts, 4.0, 8.0, 1.0) AS score "
+                "FROM messages_fts JOIN messages ON messages.id = messages_fts.rowid "
+                f"WHERE {' AND '.join(conditions)} ORDER BY score LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [IndexHit(mailbox, int(uid), sender, subject, date, snippet, -score)
+                for mailbox, uid, sender, subject, date, snippet, score in rows]
+
+    @staticmethod
+    def _match_expression(query: str) -> str:
+        return " ".join(f'"{word}"*' for word in _WORD_RE.findall(query))
+
+    def clear(self) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM messages")
+            self._db.execute("DELETE FROM mailboxes")
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,20 @@
+from src.email_model import Email
+
+
+class MailboxState:
+    def __init__(self, uidvalidity: int | None, uidnext: int | None, highestmodseq: int | None,
+                 uids: set[int] | None = None) -> None:
+        self.uidvalidity = uidvalidity
+        self.uidnext = uidnext
+        self.highestmodseq = highestmodseq
+        self.uids = uids if uids else set()
+
+
+class SyncResult:
+    def __init__(self, mailbox: str, new: list[Email] | None = None, changed: dict[int, list[str]] | None = None,
+                 vanished: list[int] | None = None, full: bool = False) -> None:
+        self.mailbox = mailbox
+        self.new = new if new else []
+        self.changed = changed if changed else {}
+        self.vanished = vanished if vanished else []
+        self.full = full
@@ -0,0 +1,220 @@
+import asyncio
+import imaplib
+import socket
+import ssl
+import time
+import zlib
+from typing import Any
+from src.instrumentation import CommandEvent, command_name, instrumentation
+
+imaplib.Commands.setdefault("COMPRESS", ("AUTH", "SELECTED"))
+
+
+class DeflateCodec:
+    def __init__(self, level: int = zlib.Z_DEFAULT_COMPRESSION) -> None:
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        self._decompressor = zlib.decompressobj(-15)
+        self.raw_sent = 0
+        self.compressed_sent = 0
+        self.raw_received = 0
+        self.compressed_received = 0
+
+    def compress(self, data: bytes) -> bytes:
+        res = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.raw_sent += len(data)
+        self.compressed_sent += len(res)
+        return res
+
+    def decompress(self, data: bytes) -> bytes:
+        res = self._decompressor.decompress(data)
+        self.compressed_received += len(data)
+        self.raw_received += len(res)
+        return res
+
+    @property
+    def saved(self) -> int:
+        return self.raw_sent + self.raw_received - self.compressed_sent - self.compressed_received
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            "raw_sent": self.raw_sent,
+            "compressed_sent": self.compressed_sent,
+            "raw_received": self.raw_received,
+            "compressed_received": self.compressed_received,
+        }
+
+
+class SocketReader:
+    def __init__(self, sock: socket.socket) -> None:
+        self._sock = sock
+        self._buffer = bytearray()
+        self._codec: DeflateCodec | None = None
+        self.bytes_received = 0
+
+    @property
+    def buffered(self) -> bool:
+        return bool(self._buffer) or (isinstance(self._sock, ssl.SSLSocket) and self._sock.pending() > 0)
+
+    def readline(self, limit: int = -1) -> bytes:
+        start = 0
+        while True:
+            end = self._buffer.find(b"\n", start) + 1
+            if end or 0 <= limit <= len(self._buffer):
+                break
+            start = len(self._buffer)
+            if not self._fill():
+                end = len(self._buffer)
+                break
+        if limit >= 0 and (not end or end > limit):
+            end = min(limit, len(self._buffer))
+        return self._take(end)
+
+    def read(self, size: int) -> bytes:
+        while len(self._buffer) < size and self._fill():
+            pass
+        return self._take(min(size, len(self._buffer)))
+
+    def close(self) -> None:
+        self._buffer.clear()
+
+    def start_decompression(self, codec: DeflateCodec) -> None:
+        self._codec = codec
+        self._buffer = bytearray(codec.decompress(bytes(self._buffer)))
+
+    def _fill(self) -> bool:
+        chunk = self._sock.recv(256 * 1024)
+        self.bytes_received += len(chunk)
+        self._buffer += self._codec.decompress(chunk) if self._codec else chunk
+        return bool(chunk)
+
+    def _take(self, size: int) -> bytes:
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class _SocketReaderMixin:
+    compression: DeflateCodec | None = None
+    bytes_sent = 0
+
+    def open(self, host: str = "", port: int = imaplib.IMAP4_PORT, timeout: float | None = None) -> None:
+        self.compression = None
+        self.bytes_sent = 0
+        self._instrumented: dict[bytes, tuple[str, float, int, int]] = {}
+        super().open(host, port, timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file.close()
+        self.file = SocketReader(self.sock)
+
+    @property
+    def bytes_received(self) -> int:
+        return self.file.bytes_received
+
+    def send(self, data: bytes) -> None:
+        if self.compression:
+            data = self.compression.compress(data)
+        self.bytes_sent += len(data)
+        super().send(data)
+
+    def _command(self, name: str, *args: Any) -> bytes:
+        if not instrumentation.observers:
+            return super()._command(name, *args)
+        started, sent, received = time.perf_counter(), self.bytes_sent, self.bytes_received
+        tag = super()._command(name, *args)
+        self._instrumented[tag] = (command_name(name, args), started, sent, received)
+        return tag
+
+    def _command_complete(self, name: str, tag: bytes) -> tuple[str, list[Any]]:
+        if not self._instrumented or tag not in self._instrumented:
+            return super()._command_complete(name, tag)
+        command, started, sent, received = self._instrumented.pop(tag)
+        status = None
+        try:
+            status, data = super()._command_complete(name, tag)
+            return status, data
+        finally:
+            instrumentation.command(CommandEvent(tag.decode("ascii"), command, time.perf_counter() - started,
+                                                 self.bytes_sent - sent, self.bytes_received - received, status))
+
+    def compress(self, level: int = zlib.Z_DEFAULT_COMPRESSION) -> tuple[str, list[bytes | None]]:
+        typ, data = self._simple_command("COMPRESS", "DEFLATE")
+        if typ == "OK":
+            self.compression = DeflateCodec(level)
+            self.file.start_decompression(self.compression)
+        return typ, data
+
+
+class IMAP4(_SocketReaderMixin, imaplib.IMAP4):
+    @property
+    def tls_session(self) -> ssl.SSLSession | None:
+        return None
+
+
+class IMAP4SSL(_SocketReaderMixin, imaplib.IMAP4_SSL):
+    def __init__(self, host: str, port: int = imaplib.IMAP4_SSL_PORT, ssl_context: ssl.SSLContext | None = None,
+                 timeout: float | None = None, tls_session: ssl.SSLSession | None = None) -> None:
+        self._tls_session = tls_session
+        super().__init__(host, port, ssl_context=ssl_context, timeout=timeout)
+
+    def _create_socket(self, timeout: float | None) -> ssl.SSLSocket:
+        sock = imaplib.IMAP4._create_socket(self, timeout)
+        return self.ssl_context.wrap_socket(sock, server_hostname=self.host, session=self._tls_session)
+
+    @property
+    def tls_session(self) -> ssl.SSLSession | None:
+        return self.sock.session
+
+    @property
+    def tls_session_reused(self) -> bool:
+        return self.sock.session_reused
+
+
+class DeflateStreamReader:
+    def __init__(self, reader: asyncio.StreamReader, codec: DeflateCodec) -> None:
+        self._reader = reader
+        self._codec = codec
+        self._buffer = bytearray()
+
+    async def readline(self) -> bytes:
+        start = 0
+        while True:
+            end = self._buffer.find(b"\n", start) + 1
+            if end:
+                return self._take(end)
+            start = len(self._buffer)
+            if not await self._fill():
+                return self._take(len(self._buffer))
+
+    async def readexactly(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            if not await self._fill():
+                raise asyncio.IncompleteReadError(self._take(len(self._buffer)), size)
+        return self._take(size)
+
+    async def _fill(self) -> bool:
+        chunk = await self._reader.read(256 * 1024)
+        self._buffer += self._codec.decompress(chunk)
+        return bool(chunk)
+
+    def _take(self, size: int) -> bytes:
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class DeflateStreamWriter:
+    def __init__(self, writer: asyncio.StreamWriter, codec: DeflateCodec) -> None:
+        self._writer = writer
+        self._codec = codec
+
+    def write(self, data: bytes) -> None:
+        self._writer.write(self._codec.compress(data))
+
+    async def drain(self) -> None:
+        await self._writer.drain()
+
+    def close(self) -> None:
+        self._writer.close()
+
+    async def wait_closed(self) -> None:
+        await self._writer.wait_closed()
@@ -0,0 +1,298 @@
+import imaplib
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Callable
+from src.parser import from_sequence_set, parse_fetch_response
+from src.pipeline import Pipeline, PipelinedCommand
+from src.protocol import Response, split_response
+
+if TYPE_CHECKING:
+    from src.client import IMAPClient
+
+IDLE_TIMEOUT = 25 * 60
+POLL_INTERVAL = 60.0
+
+
+class MailboxEvent:
+    def __init__(self, kind: str, mailbox: str, uids: list[int], flags: dict[int, list[str]] | None = None,
+                 username: str = "") -> None:
+        self.kind = kind
+        self.mailbox = mailbox
+        self.uids = uids
+        self.flags = flags if flags else {}
+        self.username = username
+
+
+EventCallback = Callable[[MailboxEvent], None]
+
+
+class _WatchedMailbox:
+    def __init__(self, client: "IMAPClient", mailbox: str, callback: EventCallback) -> None:
+        self.client = client
+        self.mailbox = mailbox
+        self.callback = callback
+        self.pipeline: Pipeline | None = None
+        self.sock: socket.socket | None = None
+        self.uids: list[int] = []
+        self.exists = 0
+        self.idle_supported = True
+        self.idle_tag: str | None = None
+        self.idle_counter = 0
+        self.deadline = 0.0
+        self.broken = False
+
+
+class MailboxWatcher:
+    def __init__(self, callback: EventCallback | None = None, idle_timeout: float = IDLE_TIMEOUT,
+                 poll_interval: float = POLL_INTERVAL) -> None:
+        self.callback = callback
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.errors: deque[Exception] = deque(maxlen=100)
+        self._watched: list[_WatchedMailbox] = []
+        self._added: deque[_WatchedMailbox] = deque()
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ, None)
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+
+    def add(self, client: "IMAPClient", mailbox: str, callback: EventCallback | None = None) -> None:
+        callback = callback or self.callback
+        if callback is None:
+            raise ValueError("Не указан обработчик событий")
+        self._added.append(_WatchedMailbox(client, mailbox, callback))
+        self._wake()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "MailboxWatcher":
+        if not self.running:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stopping = True
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _wake(self) -> None:
+        try:
+            self._wakeup_writer.send(b"\0")
+        except OSError:
+            pass
+
+    def _run(self) -> None:
+        try:
+            while not self._stopping:
+                while self._added:
+                    watched = self._added.popleft()
+                    self._watched.append(watched)
+                    self._guard(watched, self._attach)
+                now = time.monotonic()
+                timeout = max(0.0, min((w.deadline for w in self._watched), default=now + 60) - now)
+                for key, _ in self._selector.select(timeout):
+                    if key.data is None:
+                        self._drain_wakeup()
+                    else:
+                        self._guard(key.data, self._on_readable)
+                now = time.monotonic()
+                for watched in list(self._watched):
+                    if watched.deadline <= now:
+                        self._guard(watched, self._on_deadline)
+        finally:
+            for watched in self._watched:
+                self._detach(watched)
+            self._watched.clear()
+
+    def _drain_wakeup(self) -> None:
+        try:
+            while self._wakeup_reader.recv(1024):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _guard(self, watched: _WatchedMailbox, action: Callable[[_WatchedMailbox], None]) -> None:
+        try:
+            action(watched)
+        except Exception as e:
+            self.errors.append(e)
+            self._unregister(watched)
+            watched.broken = True
+            watched.idle_tag = None
+            watched.deadline = time.monotonic() + self.poll_interval
+
+    def _attach(self, watched: _WatchedMailbox) -> None:
+        client = watched.client
+        status, _ = client.select_mailbox(watched.mailbox)
+        if status != "OK":
+            raise imaplib.IMAP4.error(f"Не удалось выбрать папку {watched.mailbox}")
+        watched.uids = sorted(client.search().uids)
+        watched.exists = len(watched.uids)
+        watched.pipeline = client.raw_pipeline(1, tag_prefix="W")
+        watched.sock = client.sock
+        self._selector.register(watched.sock, selectors.EVENT_READ, watched)
+        watched.idle_supported = "IDLE" in client.capabilities
+        watched.broken = False
+        self._resume(watched)
+
+    def _recover(self, watched: _WatchedMailbox) -> None:
+        known = set(watched.uids)
+        watched.client.reconnect()
+        self._attach(watched)
+        current = set(watched.uids)
+        if known - current:
+            self._emit(watched, MailboxEvent("EXPUNGE", watched.mailbox, sorted(known - current)))
+        if current - known:
+            self._emit(watched, MailboxEvent("EXISTS", watched.mailbox, sorted(current - known)))
+
+    def _detach(self, watched: _WatchedMailbox) -> None:
+        self._unregister(watched)
+        try:
+            if watched.idle_tag and not watched.broken:
+                self._stop_idle(watched)
+            watched.client.close()
+        except (imaplib.IMAP4.error, OSError, ValueError) as e:
+            self.errors.append(e)
+
+    def _unregister(self, watched: _WatchedMailbox) -> None:
+        if watched.sock is not None:
+            try:
+                self._selector.unregister(watched.sock)
+            except (KeyError, ValueError):
+                pass
+            watched.sock = None
+
+    def _resume(self, watched: _WatchedMailbox) -> None:
+        if watched.exists > len(watched.uids):
+            self._fetch_new_uids(watched)
+        if watched.idle_supported:
+            self._start_idle(watched)
+        if not watched.idle_supported:
+            watched.deadline = time.monotonic() + self.poll_interval
+
+    def _on_readable(self, watched: _WatchedMailbox) -> None:
+        while True:
+            response = split_response(watched.pipeline.read_response())
+            if response.kind == "tagged" and response.tag == watched.idle_tag:
+                watched.idle_tag = None
+                break
+            self._handle_untagged(watched, response)
+            if not watched.client.has_pending_input:
+                break
+        if watched.exists > len(watched.uids) or watched.idle_tag is None:
+            if watched.idle_tag:
+                self._stop_idle(watched)
+            self._resume(watched)
+
+    def _on_deadline(self, watched: _WatchedMailbox) -> None:
+        if watched.broken:
+            self._recover(watched)
+        elif watched.idle_tag:
+            self._stop_idle(watched)
+            self._resume(watched)
+        else:
+            _, responses = self._command(watched, "NOOP")
+            for response in responses:
+                self._handle_untagged(watched, response)
+            self._resume(watched)
+
+    def _start_idle(self, watched: _WatchedMailbox) -> None:
+        watched.idle_counter += 1
+        tag = f"I{watched.idle_counter:04d}"
+        watched.client.send_raw(f"{tag} IDLE\r\n".encode("ascii"))
+        while True:
+            response = split_response(watched.pipeline.read_response())
+            if response.kind == "continuation":
+                watched.idle_tag = tag
+                watched.deadline = time.monotonic() + self.idle_timeout
+                return
+            if response.kind == "tagged" and response.tag == tag:
+                watched.idle_supported = False
+                return
+            self._handle_untagged(watched, response)
+
+    def _stop_idle(self, watched: _WatchedMailbox) -> None:
+        tag, watched.idle_tag = watched.idle_tag, None
+        watched.client.send_raw(b"DONE\r\n")
+        while True:
+            response = split_response(watched.pipeline.read_response())
+            if response.kind == "tagged" and response.tag == tag:
+                return
+            self._handle_untagged(watched, response)
+
+    def _command(self, watched: _WatchedMailbox, *args: str) -> tuple[PipelinedCommand, list[Response]]:
+        responses: list[Response] = []
+        command = next(watched.pipeline.run([args], router=lambda response, pending: responses.append(response)))
+        return command, responses
+
+    def _fetch_new_uids(self, watched: _WatchedMailbox) -> None:
+        known = len(watched.uids)
+        command, responses = self._command(watched, "FETCH", f"{known + 1}:*", "(UID)")
+        new_uids = []
+        for response in responses:
+            if response.name == "FETCH":
+                for seq, attributes in parse_fetch_response(response.data):
+                    if seq > known and "UID" in attributes:
+                        new_uids.append(int(attributes["UID"]))
+                        break
+                else:
+                    self._handle_untagged(watched, response)
+            else:
+                self._handle_untagged(watched, response)
+        new_uids = sorted(uid for uid in set(new_uids) if not watched.uids or uid > watched.uids[-1])
+        watched.uids.extend(new_uids)
+        watched.exists = len(watched.uids)
+        if new_uids:
+            self._emit(watched, MailboxEvent("EXISTS", watched.mailbox, new_uids))
+
+    def _handle_untagged(self, watched: _WatchedMailbox, response: Response) -> None:
+        if response.kind != "untagged":
+            return
+        if response.name == "BYE":
+            raise imaplib.IMAP4.abort("Сервер закрыл соединение")
+        if response.name == "EXISTS":
+            watched.exists = int(response.data[0])
+        elif response.name == "EXPUNGE":
+            seq = int(response.data[0])
+            watched.exists -= 1
+            if 1 <= seq <= len(watched.uids):
+                self._emit(watched, MailboxEvent("EXPUNGE", watched.mailbox, [watched.uids.pop(seq - 1)]))
+        elif response.name == "VANISHED":
+            text = response.data[0].decode("ascii")
+            if text.upper().startswith("(EARLIER)"):
+                return
+            vanished = [uid for uid in from_sequence_set(text) if uid in watched.uids]
+            for uid in vanished:
+                watched.uids.remove(uid)
+            watched.exists -= len(vanished)
+            if vanished:
+                self._emit(watched, MailboxEvent("EXPUNGE", watched.mailbox, vanished))
+        elif response.name == "FETCH":
+            flags = {}
+            for seq, attributes in parse_fetch_response(response.data):
+                if "UID" in attributes:
+                    uid = int(attributes["UID"])
+                elif 1 <= seq <= len(watched.uids):
+                    uid = watched.uids[seq - 1]
+                else:
+                    continue
+                flags[uid] = attributes.get("FLAGS") or []
+            if flags:
+                self._emit(watched, MailboxEvent("FETCH", watched.mailbox, list(flags), flags))
+
+    def _emit(self, watched: _WatchedMailbox, event: MailboxEvent) -> None:
+        event.username = watched.client.username
+        try:
+            watched.callback(event)
+        except Exception as e:
+            self.errors.append(e)
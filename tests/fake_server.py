@@ -0,0 +1,751 @@
+import email
+import email.header
+import email.utils
+import random
+import re
+import select
+import socket
+import socketserver
+import ssl
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage, Message
+from typing import Any, BinaryIO, Iterable, Iterator
+from src.parser import parse, to_sequence_set
+
+CAPABILITIES = ("IMAP4rev1", "LITERAL+", "UIDPLUS", "CONDSTORE", "QRESYNC", "ENABLE", "IDLE", "MULTIAPPEND",
+                "ESEARCH", "SORT", "THREAD=REFERENCES", "LIST-STATUS", "SPECIAL-USE", "COMPRESS=DEFLATE")
+MIME_KINDS = ("plain", "html", "alternative", "attachment")
+UID_COMMANDS = ("FETCH", "SEARCH", "STORE", "SORT", "THREAD")
+WORDS = ["счёт", "оплата", "встреча", "отчёт", "проект", "завтра", "срочно", "invoice", "meeting", "report",
+         "release", "review", "deadline", "budget", "привет", "спасибо"]
+FLAG_KEYS = {"SEEN": "\\Seen", "FLAGGED": "\\Flagged", "ANSWERED": "\\Answered", "DELETED": "\\Deleted",
+             "DRAFT": "\\Draft"}
+
+
+class FakeMessage:
+    def __init__(self, uid: int, raw: bytes, flags: Iterable[str] = (),
+                 internaldate: str = "01-Jan-2024 00:00:00 +0000", modseq: int = 1) -> None:
+        self.uid = uid
+        self.raw = raw
+        self.flags = set(flags)
+        self.internaldate = internaldate
+        self.modseq = modseq
+        self._parsed: Message | None = None
+
+    @property
+    def parsed(self) -> Message:
+        if self._parsed is None:
+            self._parsed = email.message_from_bytes(self.raw)
+        return self._parsed
+
+
+class FakeMailbox:
+    def __init__(self, name: str, uidvalidity: int = 1, flags: Iterable[str] = ()) -> None:
+        self.name = name
+        self.flags = list(flags)
+        self.uidvalidity = uidvalidity
+        self.uidnext = 1
+        self.highestmodseq = 1
+        self.messages: list[FakeMessage] = []
+        self.expunged: list[tuple[int, int]] = []
+        self.listeners: list[_Session] = []
+
+    def add(self, raw: bytes, flags: Iterable[str] = ()) -> FakeMessage:
+        self.highestmodseq += 1
+        message = FakeMessage(self.uidnext, raw, flags, modseq=self.highestmodseq)
+        self.uidnext += 1
+        self.messages.append(message)
+        self._notify(f"* {len(self.messages)} EXISTS")
+        return message
+
+    def expunge(self, uid: int) -> None:
+        self.highestmodseq += 1
+        for seq, message in enumerate(self.messages, 1):
+            if message.uid == uid:
+                del self.messages[seq - 1]
+                self._notify(f"* {seq} EXPUNGE")
+                break
+        self.expunged.append((uid, self.highestmodseq))
+
+    def set_flags(self, uid: int, flags: Iterable[str]) -> None:
+        self.highestmodseq += 1
+        for seq, message in enumerate(self.messages, 1):
+            if message.uid == uid:
+                message.flags = set(flags)
+                message.modseq = self.highestmodseq
+                self._notify(f"* {seq} FETCH (FLAGS ({' '.join(sorted(message.flags))}))")
+
+    def _notify(self, line: str) -> None:
+        for session in list(self.listeners):
+            session.notify(line)
+
+
+def synthetic_message(index: int, rng: random.Random, size: int = 2048, kind: str = "plain",
+                      charset: str = "utf-8", attachment_size: int = 16384) -> bytes:
+    if kind not in MIME_KINDS:
+        raise ValueError(f"Неизвестный тип письма: {kind}")
+    msg = EmailMessage()
+    msg["From"] = f"Отправитель {index % 97} <sender{index % 97}@example.com>"
+    msg["To"] = "user@example.com"
+    msg["Subject"] = f"Письмо {index}: " + " ".join(rng.choices(WORDS, k=4))
+    msg["Date"] = email.utils.format_datetime(datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=index))
+    text = _synthetic_text(rng, size)
+    html = f"<html><head><style>p{{margin:0}}</style></head><body><p>{text}</p></body></html>"
+    if kind == "html":
+        msg.set_content(html, subtype="html", charset=charset)
+    else:
+        msg.set_content(text, charset=charset)
+    if kind == "alternative":
+        msg.add_alternative(html, subtype="html", charset=charset)
+    elif kind == "attachment":
+        msg.add_attachment(rng.randbytes(attachment_size), maintype="application", subtype="octet-stream",
+                           filename=f"вложение-{index}.bin")
+    return msg.as_bytes()
+
+
+def synthetic_messages(count: int, size: int = 2048, mime_mix: dict[str, float] | None = None,
+                       charsets: Iterable[str] = ("utf-8",), attachment_size: int = 16384,
+                       seed: int = 0) -> Iterator[bytes]:
+    rng = random.Random(seed)
+    mime_mix = mime_mix or {"plain": 1.0}
+    kinds, weights = list(mime_mix), list(mime_mix.values())
+    charsets = list(charsets)
+    for index in range(1, count + 1):
+        yield synthetic_message(index, rng, size, rng.choices(kinds, weights)[0], rng.choice(charsets),
+                                attachment_size)
+
+
+def _synthetic_text(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        words.append(rng.choice(WORDS))
+        length += len(words[-1]) + 1
+    return " ".join(words)
+
+
+class FakeIMAPServer:
+    def __init__(self, capabilities: Iterable[str] = CAPABILITIES, users: dict[str, str] | None = None,
+                 latency: float = 0.0, ssl_context: ssl.SSLContext | None = None) -> None:
+        self.capabilities = list(capabilities)
+        self.users = users or {"user": "password"}
+        self.mailboxes = {"INBOX": FakeMailbox("INBOX")}
+        self.latency = latency
+        self.delimiter = "/"
+        self.ssl_context = ssl_context
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.commands: list[str] = []
+        self.unsolicited: dict[str, list[str]] = {}
+        self.lock = threading.RLock()
+        self._server: socketserver.ThreadingTCPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    def add_mailbox(self, name: str, uidvalidity: int = 1, flags: Iterable[str] = ()) -> FakeMailbox:
+        self.mailboxes[name] = FakeMailbox(name, uidvalidity, flags)
+        return self.mailboxes[name]
+
+    def load(self, mailbox: str = "INBOX", count: int = 100, size: int = 2048,
+             mime_mix: dict[str, float] | None = None, charsets: Iterable[str] = ("utf-8",),
+             attachment_size: int = 16384, seed: int = 0) -> FakeMailbox:
+        target = self.mailboxes.get(mailbox) or self.add_mailbox(mailbox)
+        for raw in synthetic_messages(count, size, mime_mix, charsets, attachment_size, seed):
+            target.add(raw)
+        return target
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def wire_bytes(self) -> int:
+        return self.bytes_sent + self.bytes_received
+
+    def reset_counters(self) -> None:
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.commands.clear()
+
+    def start(self) -> "FakeIMAPServer":
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self) -> None:
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                if fake.ssl_context:
+                    self.request = fake.ssl_context.wrap_socket(self.request, server_side=True)
+                super().setup()
+
+            def handle(self) -> None:
+                session = _Session(fake, _CountingReader(self.rfile, fake), _CountingWriter(self.wfile, fake),
+                                   self.request)
+                try:
+                    session.run()
+                finally:
+                    session.select(None)
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+            request_queue_size = 1024
+
+        self._server = Server(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeIMAPServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+class _CountingReader:
+    def __init__(self, raw: BinaryIO, server: FakeIMAPServer) -> None:
+        self.raw = raw
+        self.server = server
+
+    def readline(self) -> bytes:
+        return self._count(self.raw.readline())
+
+    def read(self, size: int) -> bytes:
+        return self._count(self.raw.read(size))
+
+    def read1(self, size: int) -> bytes:
+        return self._count(self.raw.read1(size))
+
+    def _count(self, data: bytes) -> bytes:
+        self.server.bytes_received += len(data)
+        return data
+
+
+class _CountingWriter:
+    def __init__(self, raw: BinaryIO, server: FakeIMAPServer) -> None:
+        self.raw = raw
+        self.server = server
+
+    def write(self, data: bytes) -> None:
+        self.server.bytes_sent += len(data)
+        self.raw.write(data)
+
+    def flush(self) -> None:
+        self.raw.flush()
+
+
+class _InflateReader:
+    def __init__(self, raw: _CountingReader) -> None:
+        self.raw = raw
+        self.decompressor = zlib.decompressobj(-15)
+        self.buffer = b""
+
+    def _fill(self) -> bool:
+        chunk = self.raw.read1(65536)
+        self.buffer += self.decompressor.decompress(chunk)
+        return bool(chunk)
+
+    def readline(self) -> bytes:
+        while b"\n" not in self.buffer and self._fill():
+            pass
+        end = self.buffer.find(b"\n") + 1 or len(self.buffer)
+        line, self.buffer = self.buffer[:end], self.buffer[end:]
+        return line
+
+    def read(self, size: int) -> bytes:
+        while len(self.buffer) < size and self._fill():
+            pass
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class _DeflateWriter:
+    def __init__(self, raw: _CountingWriter) -> None:
+        self.raw = raw
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+
+    def write(self, data: bytes) -> None:
+        self.raw.write(self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH))
+
+    def flush(self) -> None:
+        self.raw.flush()
+
+
+class _Session:
+    def __init__(self, server: FakeIMAPServer, rfile: Any, wfile: Any, sock: socket.socket | None = None) -> None:
+        self.server = server
+        self.rfile = rfile
+        self.wfile = wfile
+        self.sock = sock
+        self.selected: FakeMailbox | None = None
+        self.logged_in = False
+        self.enabled: set[str] = set()
+        self.compressed = False
+        self.pending: list[str] = []
+        self.pending_lock = threading.Lock()
+
+    def notify(self, line: str) -> None:
+        with self.pending_lock:
+            self.pending.append(line)
+
+    def flush_pending(self) -> None:
+        with self.pending_lock:
+            pending, self.pending = self.pending, []
+        for line in pending:
+            self.line(line)
+
+    def select(self, mailbox: FakeMailbox | None) -> None:
+        if self.selected is not None and self in self.selected.listeners:
+            self.selected.listeners.remove(self)
+        self.selected = mailbox
+        with self.pending_lock:
+            self.pending = []
+        if mailbox is not None:
+            mailbox.listeners.append(self)
+
+    def send(self, data: bytes) -> None:
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    def line(self, text: str) -> None:
+        self.send(text.encode("utf-8") + b"\r\n")
+
+    def read_command(self) -> list[bytes | tuple[bytes, bytes]] | None:
+        parts = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return None
+            match = re.search(rb"\{(\d+)(\+?)\}\r\n$", line)
+            if not match:
+                parts.append(line.rstrip(b"\r\n"))
+                return parts
+            if not match.group(2):
+                self.line("+ Ready")
+            parts.append((line.rstrip(b"\r\n"), self.rfile.read(int(match.group(1)))))
+
+    def run(self) -> None:
+        self.line("* OK [CAPABILITY " + " ".join(self.server.capabilities) + "] fake server ready")
+        while True:
+            parts = self.read_command()
+            if parts is None:
+                return
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            args = parse(parts)
+            if len(args) < 2:
+                continue
+            tag, name, args = args[0], args[1].upper(), args[2:]
+            self.server.commands.append(name)
+            uid = False
+            if name == "UID":
+                uid, name, args = True, args[0].upper(), args[1:]
+            handler = getattr(self, "cmd_" + name.lower(), None)
+            if handler is None:
+                self.line(f"{tag} BAD unknown command")
+                continue
+            if name == "IDLE":
+                self.cmd_idle(tag)
+                continue
+            with self.server.lock:
+                for line in self.server.unsolicited.pop(name, []):
+                    self.line(line)
+                try:
+                    result = handler(tag, args, uid) if name in UID_COMMANDS else handler(tag, args)
+                except Exception as e:
+                    self.line(f"{tag} BAD {e}")
+                    continue
+            if result == "LOGOUT":
+                return
+
+    def cmd_idle(self, tag: str) -> None:
+        self.line("+ idling")
+        while True:
+            self.flush_pending()
+            readable, _, _ = select.select([self.sock], [], [], 0.02)
+            if readable:
+                line = self.rfile.readline()
+                if not line or line.strip().upper() == b"DONE":
+                    break
+        self.flush_pending()
+        self.line(f"{tag} OK IDLE terminated")
+
+    def cmd_capability(self, tag: str, args: list[Any]) -> None:
+        self.line("* CAPABILITY " + " ".join(self.server.capabilities))
+        self.line(f"{tag} OK CAPABILITY completed")
+
+    def cmd_compress(self, tag: str, args: list[Any]) -> None:
+        if "COMPRESS=DEFLATE" not in self.server.capabilities or self.compressed:
+            self.line(f"{tag} NO [COMPRESSIONACTIVE] not available")
+            return
+        self.line(f"{tag} OK DEFLATE active")
+        self.rfile = _InflateReader(self.rfile)
+        self.wfile = _DeflateWriter(self.wfile)
+        self.compressed = True
+
+    def cmd_noop(self, tag: str, args: list[Any]) -> None:
+        self.flush_pending()
+        self.line(f"{tag} OK NOOP completed")
+
+    def cmd_logout(self, tag: str, args: list[Any]) -> str:
+        self.line("* BYE logging out")
+        self.line(f"{tag} OK LOGOUT completed")
+        return "LOGOUT"
+
+    def cmd_login(self, tag: str, args: list[Any]) -> None:
+        if self.server.users.get(args[0]) != args[1]:
+            self.line(f"{tag} NO [AUTHENTICATIONFAILED] invalid credentials")
+            return
+        self.logged_in = True
+        self.line(f"{tag} OK LOGIN completed")
+
+    def cmd_enable(self, tag: str, args: list[Any]) -> None:
+        self.enabled.update(arg.upper() for arg in args)
+        self.line("* ENABLED " + " ".join(args))
+        self.line(f"{tag} OK ENABLE completed")
+
+    def cmd_list(self, tag: str, args: list[Any]) -> None:
+        returns = args[args.index("RETURN") + 1] if "RETURN" in args else []
+        status_items = returns[returns.index("STATUS") + 1] if "STATUS" in returns else None
+        for name, mailbox in self.server.mailboxes.items():
+            flags = " ".join(["\\HasNoChildren", *mailbox.flags])
+            quoted = name if re.fullmatch(r"[\w.-]+", name) else _quote(name)
+            self.line(f'* LIST ({flags}) {_quote(self.server.delimiter)} {quoted}')
+            if status_items is not None and "\\Noselect" not in mailbox.flags:
+                self._status_line(mailbox, status_items)
+        self.line(f"{tag} OK LIST completed")
+
+    def cmd_status(self, tag: str, args: list[Any]) -> None:
+        mailbox = self.server.mailboxes.get(args[0])
+        if mailbox is None or "\\Noselect" in mailbox.flags:
+            self.line(f"{tag} NO no such mailbox")
+            return
+        self._status_line(mailbox, args[1])
+        self.line(f"{tag} OK STATUS completed")
+
+    def _status_line(self, mailbox: FakeMailbox, items: list[str]) -> None:
+        values = {
+            "MESSAGES": len(mailbox.messages),
+            "UNSEEN": sum(1 for message in mailbox.messages if "\\Seen" not in message.flags),
+            "UIDNEXT": mailbox.uidnext,
+            "UIDVALIDITY": mailbox.uidvalidity,
+            "HIGHESTMODSEQ": mailbox.highestmodseq,
+        }
+        pairs = " ".join(f"{item.upper()} {values[item.upper()]}" for item in items)
+        self.line(f"* STATUS {_quote(mailbox.name)} ({pairs})")
+
+    def cmd_select(self, tag: str, args: list[Any]) -> None:
+        mailbox = self.server.mailboxes.get(args[0])
+        if mailbox is None:
+            self.select(None)
+            self.line(f"{tag} NO no such mailbox")
+            return
+        self.select(mailbox)
+        self.line(f"* {len(mailbox.messages)} EXISTS")
+        self.line("* 0 RECENT")
+        self.line("* FLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft)")
+        self.line(f"* OK [UIDVALIDITY {mailbox.uidvalidity}] UIDs valid")
+        self.line(f"* OK [UIDNEXT {mailbox.uidnext}] predicted next UID")
+        if "CONDSTORE" in self.server.capabilities:
+            self.line(f"* OK [HIGHESTMODSEQ {mailbox.highestmodseq}] highest")
+        self.line(f"{tag} OK [READ-WRITE] SELECT completed")
+
+    cmd_examine = cmd_select
+
+    def _resolve(self, sequence_set: str, uid: bool) -> list[tuple[int, FakeMessage]]:
+        messages = self.selected.messages
+        if not messages:
+            return []
+        top = messages[-1].uid if uid else len(messages)
+        ranges = []
+        for part in sequence_set.split(","):
+            start, _, end = part.partition(":")
+            start = top if start == "*" else int(start)
+            end = start if not end else top if end == "*" else int(end)
+            ranges.append((min(start, end), max(start, end)))
+        return [(seq, message) for seq, message in enumerate(messages, 1)
+                if any(start <= (message.uid if uid else seq) <= end for start, end in ranges)]
+
+    def cmd_search(self, tag: str, args: list[Any], uid: bool) -> None:
+        returns = None
+        if args and isinstance(args[0], str) and args[0].upper() == "RETURN":
+            returns, args = [item.upper() for item in args[1]] or ["ALL"], args[2:]
+        result = self._search(args, uid)
+        if returns is None:
+            self.line("* SEARCH" + "".join(f" {n}" for n in result))
+        else:
+            data = [f'(TAG "{tag}")'] + (["UID"] if uid else [])
+            if result and "MIN" in returns:
+                data.append(f"MIN {min(result)}")
+            if result and "MAX" in returns:
+                data.append(f"MAX {max(result)}")
+            if "COUNT" in returns:
+                data.append(f"COUNT {len(result)}")
+            if result and "ALL" in returns:
+                data.append(f"ALL {to_sequence_set(result)}")
+            self.line("* ESEARCH " + " ".join(data))
+        self.line(f"{tag} OK SEARCH completed")
+
+    def cmd_sort(self, tag: str, args: list[Any], uid: bool) -> None:
+        result = self._search(args[2:], uid)
+        messages = {message.uid if uid else seq: message for seq, message in enumerate(self.selected.messages, 1)}
+        keys = {
+            "SIZE": lambda n: len(messages[n].raw), "ARRIVAL": lambda n: n, "DATE": lambda n: n,
+            "FROM": lambda n: str(messages[n].parsed["From"] or "").lower(),
+            "SUBJECT": lambda n: str(messages[n].parsed["Subject"] or "").lower(),
+        }
+        criteria = []
+        reverse = False
+        for criterion in (item.upper() for item in args[0]):
+            if criterion == "REVERSE":
+                reverse = True
+                continue
+            criteria.append((keys[criterion], reverse))
+            reverse = False
+        for key, reverse in reversed(criteria):
+            result.sort(key=key, reverse=reverse)
+        self.line("* SORT" + "".join(f" {n}" for n in result))
+        self.line(f"{tag} OK SORT completed")
+
+    def cmd_thread(self, tag: str, args: list[Any], uid: bool) -> None:
+        messages = {message.uid if uid else seq: message for seq, message in enumerate(self.selected.messages, 1)}
+        threads: dict[str, list[int]] = {}
+        for n in self._search(args[2:], uid):
+            subject = re.sub(r"^(re: *)+", "", str(messages[n].parsed["Subject"] or ""), flags=re.I)
+            threads.setdefault(subject, []).append(n)
+        self.line("* THREAD " + "".join("(" + " ".join(map(str, thread)) + ")" for thread in threads.values()))
+        self.line(f"{tag} OK THREAD completed")
+
+    def _search(self, args: list[Any], uid: bool) -> list[int]:
+        if args and isinstance(args[0], str) and args[0].upper() == "CHARSET":
+            args = args[2:]
+        return [message.uid if uid else seq for seq, message in enumerate(self.selected.messages, 1)
+                if self._matches(list(args), seq, message)]
+
+    def _matches(self, args: list[Any], seq: int, message: FakeMessage) -> bool:
+        while args:
+            if not self._match_key(args, seq, message):
+                return False
+        return True
+
+    def _match_key(self, args: list[Any], seq: int, message: FakeMessage) -> bool:
+        key = args.pop(0)
+        if isinstance(key, list):
+            return self._matches(list(key), seq, message)
+        key = key.upper()
+        if key == "ALL":
+            return True
+        if key == "UID":
+            return any(found is message for _, found in self._resolve(args.pop(0), True))
+        if key == "OR":
+            first = self._match_key(args, seq, message)
+            second = self._match_key(args, seq, message)
+            return first or second
+        if key == "NOT":
+            return not self._match_key(args, seq, message)
+        if key in ("FROM", "TO", "CC", "SUBJECT"):
+            return _text(args.pop(0)).lower() in _header(message, key.capitalize() if key != "CC" else "Cc")
+        if key in ("BODY", "TEXT"):
+            return _text(args.pop(0)).lower().encode() in message.raw.lower()
+        if key == "LARGER":
+            return len(message.raw) > int(args.pop(0))
+        if key == "SMALLER":
+            return len(message.raw) < int(args.pop(0))
+        if key in ("SINCE", "BEFORE", "ON"):
+            date = time.strptime(args.pop(0), "%d-%b-%Y")
+            own = time.strptime(message.internaldate.split()[0], "%d-%b-%Y")
+            return {"SINCE": own >= date, "BEFORE": own < date, "ON": own == date}[key]
+        if key in FLAG_KEYS:
+            return FLAG_KEYS[key] in message.flags
+        if key.startswith("UN") and key[2:] in FLAG_KEYS:
+            return FLAG_KEYS[key[2:]] not in message.flags
+        if key == "KEYWORD":
+            return args.pop(0) in message.flags
+        if re.fullmatch(r"[\d:*,]+", key):
+            return any(found is message for _, found in self._resolve(key, False))
+        raise ValueError(f"unsupported search key {key}")
+
+    def cmd_store(self, tag: str, args: list[Any], uid: bool) -> None:
+        mode = args[1].upper()
+        flags = set(args[2] if isinstance(args[2], list) else [args[2]])
+        for seq, message in self._resolve(args[0], uid):
+            if mode.startswith("+"):
+                updated = message.flags | flags
+            elif mode.startswith("-"):
+                updated = message.flags - flags
+            else:
+                updated = flags
+            self.selected.set_flags(message.uid, updated)
+            if not mode.endswith(".SILENT"):
+                self.flush_pending()
+        self.line(f"{tag} OK STORE completed")
+
+    def cmd_expunge(self, tag: str, args: list[Any]) -> None:
+        for message in [message for message in self.selected.messages if "\\Deleted" in message.flags]:
+            self.selected.expunge(message.uid)
+        self.flush_pending()
+        self.line(f"{tag} OK EXPUNGE completed")
+
+    def cmd_fetch(self, tag: str, args: list[Any], uid: bool) -> None:
+        items = args[1] if isinstance(args[1], list) else [args[1]]
+        items = [item.upper() if isinstance(item, str) else item for item in items]
+        if uid and "UID" not in items:
+            items = ["UID"] + items
+        modifiers = [modifier.upper() for modifier in args[2]] if len(args) > 2 else []
+        changedsince = int(modifiers[modifiers.index("CHANGEDSINCE") + 1]) if "CHANGEDSINCE" in modifiers else None
+        if changedsince is not None and "MODSEQ" not in items:
+            items.append("MODSEQ")
+        if "VANISHED" in modifiers:
+            vanished = [uid for uid, modseq in self.selected.expunged if modseq > changedsince]
+            if vanished:
+                self.line("* VANISHED (EARLIER) " + to_sequence_set(vanished))
+        for seq, message in self._resolve(args[0], uid):
+            if changedsince is not None and message.modseq <= changedsince:
+                continue
+            chunks = []
+            for item in items:
+                name, data = self._fetch_item(message, item)
+                chunks.append(name.encode() + b" " + (b"{%d}\r\n" % len(data) + data if isinstance(data, bytes)
+                                                      else data.encode()))
+            self.send(f"* {seq} FETCH (".encode() + b" ".join(chunks) + b")\r\n")
+        self.line(f"{tag} OK FETCH completed")
+
+    def _fetch_item(self, message: FakeMessage, item: str) -> tuple[str, str | bytes]:
+        if item == "UID":
+            return "UID", str(message.uid)
+        if item == "FLAGS":
+            return "FLAGS", "(" + " ".join(sorted(message.flags)) + ")"
+        if item == "RFC822.SIZE":
+            return "RFC822.SIZE", str(len(message.raw))
+        if item == "INTERNALDATE":
+            return "INTERNALDATE", f'"{message.internaldate}"'
+        if item == "MODSEQ":
+            return "MODSEQ", f"({message.modseq})"
+        if item in ("RFC822", "BODY[]", "BODY.PEEK[]"):
+            return "RFC822" if item == "RFC822" else "BODY[]", message.raw
+        if item == "BODYSTRUCTURE":
+            return "BODYSTRUCTURE", _bodystructure(message.parsed)
+        match = re.fullmatch(r"BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?", item)
+        if match is None:
+            raise ValueError(f"unsupported fetch item {item}")
+        section, offset, length = match.groups()
+        data = _section(message, section)
+        name = f"BODY[{section}]"
+        if offset is not None:
+            data = data[int(offset):int(offset) + int(length)]
+            name += f"<{offset}>"
+        return name, data
+
+    def cmd_append(self, tag: str, args: list[Any]) -> None:
+        mailbox = self.server.mailboxes.get(args[0])
+        if mailbox is None:
+            self.line(f"{tag} NO [TRYCREATE] no such mailbox")
+            return
+        args = args[1:]
+        uids = []
+        while args:
+            flags = ()
+            if isinstance(args[0], list):
+                flags, args = args[0], args[1:]
+            if isinstance(args[0], str):
+                args = args[1:]
+            uids.append(mailbox.add(args[0], flags).uid)
+            args = args[1:]
+        self.line(f"{tag} OK [APPENDUID {mailbox.uidvalidity} {to_sequence_set(uids)}] APPEND completed")
+
+
+def _text(value: str | bytes) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _header(message: FakeMessage, name: str) -> str:
+    value = message.parsed[name]
+    return str(email.header.make_header(email.header.decode_header(value))).lower() if value else ""
+
+
+def _quote(value: Any) -> str:
+    if value is None:
+        return "NIL"
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _split_raw(raw: bytes) -> tuple[bytes, bytes]:
+    for separator in (b"\r\n\r\n", b"\n\n"):
+        index = raw.find(separator)
+        if index >= 0:
+            return raw[:index + len(separator)], raw[index + len(separator):]
+    return raw, b""
+
+
+def _section(message: FakeMessage, section: str) -> bytes:
+    if section == "":
+        return message.raw
+    head, text = _split_raw(message.raw)
+    if section == "HEADER":
+        return head
+    if section == "TEXT":
+        return text
+    match = re.fullmatch(r"HEADER\.FIELDS(\.NOT)? \((.*)\)", section)
+    if match:
+        names = {name.upper() for name in match.group(2).split()}
+        lines = []
+        keep = False
+        for line in re.split(rb"(?<=\n)", head):
+            if line[:1] in (b" ", b"\t"):
+                if keep:
+                    lines.append(line)
+                continue
+            name = line.split(b":", 1)[0].decode(errors="ignore").upper()
+            keep = line.strip() != b"" and (name in names) != bool(match.group(1))
+            if keep:
+                lines.append(line)
+        return b"".join(lines) + b"\r\n"
+    part = message.parsed
+    numbers = section.split(".")
+    for number in numbers:
+        if not number.isdigit():
+            break
+        if part.is_multipart():
+            part = part.get_payload()[int(number) - 1]
+        elif number != "1":
+            raise ValueError("no such part")
+    if numbers[-1] == "MIME":
+        return _split_raw(part.as_bytes())[0]
+    if part.is_multipart():
+        return _split_raw(part.as_bytes())[1]
+    payload = part.get_payload()
+    return payload.encode("ascii", "surrogateescape") if isinstance(payload, str) else payload
+
+
+def _params(part: Message, header: str) -> str:
+    params = part.get_params(header=header)
+    items = []
+    for key, value in (params or [])[1:]:
+        value = value if isinstance(value, str) else email.utils.collapse_rfc2231_value(value)
+        items += [_quote(key.upper()), _quote(value)]
+    return "(" + " ".join(items) + ")" if items else "NIL"
+
+
+def _bodystructure(part: Message) -> str:
+    if part.is_multipart():
+        children = "".join(_bodystructure(child) for child in part.get_payload())
+        return f"({children} {_quote(part.get_content_subtype().upper())} {_params(part, 'content-type')} NIL NIL NIL)"
+    maintype, subtype = part.get_content_maintype().upper(), part.get_content_subtype().upper()
+    payload = part.get_payload()
+    body = payload.encode("ascii", "surrogateescape") if isinstance(payload, str) else b""
+    encoding = (part.get("Content-Transfer-Encoding") or "7BIT").upper()
+    fields = [_quote(maintype), _quote(subtype), _params(part, "content-type"), "NIL", "NIL", _quote(encoding),
+              str(len(body))]
+    if maintype == "TEXT":
+        fields.append(str(body.count(b"\n")))
+    disposition = part.get("Content-Disposition")
+    if disposition:
+        fields += ["NIL", f"({_quote(disposition.split(';')[0].strip().upper())} "
+                          f"{_params(part, 'content-disposition')})", "NIL", "NIL"]
+    return "(" + " ".join(fields) + ")"
@@ -0,0 +1,157 @@
+import asyncio
+from unittest.mock import Mock
+from pytest import raises
+from src.async_client import AsyncIMAPClient
+from src.client import IMAPClient, ConnectionErr, LoginErr, MailboxErr
+from tests.fake_server import FakeIMAPServer
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+async def fake_client(server_data: bytes) -> AsyncIMAPClient:
+    client = AsyncIMAPClient()
+    client._reader = asyncio.StreamReader()
+    client._reader.feed_data(server_data)
+    client._writer = Mock()
+
+    async def drain():
+        pass
+
+    client._writer.drain = drain
+    return client
+
+
+class TestAsyncClient:
+    def test_connection_err(self):
+        client = AsyncIMAPClient()
+
+        with raises(ConnectionErr):
+            run(client.login("", ""))
+        with raises(ConnectionErr):
+            run(client.list_mailboxes())
+        with raises(ConnectionErr):
+            run(client.select_mailbox(""))
+        with raises(ConnectionErr):
+            run(collect(client.list_emails()))
+        with raises(ConnectionErr):
+            run(client.read_email(0))
+        with raises(ConnectionErr):
+            run(client.download_attachments("", ""))
+        with raises(ConnectionErr):
+            run(client.upload_email("", "", ""))
+
+    def test_login_err(self):
+        client = AsyncIMAPClient()
+        client._writer = Mock()
+
+        with raises(LoginErr):
+            run(client.list_mailboxes())
+        with raises(LoginErr):
+            run(client.select_mailbox(""))
+        with raises(LoginErr):
+            run(collect(client.list_emails()))
+        with raises(LoginErr):
+            run(client.read_email(0))
+        with raises(LoginErr):
+            run(client.upload_email("", "", ""))
+
+    def test_mailbox_err(self):
+        client = AsyncIMAPClient()
+        client._writer = Mock()
+        client._logged_in = True
+
+        with raises(MailboxErr):
+            run(collect(client.list_emails()))
+        with raises(MailboxErr):
+            run(client.read_email(0))
+        with raises(MailboxErr):
+            run(client.download_attachments("", ""))
+
+    def test_list_mailboxes(self):
+        async def scenario():
+            client = await fake_client(b'* LIST (\\noselect) "/" "1"\r\n* LIST () "/" "2"\r\n'
+                                       b'* LIST () "/" "&BBoEPgRABDcEOAQ9BDA-"\r\nA0001 OK LIST completed\r\n')
+            client._logged_in = True
+
+            assert await client.list_mailboxes() == ["2", "Корзина"]
+            client._writer.write.assert_called_once_with(b'A0001 LIST "" *\r\n')
+
+        run(scenario())
+
+    def test_select_and_read_email(self):
+        async def scenario():
+            client = await fake_client(
+                b"* 1 EXISTS\r\n* OK [UIDVALIDITY 3] UIDs valid\r\nA0001 OK [READ-WRITE] done\r\n"
+                b"* 1 FETCH (UID 7 RFC822 {24}\r\nSubject: Hi\r\n\r\nGood body)\r\n"
+                b"A0002 OK FETCH completed\r\n"
+            )
+            client._logged_in = True
+
+            assert await client.select_mailbox("INBOX") == ("OK", [b"1"])
+            assert client._uidvalidity == 3
+
+            res = await client.read_email(7)
+
+            assert res.description == "Hi"
+            assert res.body == ["Good body"]
+            client._writer.write.assert_called_with(b"A0002 UID FETCH 7 (RFC822)\r\n")
+
+        run(scenario())
+
+    def test_list_emails_skips_unsolicited_fetch(self):
+        async def scenario():
+            client = await fake_client(
+                b"* SEARCH 1 2\r\nA0001 OK SEARCH completed\r\n"
+                b"* 2 FETCH (FLAGS (\\Seen))\r\n* 5 FETCH (UID 5 FLAGS ())\r\n"
+                b"* 2 FETCH (UID 2 RFC822.SIZE 10)\r\n* 1 FETCH (UID 1 RFC822.SIZE 20)\r\n"
+                b"A0002 OK FETCH completed\r\n"
+            )
+            client._logged_in = True
+            client._mailbox_selected = True
+
+            res = await collect(client.list_emails(headers_only=True))
+
+            assert [(email.id, email.size) for email in res] == [(2, 10), (1, 20)]
+
+        run(scenario())
+
+    def test_list_mailboxes_matches_sync_client(self):
+        async def scenario(port):
+            client = AsyncIMAPClient()
+            await client.connect_plain("127.0.0.1", port)
+            await client.login("user", "password")
+            res = await client.list_mailboxes()
+            await client.close()
+            return res
+
+        with FakeIMAPServer() as server:
+            server.delimiter = "."
+            server.add_mailbox("Sent Items")
+            server.add_mailbox("Archive")
+            server.add_mailbox("Trash", flags=["\\Noselect"])
+            client = IMAPClient()
+            client.connect_plain("127.0.0.1", server.port)
+            client.login("user", "password")
+
+            assert run(scenario(server.port)) == client.list_mailboxes() == ["INBOX", "Sent Items", "Archive"]
+            client.close()
+
+    def test_connect_uses_tls(self, monkeypatch):
+        opened = []
+
+        async def fake_open(self, server, port, timeout, ssl_context):
+            opened.append((server, port, ssl_context is not None))
+
+        monkeypatch.setattr(AsyncIMAPClient, "_open", fake_open)
+        client = AsyncIMAPClient()
+
+        run(client.connect("imap.example.com"))
+        run(client.connect_plain("imap.example.com"))
+
+        assert opened == [("imap.example.com", 993, True), ("imap.example.com", 143, False)]
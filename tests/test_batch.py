@@ -0,0 +1,159 @@
+import io
+import json
+from unittest.mock import Mock
+from pytest import fixture, raises
+from src.batch import (Account, BatchRunner, ConfigErr, JsonLinesWriter, SyncStateStore, fetch_job, list_job,
+                       load_config, sync_job, upload_job)
+from src.client import ConnectionErr, MailboxErr
+from tests.fake_server import FakeIMAPServer, synthetic_messages
+
+
+@fixture
+def server():
+    server = FakeIMAPServer().start()
+    server.load(count=5)
+    server.add_mailbox("Sent")
+    yield server
+    server.stop()
+
+
+def make_runner(**kwargs) -> tuple[BatchRunner, io.StringIO]:
+    stream = io.StringIO()
+    return BatchRunner(JsonLinesWriter(stream), **kwargs), stream
+
+
+def records(stream: io.StringIO) -> list[dict]:
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def accounts(server: FakeIMAPServer, *names: str) -> list[Account]:
+    return [Account(name, "127.0.0.1", "user", "password", server.port, use_ssl=False) for name in names]
+
+
+class TestConfig:
+    def test_load_config(self, tmp_path, monkeypatch):
+        path = tmp_path / "accounts.toml"
+        path.write_text('[defaults]\nserver = "imap.example.com"\nmailboxes = ["INBOX", "Sent"]\n'
+                        '[batch]\nparallel = 8\n'
+                        '[accounts.work]\nusername = "me"\npassword_env = "WORK_PASSWORD"\nport = 143\nssl = false\n'
+                        '[accounts.home]\nserver = "imap.home.example"\nusername = "me"\npassword = "secret"\n',
+                        encoding="utf-8")
+        monkeypatch.setenv("WORK_PASSWORD", "env-secret")
+
+        config = load_config(str(path))
+
+        work, home = config.select()
+        assert (work.server, work.port, work.use_ssl, work.password) == ("imap.example.com", 143, False, "env-secret")
+        assert (home.server, home.port, home.use_ssl, home.mailboxes) == ("imap.home.example", 993, True,
+                                                                          ["INBOX", "Sent"])
+        assert (config.parallel, config.retries) == (8, 3)
+        assert config.select(["home"]) == [home]
+        with raises(ConfigErr):
+            config.select(["other"])
+
+    def test_load_config_errors(self, tmp_path):
+        path = tmp_path / "accounts.toml"
+        path.write_text('[accounts.work]\nserver = "imap.example.com"\nusername = "me"\n', encoding="utf-8")
+
+        with raises(ConfigErr):
+            load_config(str(path))
+        with raises(ConfigErr):
+            load_config(str(tmp_path / "missing.toml"))
+
+
+class TestBatchRunner:
+    def test_retries_transient_errors(self):
+        sleep = Mock()
+        runner, stream = make_runner(retries=3, backoff=0.5, sleep=sleep)
+        errors = iter([ConnectionErr("обрыв"), ConnectionResetError()])
+
+        def flaky(account, emit):
+            emit({"ok": 1})
+            error = next(errors, None)
+            if error:
+                raise error
+
+        failed = runner.run([Account("a", "localhost", "user", "password")], flaky)
+
+        assert failed == 0
+        assert records(stream) == [{"account": "a", "ok": 1}]
+        first, second = (call.args[0] for call in sleep.call_args_list)
+        assert 0.25 <= first <= 0.5 and 0.5 <= second <= 1.0
+
+    def test_streams_and_skips_emitted_records_on_retry(self):
+        runner, stream = make_runner(retries=1, sleep=Mock())
+        attempts = []
+
+        def job(account, emit):
+            attempts.append(len(records(stream)))
+            for uid in (3, 2, 1):
+                emit({"event": "email", "mailbox": "INBOX", "uid": uid})
+                if uid == 2 and len(attempts) == 1:
+                    raise ConnectionErr("обрыв")
+
+        runner.run([Account("a", "localhost", "user", "password")], job)
+
+        assert attempts == [0, 2]
+        assert [record["uid"] for record in records(stream)] == [3, 2, 1]
+
+    def test_reports_errors(self):
+        runner, stream = make_runner(retries=1, sleep=Mock())
+        job = Mock(side_effect=[MailboxErr("нет папки"), ConnectionErr("обрыв"), ConnectionErr("обрыв")])
+
+        failed = runner.run([Account("a", "localhost", "user", "password"),
+                             Account("b", "localhost", "user", "password")], job)
+
+        assert failed == 2
+        assert sorted((record["account"], record["error"], record["attempts"]) for record in records(stream)) == [
+            ("a", "MailboxErr", 1), ("b", "ConnectionErr", 2)]
+
+
+class TestJobs:
+    def test_list_and_sync(self, server, tmp_path):
+        runner, stream = make_runner(parallel=2)
+        state = str(tmp_path / "sync.json")
+
+        failed = runner.run(accounts(server, "a", "b"), list_job(limit=3, page_size=2))
+        for mailboxes in (["INBOX", "Sent"], ["INBOX"]):
+            store = SyncStateStore(state)
+            runner.run(accounts(server, "a"), sync_job(store, mailboxes))
+            store.save()
+            server.load(count=1, seed=7)
+
+        res = records(stream)
+        listed = [record for record in res if record["event"] == "email"]
+        assert failed == 0
+        assert sorted((record["account"], record["uid"]) for record in listed) == [
+            ("a", 3), ("a", 4), ("a", 5), ("b", 3), ("b", 4), ("b", 5)]
+        assert [(record["mailbox"], record["full"], record["new"]) for record in res if record["event"] == "synced"] \
+            == [("INBOX", True, 5), ("Sent", True, 0), ("INBOX", False, 1)]
+        assert [record["uid"] for record in res if record["event"] == "new"][-1] == 6
+        assert SyncStateStore(state).get("a", "INBOX").uids == {1, 2, 3, 4, 5, 6}
+
+    def test_sync_keeps_state_of_synced_mailboxes(self, server):
+        runner, stream = make_runner()
+        store = SyncStateStore()
+
+        failed = runner.run(accounts(server, "a"), sync_job(store, ["INBOX", "Missing"]))
+
+        assert failed == 1
+        assert records(stream)[-1]["error"] == "MailboxErr"
+        assert store.get("a", "INBOX").uids == {1, 2, 3, 4, 5}
+
+    def test_fetch_uid_set(self, server):
+        runner, stream = make_runner()
+
+        runner.run(accounts(server, "a"), fetch_job("2:3,5:100000000", ["INBOX", "Sent"]))
+
+        assert [(record["mailbox"], record["uid"]) for record in records(stream)] == [
+            ("INBOX", 2), ("INBOX", 3), ("INBOX", 5)]
+        assert all(record["body"] for record in records(stream))
+
+    def test_upload(self, server):
+        runner, stream = make_runner()
+        messages = [(f"{index}.eml", raw) for index, raw in enumerate(synthetic_messages(2, seed=3))]
+
+        runner.run(accounts(server, "a"), upload_job(messages, "Sent", "\\Seen"))
+
+        assert [(record["file"], record["uid"]) for record in records(stream)] == [("0.eml", 1), ("1.eml", 2)]
+        assert [message.flags for message in server.mailboxes["Sent"].messages] == [{"\\Seen"}, {"\\Seen"}]
@@ -0,0 +1,33 @@
+from src.bodystructure import parse_bodystructure
+from src.parser import parse
+
+
+class TestBodystructure:
+    def test_parse_multipart(self):
+        value = parse([b'(("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 13 1 NIL NIL NIL NIL)'
+                       b'("APPLICATION" "ZIP" ("NAME" "a.zip") NIL NIL "BASE64" 400 NIL'
+                       b' ("ATTACHMENT" ("FILENAME*" "utf-8\'\'%D1%84%D0%B0%D0%B9%D0%BB.zip")) NIL NIL)'
+                       b' "MIXED" ("BOUNDARY" "b") NIL NIL NIL)'])[0]
+        structure = parse_bodystructure(value)
+
+        assert structure.content_type == "multipart/mixed"
+        assert [part.section for part in structure.walk()] == ["", "1", "2"]
+        text, attachment = structure.children
+        assert text.charset == "utf-8"
+        assert text.lines == 1
+        assert not text.is_attachment
+        assert attachment.is_attachment
+        assert attachment.filename == "файл.zip"
+        assert attachment.encoding == "BASE64"
+        assert attachment.decoded_size == 300
+
+    def test_parse_nested_message(self):
+        value = parse([b'("MESSAGE" "RFC822" NIL NIL NIL "7BIT" 100 ("date" "subject" NIL NIL NIL NIL NIL NIL NIL NIL)'
+                       b' (("TEXT" "PLAIN" NIL NIL NIL "7BIT" 5 1)("IMAGE" "PNG" ("NAME" "=?utf-8?b?0YQucG5n?=")'
+                       b' NIL NIL "BASE64" 8) "MIXED") 4 NIL ("INLINE" NIL) NIL)'])[0]
+        structure = parse_bodystructure(value)
+
+        assert structure.section == "1"
+        assert structure.disposition == "inline"
+        assert [part.section for part in structure.walk()] == ["1", "1", "1.1", "1.2"]
+        assert structure.children[0].children[1].filename == "ф.png"
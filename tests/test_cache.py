@@ -0,0 +1,59 @@
+from src.cache import EmailCache
+from src.email_model import Email
+
+KEY = ("imap.example.com:993", "login", "INBOX", 1)
+
+
+class TestCache:
+    def test_put_get(self, tmp_path):
+        cache = EmailCache(str(tmp_path / "cache.sqlite3"))
+        cache.put(KEY, Email(1, "a@example.com", "Тема", ["Тело"]))
+
+        res = cache.get(KEY, 1)
+
+        assert res.sender == "a@example.com"
+        assert res.description == "Тема"
+        assert res.body == ["Тело"]
+        assert cache.get(KEY, 2) is None
+        assert cache.get(KEY[:3] + (2,), 1) is None
+
+    def test_persistent(self, tmp_path):
+        EmailCache(str(tmp_path / "cache.sqlite3")).put(KEY, Email(1, "a@example.com"))
+
+        assert EmailCache(str(tmp_path / "cache.sqlite3")).get(KEY, 1).sender == "a@example.com"
+
+    def test_brief_entries(self, tmp_path):
+        cache = EmailCache(str(tmp_path / "cache.sqlite3"))
+        cache.put(KEY, Email(1, preview="short"), complete=False)
+
+        assert cache.get(KEY, 1) is None
+        assert cache.get(KEY, 1, complete=False).preview == "short"
+
+        cache.put(KEY, Email(1, body=["full"]))
+        cache.put(KEY, Email(1, preview="short"), complete=False)
+
+        assert cache.get(KEY, 1).body == ["full"]
+
+    def test_uidvalidity_change(self, tmp_path):
+        cache = EmailCache(str(tmp_path / "cache.sqlite3"))
+
+        assert cache.validate(KEY)
+        cache.put(KEY, Email(1))
+        assert cache.validate(KEY)
+        assert cache.get(KEY, 1) is not None
+
+        assert not cache.validate(KEY[:3] + (2,))
+        assert cache.get(KEY, 1) is None
+        assert cache.size == 0
+
+    def test_lru_eviction(self, tmp_path):
+        cache = EmailCache(str(tmp_path / "cache.sqlite3"), max_size=1300)
+        for uid in range(1, 4):
+            cache.put(KEY, Email(uid, body=["x" * 300]))
+        cache.get(KEY, 1)
+        cache.put(KEY, Email(4, body=["x" * 300]))
+
+        assert cache.get(KEY, 1) is not None
+        assert cache.get(KEY, 2) is None
+        assert cache.get(KEY, 4) is not None
+        assert cache.size <= 1300
@@ -1,4 +1,11 @@
+import email
+import io
+from src.email_model import Email
 from src.client import IMAPClient, ConnectionErr, LoginErr, MailboxErr
+from src.cache import EmailCache
+from src.query import Query
+from src.search_index import SearchIndex
+from tests.fake_server import FakeIMAPServer
 from pytest import raises
 from unittest.mock import Mock
 
@@ -58,6 +65,22 @@ class TestClient:
             client.connect("", 993, 2)
         with raises(Exception):
             client.connect_ssl("", 993, 2)
+        with raises(Exception):
+            client.connect_plain("", 143, 2)
+
+    def test_connect_uses_tls(self, monkeypatch):
+        imap4, imap4_ssl = Mock(), Mock()
+        imap4_ssl.return_value.capabilities = ("IMAP4REV1",)
+        imap4.return_value.capabilities = ("IMAP4REV1",)
+        monkeypatch.setattr("src.client.IMAP4", imap4)
+        monkeypatch.setattr("src.client.IMAP4SSL", imap4_ssl)
+        client = IMAPClient()
+
+        client.connect("imap.example.com")
+        client.connect_plain("imap.example.com")
+
+        assert imap4_ssl.call_args.args == ("imap.example.com", 993)
+        assert imap4.call_args.args == ("imap.example.com", 143)
 
     def test_list_mailboxes(self):
         client = IMAPClient()
@@ -69,6 +92,8 @@ class TestClient:
 
         client._connection.list.return_value = ("NO", [])
 
+        assert list(client.list_mailboxes()) == ["2", "3"]
+        client.invalidate_mailboxes()
         assert client.list_mailboxes() is None
 
     def test_select_mailbox(self):
@@ -76,6 +101,7 @@ class TestClient:
         client._logged_in = True
         client._connection = Mock()
         client._connection.select.return_value = ("OK", "")
+        client._connection.response.return_value = ("UIDVALIDITY", [b"1"])
 
         assert client.select_mailbox("1") == ("OK", "")
         assert client._mailbox_selected
@@ -91,17 +117,18 @@ class TestClient:
         client._logged_in = True
         client._mailbox_selected = True
         client._connection = Mock()
-        client._connection.fetch.return_value = ("NO", [])
+        client._connection.uid.return_value = ("NO", [])
 
         assert client.read_email(0) is None
 
-        client._connection.fetch.return_value = ("OK", [(b"Bad", b"Content-Type: multipart\nGood")])
+        client._connection.uid.return_value = ("OK", [(b"Bad", b"Content-Type: multipart\nGood")])
         res = client.read_email(0)
 
         assert res is not None
         assert res.body == ["Good"]
+        client._connection.uid.assert_called_with("FETCH", "0", "(RFC822)")
 
-        client._connection.fetch.return_value = ("OK", [(b"Bad", b"Content-Type: text/html\nGood")])
+        client._connection.uid.return_value = ("OK", [(b"Bad", b"Content-Type: text/html\nGood")])
         res = client.read_email(0)
 
         assert res is not None
@@ -138,8 +165,403 @@ class TestClient:
         client._mailbox_selected = True
         client._connection = Mock()
         msg_mock = Mock()
-        client._connection.fetch.return_value = ("NO", msg_mock)
+        client._connection.uid.return_value = ("NO", msg_mock)
 
         assert client.download_attachments("", "") is None
 
         msg_mock.assert_not_called()
+
+    def test_list_emails_headers_only(self):
+        client = IMAPClient()
+        client._logged_in = True
+        client._mailbox_selected = True
+        client._connection = Mock()
+        client._connection.capabilities = ()
+        client._connection.uid.side_effect = [("OK", [b"1 2 3"]), ("OK", [
+            (b"3 (UID 3 RFC822.SIZE 120 BODY[HEADER.FIELDS (FROM SUBJECT DATE)] {44}",
+             b"From: A <a@example.com>\r\nSubject: Third\r\n\r\n"),
+            (b" BODY[TEXT]<0> {11}", b"Hello world"),
+            b")",
+            (b"1 (UID 1 FLAGS (\\Seen \\Flagged) RFC822.SIZE 80 BODY[HEADER.FIELDS (FROM SUBJECT DATE)] {18}",
+             b"Subject: First\r\n\r\n"),
+            (b" BODY[TEXT]<0> {3}", b"Hi!"),
+            b")",
+        ])]
+
+        res = list(client.list_emails(headers_only=True))
+
+        assert client._connection.uid.call_count == 2
+        assert client._connection.uid.call_args[0][:2] == ("FETCH", "1:3")
+        assert [email.id for email in res] == [3, 1]
+        assert res[0].sender == "a@example.com"
+        assert res[0].description == "Third"
+        assert res[0].size == 120
+        assert res[0].preview == "Hello world"
+        assert res[0].body == []
+        assert res[1].preview == "Hi!"
+        assert (res[0].flags, res[1].flags) == ((), ("\\Seen", "\\Flagged"))
+
+    def test_read_email_cached(self, tmp_path):
+        cache = EmailCache(str(tmp_path / "cache.sqlite3"))
+        client = IMAPClient(cache)
+        client._logged_in = True
+        client._login = "login"
+        client._connection = Mock()
+        client._connection.select.return_value = ("OK", [b"1"])
+        client._connection.response.return_value = ("UIDVALIDITY", [b"7"])
+        client._connection.uid.return_value = ("OK", [(b"5 (UID 5 RFC822", b"Subject: Cached\n\nBody")])
+        client.select_mailbox("INBOX")
+
+        assert client.read_email(5).description == "Cached"
+        assert client.read_email(5).body == ["Body"]
+        client._connection.uid.assert_called_once()
+        assert client.read_email(5).raw is None
+        assert bytes(IMAPClient._create_email_from_bytes(5, [(b"5 (RFC822", b"Subject: Raw\n\n")], True).raw) == (
+            b"Subject: Raw\n\n")
+
+        client._connection.response.return_value = ("UIDVALIDITY", [b"8"])
+        client.select_mailbox("INBOX")
+
+        assert client.read_email(5).description == "Cached"
+        assert client._connection.uid.call_count == 2
+
+    def test_sync_mailbox_fallback(self):
+        client = IMAPClient()
+        client._logged_in = True
+        client._connection = Mock()
+        client._connection.capabilities = ("IMAP4REV1",)
+        client._connection.select.return_value = ("OK", [b"3"])
+        client._connection.response.side_effect = lambda name: (name, [{"UIDVALIDITY": b"1"}.get(name)])
+        client._connection.uid.side_effect = [("OK", [b"1 2 3"]), ("OK", [
+            b"1 (UID 1 RFC822.SIZE 1)", b"2 (UID 2 RFC822.SIZE 1)", b"3 (UID 3 RFC822.SIZE 1)",
+        ])]
+
+        res = client.sync_mailbox("INBOX")
+
+        assert res.full
+        assert [email.id for email in res.new] == [1, 2, 3]
+
+        client._connection.uid.side_effect = [("OK", [b"1 3 4"]), ("OK", [b"3 (UID 4 RFC822.SIZE 1)"])]
+        res = client.sync_mailbox("INBOX")
+
+        assert not res.full
+        assert [email.id for email in res.new] == [4]
+        assert res.vanished == [2]
+        client._connection.enable.assert_not_called()
+
+        state = client.sync_state("INBOX")
+        client._sync_states.clear()
+        client._connection.uid.side_effect = [("OK", [b"1 4"])]
+        res = client.sync_mailbox("INBOX", state=state)
+
+        assert (res.full, res.new, res.vanished) == (False, [], [3])
+        assert client.sync_state("INBOX").uids == {1, 4}
+
+    def test_sync_mailbox_qresync(self):
+        client = IMAPClient()
+        client._logged_in = True
+        client._connection = Mock()
+        client._connection.state = "AUTH"
+        client._connection.capabilities = ("IMAP4REV1", "ENABLE", "CONDSTORE", "QRESYNC")
+        client._connection.enable.return_value = ("OK", [b"QRESYNC"])
+        client._connection.select.return_value = ("OK", [b"2"])
+        codes = {"UIDVALIDITY": b"1", "UIDNEXT": b"3", "HIGHESTMODSEQ": b"10"}
+        client._connection.response.side_effect = lambda name: (name, [codes.get(name)])
+        client._connection.uid.side_effect = [("OK", [b"1 2"]), ("OK", [
+            b"1 (UID 1 RFC822.SIZE 1)", b"2 (UID 2 RFC822.SIZE 1)",
+        ])]
+        client.sync_mailbox("INBOX")
+
+        client._connection.enable.assert_called_once_with("QRESYNC")
+
+        codes = {"UIDVALIDITY": b"1", "UIDNEXT": b"4", "HIGHESTMODSEQ": b"12", "VANISHED": b"(EARLIER) 2"}
+        client._connection.uid.side_effect = [
+            ("OK", [b"2 (FLAGS (\\Flagged))", b"1 (UID 1 FLAGS (\\Seen) MODSEQ (11))"]),
+            ("OK", [b"3"]),
+            ("OK", [b"2 (UID 3 RFC822.SIZE 1)"]),
+        ]
+        res = client.sync_mailbox("INBOX")
+
+        assert client._connection.uid.call_args_list[-3][0] == (
+            "FETCH", "1:2", "(UID FLAGS)", "(CHANGEDSINCE 10 VANISHED)"
+        )
+        assert res.changed == {1: ["\\Seen"]}
+        assert res.vanished == [2]
+        assert [email.id for email in res.new] == [3]
+        assert client._sync_states["INBOX"].uids == {1, 3}
+
+    def test_stream_attachments(self, tmp_path):
+        client = IMAPClient()
+        client._logged_in = True
+        client._mailbox_selected = True
+        client._connection = Mock()
+        client._connection.uid.return_value = ("OK", [
+            b'7 (UID 7 BODYSTRUCTURE (("TEXT" "PLAIN" NIL NIL NIL "7BIT" 2 1 NIL NIL NIL NIL)'
+            b'("TEXT" "PLAIN" NIL NIL NIL "7BIT" 4 1 NIL ("ATTACHMENT" ("FILENAME" "a.txt")) NIL NIL)'
+            b'("IMAGE" "PNG" NIL NIL NIL "BASE64" 20 NIL ("ATTACHMENT" ("FILENAME" "../b.png")) NIL NIL) "MIXED"))'
+        ])
+        stream = io.BytesIO(b"".join(
+            b"* 7 FETCH (UID 7 BODY[3]<%d> {%d}\r\n%s)\r\nZ%04d OK done\r\n" % (offset, len(chunk), chunk, tag)
+            for tag, (offset, chunk) in enumerate([(0, b"SGVsbG8s"), (8, b"IHN0cmVh"), (16, b"bSE=")], 1)
+        ))
+        client._connection.readline = stream.readline
+        client._connection.read = stream.read
+
+        res = client.stream_attachments(7, str(tmp_path), content_types=["image/*"], chunk_size=8)
+
+        assert res == [str(tmp_path / "b.png")]
+        assert (tmp_path / "b.png").read_bytes() == b"Hello, stream!"
+        sent = b"".join(call[0][0] for call in client._connection.send.call_args_list)
+        assert b"BODY.PEEK[3]<16.8>" in sent
+        assert IMAPClient._select_attachments(client.fetch_bodystructure(7), names=["*.txt"])[0].section == "2"
+
+        stream = io.BytesIO(b"* 7 FETCH (UID 7 BODY[3]<0> {8}\r\nSGVsbG8s)\r\nZ0001 OK done\r\n"
+                            b"Z0002 NO failed\r\nZ0003 NO failed\r\n")
+        client._connection.readline = stream.readline
+        client._connection.read = stream.read
+
+        with raises(MailboxErr):
+            client.stream_attachments(7, str(tmp_path), content_types=["image/*"], chunk_size=8)
+        assert not (tmp_path / "b.png").exists()
+
+    def test_list_emails_lazy_parts(self):
+        client = IMAPClient()
+        client._logged_in = True
+        client._mailbox_selected = True
+        client._selected_mailbox = "INBOX"
+        client._connection = Mock()
+        client._connection.capabilities = ()
+        client._connection.uid.side_effect = [("OK", [b"4"]), ("OK", [
+            (b'4 (UID 4 BODYSTRUCTURE ("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "BASE64" 8 1)'
+             b' BODY[HEADER.FIELDS (SUBJECT)] {16}', b"Subject: Lazy\r\n"),
+            (b" BODY[TEXT]<0> {8}", b"0YLQtdC6"),
+            b")",
+        ])]
+        stream = io.BytesIO(b"* 1 FETCH (UID 4 BODY[1]<0> {8}\r\n0YLQtdC6)\r\nZ0001 OK done\r\n")
+        client._connection.readline = stream.readline
+        client._connection.read = stream.read
+
+        res = list(client.list_emails(headers_only=True))[0]
+
+        assert "BODYSTRUCTURE" in client._connection.uid.call_args[0][2]
+        assert not res.parts[0].is_loaded
+        client._connection.send.assert_not_called()
+        assert res.body == ["тек"]
+        assert b"BODY.PEEK[1]<0.1048576>" in client._connection.send.call_args[0][0]
+
+    def test_upload_emails(self):
+        client = IMAPClient()
+        client._logged_in = True
+        client._connection = Mock()
+        client._connection.capabilities = ("IMAP4REV1", "MULTIAPPEND", "LITERAL+", "UIDPLUS")
+        stream = io.BytesIO(b"Z0001 OK [APPENDUID 9 4:5] done\r\nZ0002 NO [OVERQUOTA] failed\r\n")
+        client._connection.readline = stream.readline
+        client._connection.read = stream.read
+
+        res = client.upload_emails([b"A\nB", b"C", b"D"], "Отправленные", batch_size=2)
+
+        assert res == [(9, 4), (9, 5), None]
+        sent = client._connection.send.call_args[0][0]
+        assert sent.startswith(b'Z0001 APPEND "&BB4EQgQ,BEAEMAQyBDsENQQ9BD0ESwQ1-" "')
+        assert b"{4+}\r\nA\r\nB " in sent
+        assert b"Z0002 APPEND" in sent
+
+    def test_search_esearch(self):
+        client = IMAPClient()
+        client._logged_in = True
+        client._mailbox_selected = True
+        client._connection = Mock()
+        client._connection.capabilities = ("IMAP4REV1", "ESEARCH")
+        client._connection.uid.return_value = ("OK", [None])
+        client._connection.response.return_value = ("ESEARCH", [b'(TAG "A5") UID MIN 2 MAX 9 COUNT 4 ALL 2:4,9'])
+
+        res = client.search(Query().seen(False))
+
+        client._connection.uid.assert_called_once_with("SEARCH", "RETURN (MIN MAX COUNT ALL)", "UNSEEN")
+        assert (res.uids, res.count, res.min, res.max) == ([2, 3, 4, 9], 4, 2, 9)
+
+    def test_search_charset(self):
+        client = IMAPClient()
+        client._logged_in = True
+        client._mailbox_selected = True
+        client._connection = Mock()
+        client._connection.capabilities = ("IMAP4REV1", "LITERAL+")
+        stream = io.BytesIO(b"* SEARCH 3 7\r\nZ0001 OK done\r\n")
+        client._connection.readline = stream.readline
+        client._connection.read = stream.read
+
+        res = client.search(Query().subject("Тема").larger(10))
+
+        assert res.uids == [3, 7]
+        assert client._connection.send.call_args[0][0] == (
+            b"Z0001 UID SEARCH CHARSET UTF-8 SUBJECT {8+}\r\n" + "Тема".encode("utf-8") + b" LARGER 10\r\n"
+        )
+
+    def test_mailbox_tree(self):
+        client = IMAPClient()
+        client._logged_in = True
+        client._connection = Mock()
+        client._connection.capabilities = ("IMAP4REV1", "LIST-STATUS", "SPECIAL-USE")
+        client._connection._simple_command.return_value = ("OK", [None])
+        client._connection._untagged_response.return_value = (
+            "OK", [b'(\\HasNoChildren) "/" "INBOX"', b'(\\Trash) "/" "Trash"'],
+        )
+        client._connection.response.return_value = ("STATUS", [b'"INBOX" (MESSAGES 4 UNSEEN 1 UIDNEXT 9)'])
+
+        tree = client.mailbox_tree()
+
+        assert client.mailbox_tree() is tree
+        assert tree.by_role("trash").name == "Trash"
+        assert (tree["INBOX"].messages, tree["INBOX"].unseen, tree["INBOX"].uidnext) == (4, 1, 9)
+        client._connection._simple_command.assert_called_once_with(
+            "LIST", '""', '"*"', "RETURN", "(SPECIAL-USE STATUS (MESSAGES UNSEEN UIDNEXT))"
+        )
+
+    def test_mailbox_tree_pipelined_status(self):
+        client = IMAPClient()
+        client._logged_in = True
+        client._connection = Mock()
+        client._connection.capabilities = ("IMAP4REV1",)
+        client._connection.list.return_value = ("OK", [b'() "/" "INBOX"', b'() "/" "&BCEEPwQwBDw-"'])
+        stream = io.BytesIO(
+            b'* STATUS "INBOX" (MESSAGES 2 UNSEEN 0 UIDNEXT 3)\r\n* STATUS "&BCEEPwQwBDw-" (MESSAGES 7)\r\n'
+            b"Z0001 OK done\r\nZ0002 OK done\r\n"
+        )
+        client._connection.readline = stream.readline
+        client._connection.read = stream.read
+
+        tree = client.mailbox_tree()
+
+        assert [(node.name, node.messages) for node in tree] == [("INBOX", 2), ("Спам", 7)]
+        assert client._connection.send.call_args[0][0] == (
+            b'Z0001 STATUS "INBOX" (MESSAGES UNSEEN UIDNEXT)\r\n'
+            b'Z0002 STATUS "&BCEEPwQwBDw-" (MESSAGES UNSEEN UIDNEXT)\r\n'
+        )
+
+    def test_sort_and_thread(self):
+        client = IMAPClient()
+        client._logged_in = True
+        client._mailbox_selected = True
+        client._connection = Mock()
+        client._connection.capabilities = ("IMAP4REV1", "SORT", "THREAD=REFERENCES")
+        client._connection.uid.side_effect = [("OK", [b"5 3 4 1"]), ("OK", [b"(1)(2 (3)(4 5))"])]
+
+        assert client.sort(["REVERSE", "date"], offset=1, limit=2) == [3, 4]
+        assert client.thread() == [[1], [2, [3], [4, 5]]]
+        assert client._connection.uid.call_args_list[0][0] == ("SORT", "(REVERSE DATE)", "US-ASCII", "ALL")
+        with raises(MailboxErr):
+            client.thread("ORDEREDSUBJECT")
+
+    def test_search_local(self, tmp_path):
+        client = IMAPClient(index=SearchIndex(str(tmp_path / "index.sqlite3")))
+        client._logged_in = True
+        client._login = "login"
+        client._connection = Mock()
+        client._connection.select.return_value = ("OK", [b"1"])
+        client._connection.response.return_value = ("UIDVALIDITY", [b"7"])
+        client._connection.uid.return_value = ("OK", [(b"5 (UID 5 RFC822", b"From: a@example.com\nSubject: Invoice\n\nPay soon")])
+        client.select_mailbox("INBOX")
+        client.read_email(5)
+
+        assert [(hit.mailbox, hit.uid) for hit in client.search_local("invoice")] == [("INBOX", 5)]
+
+        client._connection.response.return_value = ("UIDVALIDITY", [b"8"])
+        client.select_mailbox("INBOX")
+
+        assert client.search_local("invoice") == []
+        with raises(MailboxErr):
+            IMAPClient().search_local("invoice")
+
+    def test_multi_chunk_encoded_headers(self):
+        msg = email.message_from_bytes(b"From: =?utf-8?b?0JjQstCw0L0=?= <ivan@example.com>\r\n"
+                                       b"Subject: =?koi8-r?b?8NLJ18XU?= and =?utf-8?q?=D0=BC=D0=B8=D1=80?=\r\n\r\n")
+
+        assert IMAPClient._get_sender(msg) == "ivan@example.com"
+        assert IMAPClient._get_decoded_email_part(msg, "From") == "Иван <ivan@example.com>"
+        assert IMAPClient._get_decoded_email_part(msg, "Subject") == "Привет and мир"
+
+    def test_abort(self):
+        client = IMAPClient()
+        client._logged_in = True
+        connection = client._connection = Mock()
+        connection.shutdown.side_effect = OSError("closed")
+
+        client.abort()
+
+        connection.shutdown.assert_called_once()
+        connection.logout.assert_not_called()
+        with raises(ConnectionErr):
+            client.noop()
+
+    def test_full_emails_preview_size(self):
+        email = Email(1, body=["Hello world"])
+
+        assert IMAPClient._with_preview(email, 5).preview == "Hello"
+        assert IMAPClient._with_preview(email, 256).preview == "Hello world"
+        assert IMAPClient._with_preview(None, 5) is None
+
+    def test_index_cached_emails(self, tmp_path):
+        cache = EmailCache(str(tmp_path / "cache.sqlite3"))
+        client = IMAPClient(cache)
+        client._logged_in = True
+        client._login = "login"
+        client._connection = Mock()
+        client._connection.select.return_value = ("OK", [b"1"])
+        client._connection.response.return_value = ("UIDVALIDITY", [b"7"])
+        client._connection.uid.return_value = ("OK", [(b"5 (UID 5 RFC822", b"Subject: Invoice\n\nPay soon")])
+        client.select_mailbox("INBOX")
+        client.read_email(5)
+        client._index = SearchIndex(str(tmp_path / "index.sqlite3"))
+
+        assert client.read_email(5).description == "Invoice"
+        assert [hit.uid for hit in client.search_local("invoice")] == [5]
+        client._connection.uid.assert_called_once()
+
+    def test_list_emails_skips_unsolicited_fetch(self):
+        client = IMAPClient()
+        client._logged_in = True
+        client._mailbox_selected = True
+        client._connection = Mock()
+        client._connection.capabilities = ()
+        client._connection.uid.side_effect = [("OK", [b"1 2"]), ("OK", [
+            b"2 (FLAGS (\\Seen))",
+            b"5 (UID 5 FLAGS ())",
+            (b"2 (UID 2 RFC822.SIZE 10 BODY[HEADER.FIELDS (SUBJECT)] {16}", b"Subject: Two\r\n\r\n"),
+            b")",
+            b"1 (UID 1 RFC822.SIZE 10)",
+        ])]
+
+        res = list(client.list_emails(headers_only=True))
+
+        assert [(email.id, email.description) for email in res] == [(2, "Two"), (1, None)]
+
+    def test_lazy_parts_keep_selection(self):
+        with FakeIMAPServer() as server:
+            server.load(count=2)
+            server.add_mailbox("Other")
+            client = IMAPClient()
+            client.connect_plain("127.0.0.1", server.port)
+            client.login("user", "password")
+            client.select_mailbox("INBOX")
+            first, second = client.list_emails(headers_only=True)
+            client.select_mailbox("Other")
+
+            assert first.body
+            assert client._selected_mailbox == "Other"
+
+            server.mailboxes["INBOX"].uidvalidity = 2
+            with raises(MailboxErr):
+                second.body
+            assert client._selected_mailbox == "Other"
+            client.close()
+
+    def test_select_mailbox_with_space(self):
+        with FakeIMAPServer() as server:
+            server.load("Sent Items", count=2)
+            client = IMAPClient()
+            client.connect_plain("127.0.0.1", server.port)
+            client.login("user", "password")
+
+            assert client.select_mailbox("Sent Items")[0] == "OK"
+            assert [email.id for email in client.list_emails(headers_only=True)] == [2, 1]
+            client.close()
@@ -0,0 +1,34 @@
+import time
+from pytest import raises
+from src.client import IMAPClient
+from src.decode_pool import DecodePool
+
+
+def slow_square(value: int, delay: float) -> int:
+    time.sleep(delay)
+    return value * value
+
+
+class TestDecodePool:
+    def test_order(self):
+        for kind in ("thread", "process"):
+            with DecodePool(3, kind, window=4) as pool:
+                items = [(value, 0.02 if value % 3 == 0 else 0) for value in range(10)]
+
+                assert list(pool.starmap(slow_square, items)) == [value * value for value in range(10)]
+
+    def test_decode_emails(self):
+        raw = b"From: A <a@example.com>\r\nSubject: Hi\r\nContent-Type: text/html\r\n\r\n<p>Hello <b>there</b></p>"
+        fetched = [(1, [(b"1 (UID 1 RFC822 {%d}" % len(raw), raw), b")"]), (2, None)]
+
+        with DecodePool(2, "process") as pool:
+            emails = list(pool.starmap(IMAPClient._create_email_from_bytes, fetched))
+
+        assert [(email.id, email.sender, email.description, email.body) for email in emails[:1]] == [
+            (1, "a@example.com", "Hi", ["Hello there"]),
+        ]
+        assert emails[1] is None
+
+    def test_unknown_kind(self):
+        with raises(ValueError):
+            DecodePool(kind="fiber")
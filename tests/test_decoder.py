@@ -1,4 +1,8 @@
-from src.decoder import imaputf7decode, imaputf7encode
+import base64
+import quopri
+import random
+from pytest import raises
+from src.decoder import imaputf7decode, imaputf7encode, stream_decoder, html_to_text
 
 
 class TestDecoder:
@@ -19,3 +23,43 @@ class TestDecoder:
         assert "&BB8EPgQ8BDUERwQ1BD0EPQRLBDU-" == imaputf7encode("Помеченные")
         assert "&BCEEPwQwBDw-" == imaputf7encode("Спам")
         assert "&BCcENQRABD0EPgQyBDgEOgQ4-" == imaputf7encode("Черновики")
+
+    def test_imaputf7_codec(self):
+        encoded = b"&BB4EQgQ,BEAEMAQyBDsENQQ9BD0ESwQ1-/&BCAEMAQxBD4EQgQw- &- Co"
+
+        assert "Отправленные/Работа & Co".encode("imap4-utf-7") == encoded
+        assert encoded.decode("imap4_utf_7") == "Отправленные/Работа & Co"
+        with raises(UnicodeDecodeError):
+            b"&BB4EQg".decode("imap4-utf-7")
+
+    def test_imaputf7_round_trip(self):
+        rng = random.Random(3501)
+        alphabet = "abc &-/,+\x7f\t" + "".join(map(chr, range(0x400, 0x450))) + "\u20ac\U0001f4e7\u65e5"
+        for _ in range(2000):
+            value = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+            encoded = value.encode("imap4-utf-7")
+            assert all(0x20 <= byte <= 0x7e for byte in encoded)
+            assert encoded.decode("imap4-utf-7") == value
+            assert imaputf7decode(imaputf7encode(value)) == value
+
+    def test_stream_decoder(self):
+        data = bytes(range(256)) * 20
+        encoded = {
+            "base64": base64.encodebytes(data),
+            "quoted-printable": quopri.encodestring(data),
+            "7bit": data,
+        }
+        for encoding, value in encoded.items():
+            for size in (1, 7, 76, 1000):
+                decoder = stream_decoder(encoding)
+                chunks = [decoder.feed(value[i:i + size]) for i in range(0, len(value), size)]
+                assert b"".join(chunks) + decoder.flush() == data
+
+    def test_html_to_text(self):
+        html = ("<html><head><title>Hi</title><style>p {color: red}</style></head><body><!-- note -->"
+                "<script>if (a < b) {}</script><p>Tom &amp; Jerry&nbsp;&#x41;</p><![CDATA[raw]]><br>end</body></html>")
+
+        assert html_to_text(html) == "HiTom & Jerry\xa0Arawend"
+        assert html_to_text(html) == html_to_text(html, backend="bs4")
+        assert html_to_text("<p>" + "word " * 1000 + "</p><p>tail</p>", limit=10) == "word " * 1000
+        assert html_to_text("<div>a</div><div>bc</div><div>d</div>", limit=3) == "abc"
@@ -0,0 +1,87 @@
+import json
+import pickle
+import threading
+from src.bodystructure import BodyPart
+from src.email_model import Email, PartNotLoadedErr
+from pytest import raises
+from unittest.mock import Mock
+
+
+def make_structure() -> BodyPart:
+    return BodyPart("", "multipart/mixed", children=[
+        BodyPart("1", "text/plain", {"charset": "koi8-r"}),
+        BodyPart("2", "text/html"),
+        BodyPart("3", "application/pdf", disposition="attachment", disposition_params={"filename": "a.pdf"}),
+    ])
+
+
+class TestEmail:
+    def test_lazy_parts(self):
+        email = Email(1, structure=make_structure())
+        contents = {"1": "Привет".encode("koi8-r"), "2": b"<p>Hello</p>"}
+        loader = Mock(side_effect=lambda part: contents[part.section])
+
+        assert email.body == []
+        assert [part.section for part in email.parts] == ["1", "2", "3"]
+        with raises(PartNotLoadedErr):
+            email.parts[0].content
+
+        email.set_loader(loader)
+        assert email.parts[1].text == "Hello"
+        assert loader.call_count == 1
+        assert email.body == ["Привет", "Hello", "a.pdf"]
+        assert email.parts[2].text is None
+        assert loader.call_count == 2
+
+    def test_dict_round_trip(self):
+        email = Email.from_dict(Email(1, "a@example.com", structure=make_structure()).to_dict())
+
+        assert email.to_dict()["body"] is None
+        assert email.structure.to_dict() == make_structure().to_dict()
+        assert Email.from_dict(Email(2, body=["text"]).to_dict()).body == ["text"]
+
+    def test_lazy_preview(self):
+        email = Email(1, body=["Hello\r\n   world", "<attachment>"])
+
+        assert email.preview == "Hello world <attachment>"
+        email.body = ["changed"]
+        assert email.preview == "Hello world <attachment>"
+        assert Email(2, preview="short").preview == "short"
+        assert Email(3, structure=make_structure()).preview == ""
+        assert len(Email(4, body=["x" * 1000]).preview) == 256
+        assert Email(5, body=["Hello world"]).make_preview(5) == "Hello"
+
+    def test_compact_json(self):
+        email = Email(7, "a@example.com", "Тема", date="Mon, 1 Jan 2024", size=10, preview="p",
+                      flags=["\\Seen"], structure=make_structure(), raw=b"raw")
+
+        data = email.to_json()
+        restored = Email.from_json(data)
+
+        assert b'"body"' not in data and b"raw" not in data and "Тема".encode("utf-8") in data
+        assert (restored.uid, restored.flags, restored.preview, restored.raw) == (7, ("\\Seen",), "p", None)
+        assert restored.structure.to_dict() == make_structure().to_dict()
+        assert Email.from_json(Email(8).to_json()).body == []
+        assert Email.from_json(json.dumps(Email(9, body=["old"]).to_dict())).flags == ()
+
+    def test_slots_and_raw(self):
+        email = Email(1, body=["text"], raw=b"Subject: Hi\r\n\r\ntext")
+
+        with raises(AttributeError):
+            email.extra = 1
+        assert isinstance(email.raw, memoryview)
+        restored = pickle.loads(pickle.dumps(email))
+        assert bytes(restored.raw) == b"Subject: Hi\r\n\r\ntext"
+        assert restored.body == ["text"]
+
+    def test_pickle_drops_loader(self):
+        lock = threading.Lock()
+        email = Email(1, structure=make_structure())
+        email.set_loader(lambda part: lock and b"")
+        email.parts[0]._content = b"loaded"
+
+        restored = pickle.loads(pickle.dumps(email))
+
+        assert restored._loader is None
+        assert [part.loader for part in restored.parts] == [None] * len(email.parts)
+        assert restored.parts[0].content == b"loaded"
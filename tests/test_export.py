@@ -0,0 +1,76 @@
+import mailbox
+from contextlib import contextmanager
+from unittest.mock import Mock
+from pytest import raises
+from src.pool import IMAPConnectionPool
+from src.query import SearchResult
+from src.export import export_mailbox, ExportErr
+from tests.fake_server import FakeIMAPServer
+
+
+def make_raw(uid: int) -> bytes:
+    return f"Subject: Message {uid}\r\n\r\nFrom the body {uid}\r\n".encode("ascii")
+
+
+def fake_pool(uids: list[int], uidvalidity: int = 1) -> Mock:
+    client = Mock()
+    client.uidvalidity = uidvalidity
+    client.search.return_value = SearchResult(uids)
+    client.fetch_many.side_effect = lambda ids, items: [(uid, [
+        (b'%d (UID %d FLAGS (%s) INTERNALDATE "01-Jan-2024 00:00:00 +0000" BODY[] {%d}'
+         % (uid, uid, b"\\Seen" if uid % 2 else b"", len(make_raw(uid))), make_raw(uid)),
+        b")",
+    ]) for uid in ids]
+
+    @contextmanager
+    def connection(username=None, mailbox=None):
+        yield client
+
+    pool = Mock()
+    pool.max_connections = 2
+    pool.connection = connection
+    return pool
+
+
+class TestExport:
+    def test_export_mbox_resume(self, tmp_path):
+        dest = str(tmp_path / "inbox.mbox")
+
+        stats = export_mailbox(fake_pool([1, 2, 3]), "INBOX", dest, batch_size=2)
+
+        assert stats.messages == 3
+        assert stats.bytes == sum(len(make_raw(uid)) for uid in (1, 2, 3))
+        assert [message["Subject"] for message in mailbox.mbox(dest)] == ["Message 1", "Message 2", "Message 3"]
+        assert mailbox.mbox(dest)[0].get_payload() == ">From the body 1\n"
+
+        stats = export_mailbox(fake_pool([1, 2, 3, 5]), "INBOX", dest)
+
+        assert (stats.skipped, stats.messages, stats.last_uid) == (3, 1, 5)
+        assert [message["Subject"] for message in mailbox.mbox(dest)][-1] == "Message 5"
+        with raises(ExportErr):
+            export_mailbox(fake_pool([1], uidvalidity=2), "INBOX", dest)
+
+    def test_export_maildir(self, tmp_path):
+        dest = str(tmp_path / "inbox")
+
+        export_mailbox(fake_pool([1, 2]), "INBOX", dest, format="maildir")
+
+        maildir = mailbox.Maildir(dest)
+        messages = sorted(maildir, key=lambda message: message["Subject"])
+        assert [message.get_flags() for message in messages] == ["S", ""]
+        assert [message.get_subdir() for message in messages] == ["cur", "new"]
+
+    def test_skips_unsolicited_fetch(self, tmp_path):
+        dest = str(tmp_path / "inbox.mbox")
+        with FakeIMAPServer() as server:
+            server.load(count=3)
+            server.unsolicited["FETCH"] = ["* 3 FETCH (FLAGS (\\Seen))"]
+            pool = IMAPConnectionPool("127.0.0.1", server.port, use_ssl=False, max_connections=1)
+            pool.add_account("user", "password")
+
+            stats = export_mailbox(pool, "INBOX", dest, workers=1)
+            pool.close()
+
+        assert (stats.messages, stats.last_uid) == (3, 3)
+        assert [message["Subject"] for message in mailbox.mbox(dest)] == [
+            message.parsed["Subject"] for message in server.mailboxes["INBOX"].messages]
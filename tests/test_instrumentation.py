@@ -0,0 +1,77 @@
+from src.client import IMAPClient
+from src.instrumentation import (CommandEvent, Instrumentation, Observer, OpenMetricsExporter, StatsCollector,
+                                 instrumentation, timed)
+from tests.fake_server import FakeIMAPServer
+
+
+class Recorder(Observer):
+    def __init__(self) -> None:
+        self.commands = []
+        self.stages = []
+
+    def on_command(self, event: CommandEvent) -> None:
+        self.commands.append(event)
+
+    def on_stage(self, stage: str, elapsed: float) -> None:
+        self.stages.append(stage)
+
+
+class TestInstrumentation:
+    def test_timed_reentrant(self):
+        recorder = Recorder()
+
+        @timed("walk")
+        def walk(depth: int) -> int:
+            return depth if depth == 0 else walk(depth - 1) + 1
+
+        assert walk(3) == 3
+        instrumentation.subscribe(recorder)
+        try:
+            assert walk(3) == 3
+        finally:
+            instrumentation.unsubscribe(recorder)
+        assert recorder.stages == ["walk"]
+        assert not instrumentation.enabled
+
+    def test_collector_and_exporter(self):
+        collector = StatsCollector()
+        hub = Instrumentation()
+        hub.subscribe(collector)
+        hub.command(CommandEvent("A1", "UID FETCH", 0.002, 30, 900, "OK"))
+        hub.command(CommandEvent("A2", "UID FETCH", 0.2, 30, 100, "NO"))
+        hub.stage("decode", 0.5)
+
+        text = OpenMetricsExporter(collector).render()
+
+        assert collector.commands["UID FETCH"].errors == 1
+        assert 'imap_command_duration_seconds_bucket{command="UID FETCH",le="0.0025"} 1' in text
+        assert 'imap_command_duration_seconds_bucket{command="UID FETCH",le="+Inf"} 2' in text
+        assert 'imap_received_bytes_total{command="UID FETCH"} 1000' in text
+        assert 'imap_stage_duration_seconds_total{stage="decode"} 0.5' in text
+        assert text.endswith("# EOF\n")
+        assert "UID FETCH" in collector.summary()
+
+    def test_client_commands(self):
+        recorder = instrumentation.subscribe(Recorder())
+        try:
+            with FakeIMAPServer() as server:
+                server.load(count=3)
+                client = IMAPClient()
+                client.connect_plain("127.0.0.1", server.port)
+                client.login("user", "password")
+                client.select_mailbox("INBOX")
+                sent = client._connection.bytes_sent
+                emails = list(client.fetch_emails([1, 2, 3]))
+                sent = client._connection.bytes_sent - sent
+                client.close()
+        finally:
+            instrumentation.unsubscribe(recorder)
+
+        names = [event.name for event in recorder.commands]
+        fetches = [event for event in recorder.commands if event.name == "UID FETCH"]
+        assert names[:4] == ["CAPABILITY", "LOGIN", "COMPRESS", "SELECT"]
+        assert len(fetches) == 3 and all(event.status == "OK" and event.bytes_sent for event in fetches)
+        assert sum(event.bytes_received for event in fetches) > 0
+        assert sum(event.bytes_sent for event in fetches) == sent
+        assert len(emails) == 3
+        assert {"create_email", "get_body", "decode"} <= set(recorder.stages)
@@ -0,0 +1,73 @@
+import imaplib
+import os
+from pytest import fixture, raises
+from src.client import IMAPClient
+from tests.fake_server import FakeIMAPServer, synthetic_messages
+
+
+@fixture
+def server():
+    server = FakeIMAPServer().start()
+    server.load(count=6, mime_mix={"plain": 1, "alternative": 1, "attachment": 1}, charsets=("utf-8", "koi8-r"),
+                attachment_size=4096)
+    server.add_mailbox("Sent", flags=["\\Sent"])
+    yield server
+    server.stop()
+
+
+def connect(server: FakeIMAPServer, **kwargs) -> IMAPClient:
+    client = IMAPClient(**kwargs)
+    client.connect_plain("127.0.0.1", server.port)
+    client.login("user", "password")
+    return client
+
+
+class TestIntegration:
+    def test_list_and_read(self, server):
+        client = connect(server, compress=False)
+        client.select_mailbox("INBOX")
+
+        brief = list(client.list_emails(headers_only=True))
+        full = [client.read_email(email.id) for email in brief]
+
+        assert [email.id for email in brief] == [6, 5, 4, 3, 2, 1]
+        assert all(email.sender.endswith("@example.com") for email in brief)
+        assert [email.description for email in brief] == [email.description for email in full]
+        assert all(full_email.body[0].startswith(email.preview[:32]) for email, full_email in zip(brief, full))
+        client.close()
+
+    def test_attachments_upload_and_tree(self, server, tmp_path):
+        client = connect(server)
+        client.select_mailbox("INBOX")
+        with_attachment = next(message.uid for message in server.mailboxes["INBOX"].messages
+                               if b"attachment" in message.raw)
+
+        client.download_attachments(str(with_attachment), str(tmp_path))
+        client.upload_email("Тема", "Текст", "user@example.com", "Sent")
+        uploaded = client.upload_emails(synthetic_messages(3, seed=1), "Sent")
+        tree = client.mailbox_tree(refresh=True)
+
+        assert [os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path)] == [4096]
+        assert uploaded == [(1, 2), (1, 3), (1, 4)]
+        assert (tree["Sent"].messages, tree["Sent"].special_use, tree["INBOX"].messages) == (4, "\\Sent", 6)
+        assert client.compression is not None and server.commands.count("COMPRESS") == 1
+        client.close()
+
+    def test_latency_and_counters(self, server):
+        server.latency = 0.01
+        server.reset_counters()
+        client = connect(server, compress=False)
+
+        assert client.noop()[0] == "OK"
+        assert server.commands == ["CAPABILITY", "LOGIN", "NOOP"]
+        assert server.bytes_received > 0 and server.bytes_sent > server.bytes_received
+        client._connection.logout()
+
+    def test_login_failure(self, server):
+        client = IMAPClient()
+        client.connect_plain("127.0.0.1", server.port)
+
+        with raises(imaplib.IMAP4.error):
+            client.login("user", "wrong")
+        assert not client._logged_in
+        client._connection.shutdown()
@@ -0,0 +1,37 @@
+from src.mailbox_tree import MailboxTree, parse_list_response, parse_status_response
+
+
+class TestMailboxTree:
+    def test_hierarchy(self):
+        tree = MailboxTree(parse_list_response([
+            b'(\\HasNoChildren) "/" "INBOX"',
+            b'(\\HasNoChildren \\Sent) "/" "&BB4EQgQ,BEAEMAQyBDsENQQ9BD0ESwQ1-"',
+            (b'(\\HasNoChildren) "/" {12}', b"Archive/2024"),
+            b'(\\Noselect \\HasChildren) "/" "Work"',
+            b'(\\HasNoChildren) "/" Work/Reports',
+        ]))
+
+        assert [(node.name, node.depth) for node in tree] == [
+            ("INBOX", 0), ("Отправленные", 0), ("Archive", 0), ("Archive/2024", 1), ("Work", 0),
+            ("Work/Reports", 1),
+        ]
+        assert tree.names() == ["INBOX", "Отправленные", "Archive/2024", "Work/Reports"]
+        assert tree.by_role("sent") is tree["Отправленные"]
+        assert tree.by_role("\\Trash") is None
+        assert tree["Work/Reports"].parent is tree["Work"]
+        assert tree["Work/Reports"].leaf_name == "Reports"
+        assert not tree["Archive"].selectable
+        assert "inbox" in tree
+
+    def test_status(self):
+        tree = MailboxTree(parse_list_response([b'() "." "INBOX"', b'() "." "INBOX.Spam"']))
+
+        tree.apply_status(parse_status_response([
+            b'"INBOX" (MESSAGES 12 UNSEEN 3 UIDNEXT 40)', b'INBOX.Spam (MESSAGES 0)', b'"Gone" (MESSAGES 1)',
+        ]))
+
+        assert (tree["INBOX"].messages, tree["INBOX"].unseen, tree["INBOX"].uidnext) == (12, 3, 40)
+        assert (tree["INBOX.Spam"].messages, tree["INBOX.Spam"].unseen) == (0, None)
+        assert tree["INBOX.Spam"].parent is tree["INBOX"]
+        assert not tree.expired(60)
+        assert tree.expired(0)
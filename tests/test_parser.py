@@ -0,0 +1,32 @@
+from src.parser import parse, parse_fetch_response, to_sequence_set, ParseErr
+from pytest import raises
+
+
+class TestParser:
+    def test_parse(self):
+        assert parse([b'(\\HasNoChildren) "/" "INBOX"']) == [["\\HasNoChildren"], "/", "INBOX"]
+        assert parse([b'NIL "a \\"b\\"" (1 (2))']) == [None, 'a "b"', ["1", ["2"]]]
+        assert parse([(b"(BODY[TEXT]<0> {3}", b"abc"), b")"]) == [["BODY[TEXT]<0>", b"abc"]]
+
+        with raises(ParseErr):
+            parse([b"(1"])
+        with raises(ParseErr):
+            parse([b"1)"])
+
+    def test_parse_fetch_response(self):
+        data = [
+            (b"1 (RFC822.SIZE 10 BODY[HEADER.FIELDS (FROM)] {5}", b"From:"),
+            b" FLAGS (\\Seen))",
+            b"2 (RFC822.SIZE 20)",
+        ]
+
+        assert parse_fetch_response(data) == [
+            (1, {"RFC822.SIZE": "10", "BODY[HEADER.FIELDS (FROM)]": b"From:", "FLAGS": ["\\Seen"]}),
+            (2, {"RFC822.SIZE": "20"}),
+        ]
+        assert parse_fetch_response([None]) == []
+
+    def test_to_sequence_set(self):
+        assert to_sequence_set([5, 1, 2, 3, 7, 8]) == "1:3,5,7:8"
+        assert to_sequence_set([4]) == "4"
+        assert to_sequence_set([]) == ""
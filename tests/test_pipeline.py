@@ -0,0 +1,64 @@
+import io
+from unittest.mock import Mock
+from src.pipeline import Pipeline, route_by_uid
+
+
+def fake_connection(server_data: bytes) -> Mock:
+    stream = io.BytesIO(server_data)
+    connection = Mock()
+    connection.readline = stream.readline
+    connection.read = stream.read
+    return connection
+
+
+class TestPipeline:
+    def test_window_and_order(self):
+        connection = fake_connection(
+            b"* SEARCH 1 2\r\nZ0001 OK done\r\n* SEARCH 3\r\nZ0002 OK done\r\nZ0003 NO failed\r\n"
+        )
+        commands = [("UID", "SEARCH", "ALL"), ("UID", "SEARCH", "UNSEEN"), ("UID", "SEARCH", "BAD")]
+
+        res = list(Pipeline(connection, window=2).run(commands))
+
+        assert [command.status for command in res] == ["OK", "OK", "NO"]
+        assert res[0].untagged.pop_data("SEARCH") == [b"1 2"]
+        assert res[1].untagged.pop_data("SEARCH") == [b"3"]
+        assert connection.send.call_args_list[0][0][0] == (
+            b"Z0001 UID SEARCH ALL\r\nZ0002 UID SEARCH UNSEEN\r\n"
+        )
+        assert connection.send.call_args_list[1][0][0] == b"Z0003 UID SEARCH BAD\r\n"
+
+    def test_route_by_uid(self):
+        connection = fake_connection(
+            b"* 2 FETCH (UID 20 RFC822 {3}\r\nbbb)\r\n* 1 FETCH (UID 10 RFC822 {3}\r\naaa)\r\n"
+            b"Z0002 OK done\r\nZ0001 OK done\r\n"
+        )
+        commands = [("UID", "FETCH", "10", "(RFC822)"), ("UID", "FETCH", "20", "(RFC822)")]
+
+        res = list(Pipeline(connection).run(commands, [10, 20], route_by_uid))
+
+        assert [command.key for command in res] == [10, 20]
+        assert res[0].untagged.pop_data("FETCH") == [(b"1 (UID 10 RFC822 {3}", b"aaa"), b")"]
+        assert res[1].untagged.pop_data("FETCH") == [(b"2 (UID 20 RFC822 {3}", b"bbb"), b")"]
+
+    def test_drain_on_close(self):
+        connection = fake_connection(b"Z0001 OK done\r\nZ0002 OK done\r\nNEXT\r\n")
+        commands = iter([("NOOP",), ("NOOP",)])
+
+        pipeline = Pipeline(connection).run(commands)
+        next(pipeline)
+        pipeline.close()
+
+        assert connection.readline() == b"NEXT\r\n"
+
+    def test_literals(self):
+        connection = fake_connection(b"+ Ready\r\nZ0001 OK done\r\nZ0002 OK [APPENDUID 1 5] done\r\n")
+        commands = [("APPEND", "INBOX", b"abc", "x", b"de"), ("APPEND", "INBOX", b"f")]
+
+        res = list(Pipeline(connection, literal_plus=True, literal_limit=2).run(commands))
+
+        assert [call[0][0] for call in connection.send.call_args_list] == [
+            b"Z0001 APPEND INBOX {3}\r\n",
+            b"abc x {2+}\r\nde\r\nZ0002 APPEND INBOX {1+}\r\nf\r\n",
+        ]
+        assert res[1].code == ("APPENDUID", b"1 5")
@@ -0,0 +1,134 @@
+import imaplib
+from unittest.mock import Mock
+from pytest import raises
+from src.pool import IMAPConnectionPool, PoolTimeoutErr
+from src.client import IMAPClient, LoginErr, MailboxErr
+
+
+def make_pool(**kwargs) -> IMAPConnectionPool:
+    pool = IMAPConnectionPool("imap.example.com", **kwargs)
+    pool.add_account("login", "password")
+
+    def create_client(username):
+        client = Mock()
+        client.selected_mailbox = None
+
+        def select_mailbox(mailbox):
+            client.selected_mailbox = mailbox
+            return "OK", [b"1"]
+
+        client.select_mailbox.side_effect = select_mailbox
+        client.noop.return_value = ("OK", [b""])
+        pool.metrics.created += 1
+        return client
+
+    pool._create_client = create_client
+    return pool
+
+
+class TestPool:
+    def test_reuse_selected_mailbox(self):
+        pool = make_pool(max_connections=2)
+
+        with pool.connection(mailbox="INBOX") as inbox:
+            with pool.connection(mailbox="Sent") as sent:
+                pass
+
+        with pool.connection(mailbox="INBOX") as client:
+            assert client is inbox
+        with pool.connection(mailbox="Sent") as client:
+            assert client is sent
+
+        assert pool.metrics.created == 2
+        assert pool.metrics.checkouts == 4
+        inbox.select_mailbox.assert_called_once_with("INBOX")
+
+    def test_failed_select_resets_mailbox(self):
+        pool = make_pool(max_connections=1)
+        client = IMAPClient()
+        client._logged_in = True
+        client._connection = Mock()
+        client._connection.response.return_value = ("UIDVALIDITY", [b"7"])
+        client._connection.noop.return_value = ("OK", [b""])
+        client._connection.select.side_effect = lambda mailbox: ("NO", [b"missing"]) if mailbox == '"Missing"' \
+            else ("OK", [b"1"])
+        pool._create_client = lambda username: client
+
+        with pool.connection(mailbox="INBOX"):
+            pass
+        with raises(MailboxErr):
+            with pool.connection(mailbox="Missing"):
+                pass
+        with pool.connection(mailbox="INBOX") as inbox:
+            assert inbox.selected_mailbox == "INBOX"
+
+        assert [call.args[0] for call in client._connection.select.call_args_list] == ['"INBOX"', '"Missing"', '"INBOX"']
+        assert client.uidvalidity == 7
+
+    def test_limit(self):
+        pool = make_pool(max_connections=1)
+
+        with pool.connection():
+            with raises(PoolTimeoutErr):
+                with pool.connection(timeout=0.01):
+                    pass
+
+        assert pool.metrics.waits == 1
+        assert pool.size == 1
+
+    def test_unknown_account(self):
+        pool = make_pool()
+
+        with raises(LoginErr):
+            with pool.connection("nobody"):
+                pass
+
+    def test_health_check_reconnect(self):
+        pool = make_pool(health_check_interval=0)
+
+        with pool.connection() as first:
+            pass
+        first.noop.side_effect = imaplib.IMAP4.abort("socket error: EOF")
+
+        with pool.connection() as client:
+            assert client is first
+
+        first.reconnect.assert_called_once()
+        assert pool.metrics.reconnects == 1
+
+    def test_discard_broken(self):
+        pool = make_pool()
+
+        with raises(imaplib.IMAP4.abort):
+            with pool.connection() as broken:
+                raise imaplib.IMAP4.abort("socket error: EOF")
+
+        with pool.connection() as client:
+            assert client is not broken
+
+        broken.close.assert_called_once()
+        assert pool.metrics.discarded == 1
+        assert pool.size == 1
+
+        pool.close()
+
+        assert pool.size == 0
+
+    def test_tls_session_resumption(self, monkeypatch):
+        sessions = []
+
+        def connect_ssl(client, server, port, timeout, ssl_context, tls_session):
+            sessions.append(tls_session)
+            client._connection = Mock(tls_session="session", tls_session_reused=tls_session is not None)
+
+        monkeypatch.setattr(IMAPClient, "connect_ssl", connect_ssl)
+        monkeypatch.setattr(IMAPClient, "login", Mock())
+        pool = IMAPConnectionPool("imap.example.com")
+        pool.add_account("login", "password")
+
+        with pool.connection():
+            with pool.connection() as second:
+                assert second.tls_session_reused
+
+        assert sessions == [None, "session"]
+        assert (pool.metrics.created, pool.metrics.tls_resumed) == (2, 1)
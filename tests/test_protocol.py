@@ -0,0 +1,32 @@
+from src.protocol import split_response, literal_size, quote, UntaggedResponses
+
+
+class TestProtocol:
+    def test_split_response(self):
+        res = split_response([(b"* 3 FETCH (UID 5 RFC822 {2}", b"ab"), b")"])
+
+        assert (res.kind, res.tag, res.name) == ("untagged", None, "FETCH")
+        assert res.data == [(b"3 (UID 5 RFC822 {2}", b"ab"), b")"]
+
+        res = split_response([b"A0001 OK [APPENDUID 1 5] APPEND completed"])
+
+        assert (res.kind, res.tag, res.name) == ("tagged", "A0001", "OK")
+        assert res.code == ("APPENDUID", b"1 5")
+
+        assert split_response([b"+ Ready"]).kind == "continuation"
+        assert split_response([b"* SEARCH"]).data == [None]
+
+    def test_untagged_responses(self):
+        untagged = UntaggedResponses()
+        untagged.add(split_response([b"* 4 EXISTS"]))
+        untagged.add(split_response([b"* OK [UIDVALIDITY 42] UIDs valid"]))
+
+        assert untagged.get_int("UIDVALIDITY") == 42
+        assert untagged.pop_data("EXISTS") == [b"4"]
+        assert untagged.pop_data("EXISTS") == [None]
+
+    def test_helpers(self):
+        assert literal_size(b"* 1 FETCH (RFC822 {123}\r\n") == 123
+        assert literal_size(b"A1 APPEND INBOX {5+}") == 5
+        assert literal_size(b"* 1 EXISTS\r\n") is None
+        assert quote('a "b" \\c') == '"a \\"b\\" \\\\c"'
@@ -0,0 +1,22 @@
+import datetime
+from src.query import Query
+
+
+class TestQuery:
+    def test_arguments(self):
+        query = Query().sender("a@example.com").since(datetime.date(2024, 3, 5)).larger(1024).seen(False)
+
+        assert query.arguments() == ['FROM "a@example.com" SINCE 5-Mar-2024 LARGER 1024 UNSEEN']
+        assert not query.needs_charset
+        assert Query().arguments() == ["ALL"]
+
+    def test_charset_literals(self):
+        query = Query().subject("Отчёт").flagged()
+
+        assert query.needs_charset
+        assert query.arguments() == ["SUBJECT", "Отчёт".encode("utf-8"), "FLAGGED"]
+
+    def test_groups(self):
+        query = Query.either(Query().sender("a"), Query().subject("Привет").seen()).exclude(Query().deleted())
+
+        assert query.arguments() == ['OR (FROM "a") (SUBJECT', "Привет".encode("utf-8"), 'SEEN) NOT DELETED']
@@ -0,0 +1,38 @@
+from src.email_model import Email
+from src.search_index import SearchIndex
+
+KEY = ("imap.example.com:993", "user", "INBOX", 1)
+
+
+class TestSearchIndex:
+    def test_search_ranked(self, tmp_path):
+        index = SearchIndex(str(tmp_path / "index.sqlite3"))
+        index.validate(KEY)
+        index.add(KEY, Email(1, "boss@example.com", "Отчёт за март", ["Прошу прислать отчёт"]))
+        index.add(KEY, Email(2, "friend@example.com", "Выходные", ["Отчёт подождёт, поехали на дачу"]))
+        index.add(KEY, Email(3, "shop@example.com", "Заказ", ["Ваш заказ отправлен"]))
+
+        hits = index.search("отчёт")
+
+        assert [hit.uid for hit in hits] == [1, 2]
+        assert hits[0].subject == "Отчёт за март"
+        assert "[Отчёт]" in hits[0].snippet
+        assert [hit.uid for hit in index.search("зака")] == [3]
+        assert index.search("отчёт", mailbox="Archive") == []
+        assert index.search("  ") == []
+
+    def test_consistency(self, tmp_path):
+        index = SearchIndex(str(tmp_path / "index.sqlite3"))
+        index.validate(KEY)
+        for uid in (1, 2, 3):
+            index.add(KEY, Email(uid, "a@example.com", f"Письмо {uid}", ["текст"]))
+        index.add(KEY, Email(3, "a@example.com", "Письмо 3", ["другой"]))
+
+        assert [hit.uid for hit in index.search("текст")] == [1, 2]
+        index.retain(KEY, [2, 3])
+        assert index.indexed_uids(KEY) == {2, 3}
+        index.remove(KEY, [3])
+        assert index.indexed_uids(KEY) == {2}
+        assert index.validate(KEY)
+        assert not index.validate(KEY[:3] + (2,))
+        assert index.search("текст") == []
@@ -0,0 +1,77 @@
+import asyncio
+import socket
+import zlib
+from src.transport import IMAP4, DeflateCodec, DeflateStreamReader, SocketReader
+from tests.fake_server import FakeIMAPServer
+
+
+def deflate(data: bytes) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+class TestSocketReader:
+    def test_readline_and_read(self):
+        first, second = socket.socketpair()
+        second.sendall(b"* 1 FETCH (BODY[] {5}\r\nhello)\r\nA1 OK")
+        second.close()
+        reader = SocketReader(first)
+
+        assert reader.readline() == b"* 1 FETCH (BODY[] {5}\r\n"
+        assert reader.buffered
+        assert reader.read(5) == b"hello"
+        assert reader.readline() == b")\r\n"
+        assert reader.readline(2) == b"A1"
+        assert reader.readline() == b" OK"
+        assert reader.readline() == b""
+        assert not reader.buffered
+
+    def test_decompression(self):
+        first, second = socket.socketpair()
+        data = b"* 1 EXISTS\r\n" * 100
+        compressed = deflate(data)
+        second.sendall(compressed)
+        second.close()
+        reader = SocketReader(first)
+        codec = DeflateCodec()
+
+        reader.start_decompression(codec)
+
+        assert [reader.readline() for _ in range(100)] == [b"* 1 EXISTS\r\n"] * 100
+        assert (codec.raw_received, codec.compressed_received) == (len(data), len(compressed))
+
+
+class TestDeflateCodec:
+    def test_round_trip(self):
+        codec = DeflateCodec()
+        data = b"A0001 UID FETCH 1:* (UID FLAGS)\r\n" * 50
+
+        compressed = codec.compress(data)
+
+        assert zlib.decompressobj(-15).decompress(compressed) == data
+        assert codec.decompress(deflate(data)) == data
+        assert codec.as_dict() == {
+            "raw_sent": len(data), "compressed_sent": len(compressed),
+            "raw_received": len(data), "compressed_received": len(deflate(data)),
+        }
+        assert codec.saved == 2 * len(data) - len(compressed) - len(deflate(data))
+
+    def test_stream_reader(self):
+        async def read() -> list[bytes]:
+            stream = asyncio.StreamReader()
+            stream.feed_data(deflate(b"* 1 FETCH (BODY[] {5}\r\nhello)\r\n"))
+            stream.feed_eof()
+            reader = DeflateStreamReader(stream, DeflateCodec())
+            return [await reader.readline(), await reader.readexactly(5), await reader.readline(),
+                    await reader.readline()]
+
+        assert asyncio.run(read()) == [b"* 1 FETCH (BODY[] {5}\r\n", b"hello", b")\r\n", b""]
+
+
+class TestIMAP4:
+    def test_nodelay(self):
+        with FakeIMAPServer() as server:
+            connection = IMAP4("127.0.0.1", server.port)
+
+            assert connection.sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+            connection.logout()
@@ -0,0 +1,99 @@
+import io
+import socket
+from unittest.mock import Mock
+from src.client import MailboxErr
+from src.pipeline import Pipeline
+from src.query import SearchResult
+from src.watch import MailboxWatcher, _WatchedMailbox
+
+
+def fake_client(server_data: bytes, capabilities: tuple[str, ...] = ("IDLE",)) -> Mock:
+    stream = io.BytesIO(server_data)
+    client = Mock()
+    client.username = "user"
+    client.capabilities = frozenset(capabilities)
+    client.select_mailbox.return_value = ("OK", [b"2"])
+    client.search.return_value = SearchResult([10, 11])
+    client._connection.readline = stream.readline
+    client._connection.read = stream.read
+    client.sock, client.peer = socket.socketpair()
+    client.send_raw.side_effect = client._connection.send
+    client.raw_pipeline.side_effect = lambda window, tag_prefix: Pipeline(client._connection, window,
+                                                                          tag_prefix=tag_prefix)
+    return client
+
+
+def sent(client: Mock) -> bytes:
+    return b"".join(call[0][0] for call in client._connection.send.call_args_list)
+
+
+class TestMailboxWatcher:
+    def test_idle_events(self):
+        client = fake_client(
+            b"+ idling\r\n"
+            b"* 3 EXISTS\r\n"
+            b"I0001 OK IDLE terminated\r\n"
+            b"* 3 FETCH (UID 15)\r\n"
+            b"W0001 OK done\r\n"
+            b"+ idling\r\n"
+            b"* 1 EXPUNGE\r\n"
+            b"* 2 FETCH (FLAGS (\\Seen))\r\n"
+        )
+        client.has_pending_input = False
+        events = []
+        watcher = MailboxWatcher(lambda event: events.append(event))
+        watched = _WatchedMailbox(client, "INBOX", watcher.callback)
+
+        watcher._attach(watched)
+        watcher._on_readable(watched)
+        watcher._on_readable(watched)
+        watcher._on_readable(watched)
+
+        assert [(event.kind, event.uids, event.flags) for event in events] == [
+            ("EXISTS", [15], {}), ("EXPUNGE", [10], {}), ("FETCH", [15], {15: ["\\Seen"]}),
+        ]
+        assert events[0].username == "user"
+        assert watched.uids == [11, 15]
+        assert watched.idle_tag == "I0002"
+        assert sent(client) == b"I0001 IDLE\r\nDONE\r\nW0001 FETCH 3:* (UID)\r\nI0002 IDLE\r\n"
+
+    def test_poll_without_idle(self):
+        client = fake_client(
+            b"* 1 EXPUNGE\r\n* 2 EXISTS\r\nW0001 OK done\r\n* 2 FETCH (UID 12)\r\nW0002 OK done\r\n",
+            capabilities=(),
+        )
+        events = []
+        watcher = MailboxWatcher(lambda event: events.append(event), poll_interval=30)
+        watched = _WatchedMailbox(client, "INBOX", watcher.callback)
+
+        watcher._attach(watched)
+        watcher._on_deadline(watched)
+
+        assert [(event.kind, event.uids) for event in events] == [("EXPUNGE", [10]), ("EXISTS", [12])]
+        assert watched.uids == [11, 12]
+        assert watched.idle_tag is None
+        assert sent(client) == b"W0001 NOOP\r\nW0002 FETCH 2:* (UID)\r\n"
+
+    def test_callback_errors(self):
+        client = fake_client(b"+ idling\r\n* 1 EXPUNGE\r\n")
+        client.has_pending_input = False
+        watcher = MailboxWatcher(Mock(side_effect=RuntimeError("boom")))
+        watched = _WatchedMailbox(client, "INBOX", watcher.callback)
+
+        watcher._attach(watched)
+        watcher._on_readable(watched)
+
+        assert [str(error) for error in watcher.errors] == ["boom"]
+        assert watched.uids == [11]
+
+
+    def test_attach_errors_mark_broken(self):
+        client = fake_client(b"")
+        client.search.side_effect = MailboxErr("Не удалось выполнить поиск писем")
+        watcher = MailboxWatcher(Mock())
+        watched = _WatchedMailbox(client, "INBOX", watcher.callback)
+
+        watcher._guard(watched, watcher._attach)
+
+        assert watched.broken
+        assert [type(error) for error in watcher.errors] == [MailboxErr]